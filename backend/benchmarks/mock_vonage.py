@@ -0,0 +1,214 @@
+"""Local stand-in for the Vonage REST API, for load-testing campaigns without sending real (paid) SMS.
+
+Implements the endpoints this app calls: SMS (/sms/json), Numbers (/account/numbers, /number/search,
+/number/buy, /number/update, /number/cancel) and Account (/account/get-balance). Sends take a configurable
+latency, fail at a configurable rate and are throttled above a messages-per-second limit the same way Vonage
+does (status "1"). Accepted messages are followed by delivery receipts on /messages/status and, optionally,
+inbound replies on /messages/inbound of the app.
+
+Run it and point the workers at it:
+    python -m benchmarks.mock_vonage --port 4010 --latency-ms 80 --error-rate 0.01 --throttle 30
+    VONAGE_REST_URL=http://127.0.0.1:4010 celery -A worker worker
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+@dataclass
+class MockSettings:
+    latency_ms: float = 50  # Mean response time of /sms/json
+    jitter_ms: float = 20
+    error_rate: float = 0.0  # Share of sends rejected with a delivery error
+    throttle: float = 0  # Messages per second per account before status "1"; 0 disables throttling
+    webhook_url: str = "http://127.0.0.1:8000"  # App base url for receipts and replies
+    receipt_delay_ms: float = 500
+    undelivered_rate: float = 0.0  # Share of accepted messages reported back as failed
+    reply_rate: float = 0.0  # Share of accepted messages answered with an inbound reply
+    reply_text: str = "Thanks"
+    receipts: bool = True
+
+
+settings = MockSettings()
+app = FastAPI(title="Mock Vonage API")
+
+_webhook_client: httpx.AsyncClient | None = None
+_window_start = 0.0
+_window_count = 0
+_balance = 1000.0
+_numbers: dict[str, dict] = {}
+
+MESSAGE_PRICE = 0.0071
+MOCK_NETWORK = "310999"
+
+
+def get_webhook_client() -> httpx.AsyncClient:
+    global _webhook_client
+    if _webhook_client is None:
+        _webhook_client = httpx.AsyncClient(base_url=settings.webhook_url, timeout=httpx.Timeout(10.0),
+                                            limits=httpx.Limits(max_connections=50))
+    return _webhook_client
+
+
+def is_throttled() -> bool:
+    """Fixed one-second window, which is how Vonage's per-account throughput limit behaves at this granularity."""
+    global _window_start, _window_count
+    if not settings.throttle:
+        return False
+
+    now = time.monotonic()
+    if now - _window_start >= 1:
+        _window_start, _window_count = now, 0
+    _window_count += 1
+    return _window_count > settings.throttle
+
+
+def sms_response(params: dict, status: str, error_text: str | None = None) -> dict:
+    message = {"to": params.get("to"), "status": status}
+    if status == "0":
+        message.update({
+            "message-id": uuid4().hex.upper(),
+            "remaining-balance": f"{_balance:.8f}",
+            "message-price": f"{MESSAGE_PRICE:.8f}",
+            "network": MOCK_NETWORK
+        })
+    else:
+        message["error-text"] = error_text
+    return {"message-count": "1", "messages": [message]}
+
+
+async def call_webhook(url: str, params: dict):
+    try:
+        await get_webhook_client().get(url, params=params)
+    except httpx.HTTPError as error:
+        print(f"Webhook {url} failed: {error}")
+
+
+async def send_callbacks(params: dict, message_id: str):
+    await asyncio.sleep(settings.receipt_delay_ms / 1000)
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    if settings.receipts:
+        delivered = random.random() >= settings.undelivered_rate
+        await call_webhook(params.get("callback") or "/messages/status", {
+            "msisdn": params.get("to"),
+            "to": params.get("from"),
+            "network-code": MOCK_NETWORK,
+            "messageId": message_id,
+            "price": f"{MESSAGE_PRICE:.8f}",
+            "status": "delivered" if delivered else "failed",
+            "scts": datetime.now(timezone.utc).strftime("%y%m%d%H%M"),
+            "err-code": "0" if delivered else "1",
+            "message-timestamp": timestamp
+        })
+
+    if settings.reply_rate and random.random() < settings.reply_rate:
+        await call_webhook("/messages/inbound", {
+            "msisdn": params.get("to"),
+            "to": params.get("from"),
+            "messageId": uuid4().hex.upper(),
+            "text": settings.reply_text,
+            "type": "text",
+            "keyword": settings.reply_text.split(" ")[0].upper(),
+            "message-timestamp": timestamp
+        })
+
+
+@app.post("/sms/json")
+async def send_sms(request: Request):
+    global _balance
+    params = dict(await request.form())
+
+    await asyncio.sleep(max(0.0, random.gauss(settings.latency_ms, settings.jitter_ms)) / 1000)
+
+    if not params.get("api_key") or not params.get("api_secret"):
+        return sms_response(params, "4", "Bad Credentials")
+    if is_throttled():
+        return sms_response(params, "1", "Throughput Rate Exceeded - please wait [ 1000 ] and retry")
+    if random.random() < settings.error_rate:
+        return sms_response(params, "5", "Internal Error")
+
+    _balance -= MESSAGE_PRICE
+    response = sms_response(params, "0")
+    asyncio.create_task(send_callbacks(params, response["messages"][0]["message-id"]))
+    return response
+
+
+@app.get("/account/get-balance")
+async def get_balance():
+    return {"value": round(_balance, 4), "autoReload": False}
+
+
+@app.get("/account/numbers")
+async def list_numbers():
+    return {"count": len(_numbers), "numbers": list(_numbers.values())}
+
+
+@app.get("/number/search")
+async def search_numbers(country: str = "US", size: int = 10):
+    numbers = [{
+        "country": country,
+        "msisdn": f"1555{random.randint(1000000, 9999999)}",
+        "type": "mobile-lvn",
+        "cost": "0.90",
+        "features": ["SMS", "VOICE"]
+    } for _ in range(size)]
+    return {"count": len(numbers), "numbers": numbers}
+
+
+@app.post("/number/buy")
+async def buy_number(request: Request):
+    params = dict(await request.form()) or dict(request.query_params)
+    _numbers[params.get("msisdn")] = {"country": params.get("country"), "msisdn": params.get("msisdn"),
+                                      "type": "mobile-lvn", "features": ["SMS", "VOICE"]}
+    return {"error-code": "200", "error-code-label": "success"}
+
+
+@app.post("/number/update")
+async def update_number(request: Request):
+    params = dict(await request.form()) or dict(request.query_params)
+    number = _numbers.setdefault(params.get("msisdn"), {"country": params.get("country"),
+                                                        "msisdn": params.get("msisdn")})
+    number.update({key: value for key, value in params.items() if key not in ["api_key", "api_secret"]})
+    return {"error-code": "200", "error-code-label": "success"}
+
+
+@app.post("/number/cancel")
+async def cancel_number(request: Request):
+    params = dict(await request.form()) or dict(request.query_params)
+    _numbers.pop(params.get("msisdn"), None)
+    return {"error-code": "200", "error-code-label": "success"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4010)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=settings.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--throttle", type=float, default=settings.throttle)
+    parser.add_argument("--webhook-url", default=settings.webhook_url)
+    parser.add_argument("--receipt-delay-ms", type=float, default=settings.receipt_delay_ms)
+    parser.add_argument("--undelivered-rate", type=float, default=settings.undelivered_rate)
+    parser.add_argument("--reply-rate", type=float, default=settings.reply_rate)
+    parser.add_argument("--no-receipts", dest="receipts", action="store_false")
+    args = parser.parse_args()
+
+    for field in settings.__dataclass_fields__:
+        if hasattr(args, field):
+            setattr(settings, field, getattr(args, field))
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""End-to-end send throughput of the campaign pipeline against the mock Vonage server.
+
+Seeds a throwaway user, campaign and audience in MongoDB, splits it into chunks the same way `send_bulk_sms`
+does and runs every chunk in its own process through the worker's batch path (audience paging, DNC filter,
+send ledger, template rendering, the async send engine and message checkpoints). Celery and the buffer time
+between batches are left out, so the numbers are the pipeline's ceiling. Everything seeded is removed again.
+
+    python -m benchmarks.mock_vonage --port 4010 --latency-ms 80 &
+    python -m benchmarks.send_throughput --mock-url http://127.0.0.1:4010 --sizes 1000 100000 1000000
+
+Reports messages/sec, p50/p99 Vonage request latency and the peak RSS of the sending processes.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import resource
+import time
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+from bson import ObjectId
+
+BENCHMARK_GROUP = "benchmark"
+BENCHMARK_SENDER = "15550009999"
+SEED_PAGE_SIZE = 10_000
+
+
+def configure_environment(args):
+    # Must run before anything imports environment.py, the app reads its settings at import time
+    os.environ["VONAGE_REST_URL"] = args.mock_url
+    os.environ["SMS_SEND_CONCURRENCY"] = str(args.concurrency)
+    os.environ["RATE_LIMIT_STORE"] = "memory"
+    os.environ["APP_ENVIRONMENT"] = "benchmark"
+    os.environ["PHONE_VALIDATION"] = "possible"  # The seeded 1555... numbers are not assigned ranges
+    os.environ.setdefault("VONAGE_API_KEY", "benchmark")
+    os.environ.setdefault("VONAGE_API_SECRET", "benchmark")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+def seed_campaign(size: int, batch_size: int) -> tuple[str, str]:
+    import worker
+
+    user_id = ObjectId()
+    worker.mongo_user_collection.insert_one({"_id": user_id, "email": f"benchmark-{user_id}@example.com",
+                                             "created_by": None})
+    user_id = str(user_id)
+
+    for start in range(0, size, SEED_PAGE_SIZE):
+        worker.mongo_contact_collection.insert_many([{
+            "name": f"Contact {i}",
+            "phone_number": str(15550000000 + i),
+            "groups": [BENCHMARK_GROUP],
+            "created_by": user_id
+        } for i in range(start, min(size, start + SEED_PAGE_SIZE))], ordered=False)
+
+    now = datetime.now(timezone.utc)
+    campaign_id = worker.mongo_campaign_collection.insert_one({
+        "name": f"Benchmark {size}",
+        "contact_groups": [BENCHMARK_GROUP],
+        "message": "Hi {name}, this is a load test message.",
+        "batch_size": batch_size,
+        "buffer_time": 1,
+        "throttle": "low",
+        "sender_msisdn": BENCHMARK_SENDER,
+        "include_opt_out": False,
+        "created_by": user_id,
+        "created_at": now
+    }).inserted_id
+
+    queue_id = ObjectId()
+    worker.ensure_indexes(worker.mongo_audience_collection)
+    audience_size = worker.build_audiences_sync(worker.mongo_contact_collection, worker.mongo_audience_collection,
+                                                user_id, {str(queue_id): [BENCHMARK_GROUP]},
+                                                worker.get_dnc_owners(user_id))[str(queue_id)]
+    worker.mongo_queue_collection.insert_one({
+        "_id": queue_id,
+        "campaign_id": campaign_id,
+        "status": "in_progress",
+        "current_batch": 0,
+        "total_batches": -(-size // batch_size),
+        "created_at": now,
+        "created_by": user_id,
+        "schedule_time": now,
+        "audience_size": audience_size
+    })
+    worker.ensure_send_ledger_index(worker.mongo_ledger_collection)
+
+    return str(queue_id), user_id
+
+
+def cleanup_campaign(queue_id: str, user_id: str):
+    import worker
+
+    queue_data = worker.mongo_queue_collection.find_one({"_id": ObjectId(queue_id)})
+    worker.mongo_contact_collection.delete_many({"created_by": user_id})
+    worker.mongo_messages_collection.delete_many({"users": user_id})
+    worker.mongo_ledger_collection.delete_many({"queue_id": queue_id})
+    worker.mongo_audience_collection.delete_many({"queue_id": queue_id})
+    # Routes of the benchmark sender only serve the throwaway user, the whole route goes
+    worker.mongo_reply_route_collection.delete_many({"our_number": BENCHMARK_SENDER, "users": user_id})
+    worker.mongo_conversation_collection.delete_many({"campaign_id": str(queue_data["campaign_id"])})
+    worker.mongo_stats_collection.delete_one({"_id": ObjectId(queue_data["campaign_id"])})
+    worker.mongo_campaign_collection.delete_one({"_id": queue_data["campaign_id"]})
+    worker.mongo_queue_collection.delete_one({"_id": ObjectId(queue_id)})
+    worker.mongo_user_collection.delete_one({"_id": ObjectId(user_id)})
+
+
+def run_chunk(args) -> tuple[int, int, array, float]:
+    """Sends one chunk to the end, the way its chain of `send_bulk_sms_chunk` tasks would without buffers."""
+    queue_id, user_id, chunk_index, rate = args
+
+    import worker
+    from utils import send_engine
+    from models.sms_models import SMSCampaignQueue
+
+    latencies = array("d")
+    send_sms = send_engine.send_sms
+
+    async def timed_send_sms(params):
+        started = time.perf_counter()
+        response = await send_sms(params)
+        latencies.append(time.perf_counter() - started)
+        return response
+
+    send_engine.send_sms = timed_send_sms
+
+    queue_entry = SMSCampaignQueue(**worker.mongo_queue_collection.find_one({"_id": ObjectId(queue_id)}))
+    campaign = worker.load_campaign(queue_entry)
+    chunk = queue_entry.chunks[chunk_index]
+    engine = send_engine.SMSSendEngine(rate)
+    template = worker.compile_template(campaign.message)
+    exclude = worker.make_dnc_filter(worker.get_dnc_owners(user_id))
+
+    sent = failed = 0
+    after_seq = chunk.start_seq
+    # The worker prints a line per message, which would dominate the profile
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while True:
+            batch, after_seq = worker.fetch_audience_batch(
+                worker.mongo_audience_collection, queue_id, campaign.batch_size.value, after_seq=after_seq,
+                end_seq=chunk.end_seq, exclude=exclude
+            )
+            if not batch:
+                break
+            batch_sent, batch_failed, _ = worker.send_batch(queue_entry, campaign, template, user_id, engine, batch)
+            sent += batch_sent
+            failed += batch_failed
+
+    return sent, failed, latencies, peak_rss_mb()
+
+
+def benchmark(size: int, args) -> dict:
+    import worker
+
+    queue_id, user_id = seed_campaign(size, args.batch_size)
+    try:
+        ranges = worker.split_audience_ranges(size, args.chunk_size, args.processes, align=args.batch_size)
+        worker.mongo_queue_collection.update_one({"_id": ObjectId(queue_id)}, {"$set": {"chunks": [
+            {"index": index, **chunk_range, "last_seq": None, "completed": False}
+            for index, chunk_range in enumerate(ranges)
+        ]}})
+
+        # Each chunk gets its share of the target rate, as in the worker; 0 sends as fast as the mock allows
+        rate = args.rate / len(ranges) if args.rate else 0
+        started = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(len(ranges)) as pool:
+            results = pool.map(run_chunk, [(queue_id, user_id, index, rate) for index in range(len(ranges))])
+        elapsed = time.perf_counter() - started
+    finally:
+        cleanup_campaign(queue_id, user_id)
+
+    latencies = np.concatenate([np.frombuffer(result[2], dtype=np.float64) for result in results])
+    sent = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    return {
+        "recipients": size,
+        "chunks": len(ranges),
+        "sent": sent,
+        "failed": failed,
+        "seconds": elapsed,
+        "msgs_per_sec": (sent + failed) / elapsed if elapsed else 0,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else 0,
+        "p99_ms": float(np.percentile(latencies, 99) * 1000) if len(latencies) else 0,
+        "peak_rss_mb": max(result[3] for result in results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mock-url", default="http://127.0.0.1:4010")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--batch-size", type=int, choices=[50, 100, 150, 200], default=200)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=4, help="Maximum chunks, one sending process each")
+    parser.add_argument("--concurrency", type=int, default=10, help="Vonage requests in flight per process")
+    parser.add_argument("--rate", type=float, default=0, help="Messages/sec target for the campaign, 0 = unpaced")
+    args = parser.parse_args()
+
+    configure_environment(args)
+
+    print(f"{'recipients':>10} {'chunks':>6} {'sent':>9} {'failed':>7} {'seconds':>9} {'msgs/sec':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    for size in args.sizes:
+        result = benchmark(size, args)
+        print(f"{result['recipients']:>10} {result['chunks']:>6} {result['sent']:>9} {result['failed']:>7} "
+              f"{result['seconds']:>9.1f} {result['msgs_per_sec']:>9.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['peak_rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,18 @@ client = motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
 db = client.get_database("fastapi")
 user_collection = db.get_collection("users")
 dnc_collection = db.get_collection("dnc")
+dnc_version_collection = db.get_collection("dnc versions")
 # contact_group_collection = db.get_collection("contact-list")
 contact_collection = db.get_collection("contact")
 sms_campaign_collection = db.get_collection("sms campaign")
 sms_queue_collection = db.get_collection("sms queue")
 campaign_chat_collection = db.get_collection("campaign chat")
 messages_collection = db["messages"]
+reply_route_collection = db.get_collection("reply routes")
+stream_event_collection = db.get_collection("stream events")
+stream_counter_collection = db.get_collection("stream counters")
+audience_collection = db.get_collection("campaign audience")
+campaign_stats_collection = db.get_collection("campaign stats")
+conversation_collection = db.get_collection("conversations")
+import_job_collection = db.get_collection("import jobs")
+contact_group_collection = db.get_collection("contact groups")
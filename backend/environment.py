@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -30,3 +31,33 @@ SMTP_DOMAIN = os.getenv("SMTP_DOMAIN")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 MESSAGE_STATUS_URL = os.getenv("MESSAGE_STATUS_URL")
 MESSAGE_REPLY_URL = os.getenv("MESSAGE_REPLY_URL")
+VONAGE_REST_URL = os.getenv("VONAGE_REST_URL", "https://rest.nexmo.com")
+SMS_SEND_CONCURRENCY = int(os.getenv("SMS_SEND_CONCURRENCY", "10"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "redis")
+SENDER_RATE_LIMIT = float(os.getenv("SENDER_RATE_LIMIT", "10"))  # Messages per second per sender number
+ACCOUNT_RATE_LIMIT = float(os.getenv("ACCOUNT_RATE_LIMIT", "30"))  # Messages per second per Vonage API account
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", "5000"))  # Recipients per parallel chunk task
+SENDER_MAX_CHUNKS = int(os.getenv("SENDER_MAX_CHUNKS", "4"))  # Default cap on parallel chunks per sender number
+SENDER_CHUNK_LIMITS = json.loads(os.getenv("SENDER_CHUNK_LIMITS", "{}"))  # e.g. {"12015550123": 8}
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))  # Prometheus port of the Celery worker, 0 disables
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", "1000"))  # Delivery receipts per bulk write
+RECEIPT_FLUSH_INTERVAL = float(os.getenv("RECEIPT_FLUSH_INTERVAL", "0.05"))  # Seconds to coalesce receipts
+RECEIPT_BUFFER_SIZE = int(os.getenv("RECEIPT_BUFFER_SIZE", "50000"))  # Pending receipts before pushing back
+REPLY_ROUTE_CACHE_SIZE = int(os.getenv("REPLY_ROUTE_CACHE_SIZE", "10000"))  # Inbound reply routes cached per process
+REPLY_ROUTE_CACHE_TTL = float(os.getenv("REPLY_ROUTE_CACHE_TTL", "60"))  # Seconds a cached route stays valid
+STREAM_BROKER = os.getenv("STREAM_BROKER", "redis")  # "redis" to relay /stream/replies events across processes
+STREAM_SEND_QUEUE_SIZE = int(os.getenv("STREAM_SEND_QUEUE_SIZE", "100"))  # Pending events per socket before dropping it
+STREAM_EVENT_LOG_SIZE = int(os.getenv("STREAM_EVENT_LOG_SIZE", "500"))  # Replayable /stream/replies events per user
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "5"))  # Seconds between scheduler polls
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))  # Campaigns dispatched per poll at most
+SCHEDULER_CLAIM_LEASE = int(os.getenv("SCHEDULER_CLAIM_LEASE", "300"))  # Seconds before an undispatched claim is retried
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))  # Items per page of list endpoints without ?limit
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))  # Largest ?limit list endpoints accept
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))  # CSV rows parsed and upserted per bulk write
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))  # Failed rows reported on an import job
+PHONE_DEFAULT_REGION = os.getenv("PHONE_DEFAULT_REGION", "US")  # Region of phone numbers given without a country code
+PHONE_VALIDATION = os.getenv("PHONE_VALIDATION", "valid")  # "valid" (assigned ranges) or "possible" (length only)
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_CACHE_SIZE", "100000"))  # Normalised phone numbers memoised per process
+GROUP_REMOVAL_BATCH_SIZE = int(os.getenv("GROUP_REMOVAL_BATCH_SIZE", "50000"))  # Contacts per range of a group removal
+MONGODB_TRANSACTIONS = os.getenv("MONGODB_TRANSACTIONS", "false").lower() == "true"  # Needs a replica set
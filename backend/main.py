@@ -1,43 +1,62 @@
-import json
+import asyncio
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict
 
 import uvicorn
 from fastapi import FastAPI, Request, Response, HTTPException, status, WebSocket, WebSocketDisconnect
+from prometheus_client import CONTENT_TYPE_LATEST
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo.errors import DuplicateKeyError, BulkWriteError
 from vonage_jwt.verify_jwt import verify_signature
 
-from database import user_collection, dnc_collection, contact_collection, sms_campaign_collection, messages_collection
-from environment import VONAGE_SIGNATURE_SECRET
+from database import db, user_collection, dnc_collection, messages_collection, dnc_version_collection, \
+    reply_route_collection, stream_event_collection, stream_counter_collection, campaign_stats_collection, \
+    conversation_collection
+from environment import VONAGE_SIGNATURE_SECRET, RECEIPT_BATCH_SIZE, RECEIPT_FLUSH_INTERVAL, RECEIPT_BUFFER_SIZE, \
+    REPLY_ROUTE_CACHE_SIZE, REPLY_ROUTE_CACHE_TTL
 from models.auth_models import IdentityFields
-from models.base_models import BaseResponse, PyObjectId
+from models.base_models import BaseResponse
 from models.dnc_models import DNCEntry
 from models.sms_models import MessageStatus, MessageType
 from routers import admin
 from routers import auth, user, dnc, profile, campaign
 from routers.utilities import get_current_user
 from utilities import debug, logger, verify_email_token
+from utils.campaign_stats import record_reply
+from utils.contact_import import stop_imports
+from utils.conversations import record_incoming
+from utils.dnc_index import bump_dnc_version, PLATFORM_DNC_OWNER
+from utils.indexes import sync_indexes
+from utils.metrics import latest_metrics, WEBHOOK_SECONDS
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.phone_numbers import normalize_phone_number
+from utils.receipt_buffer import ReceiptBuffer, ReceiptBufferFull
+from utils.reply_routes import RouteCache, lookup_route
+from utils.stream_events import StreamEventLog
+from utils.stream_fanout import ConnectionManager, get_stream_broker
 
 tags = []
+receipt_buffer = ReceiptBuffer(messages_collection, batch_size=RECEIPT_BATCH_SIZE, flush_interval=RECEIPT_FLUSH_INTERVAL,
+                               max_pending=RECEIPT_BUFFER_SIZE, stats_collection=campaign_stats_collection)
+reply_route_cache = RouteCache(REPLY_ROUTE_CACHE_SIZE, REPLY_ROUTE_CACHE_TTL)
+webhook_paths = {"/messages/status", "/messages/inbound", "/special/progress", "/special/replies"}
 
 
 @asynccontextmanager
 async def lifespan(fastapp: FastAPI):
-    user_collection.create_index({"username": 1}, unique=True)
-    user_collection.create_index({"email": 1}, unique=True)
-    user_collection.create_index({"created_by": 1})
-    dnc_collection.create_index({"phone_number": 1, "created_by": 1}, unique=True)
-    contact_collection.create_index({"phone_number": 1, "created_by": 1, "group": 1}, unique=True)
-    contact_collection.create_index({"groups": 1})
-    sms_campaign_collection.create_index({"name": 1}, unique=True)
-    messages_collection.create_index({"phone_number", 1})
-    messages_collection.create_index({"sent_at", 1})
+    # Diff the index registry against the live indexes and build what's missing without holding up startup
+    index_build = asyncio.create_task(sync_indexes(db))
 
     logger.info("LOGGER WORKS")
 
+    receipt_buffer.start()
+    await manager.start()
     yield
+    await stop_imports()
+    await manager.stop()
+    await receipt_buffer.stop()
+    index_build.cancel()
 
 
 app = FastAPI(openapi_tags=tags, lifespan=lifespan, redirect_slashes=False)
@@ -48,7 +67,7 @@ origins = [
 ]
 
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"],
-                   allow_headers=["*"])
+                   allow_headers=["*"], expose_headers=[NEXT_CURSOR_HEADER])
 
 app.include_router(auth.router)
 app.include_router(profile.router)
@@ -58,48 +77,44 @@ app.include_router(dnc.router)
 app.include_router(campaign.router)
 
 
+@app.middleware("http")
+async def time_webhooks(request: Request, call_next):
+    if request.url.path not in webhook_paths:
+        return await call_next(request)
+
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        WEBHOOK_SECONDS.labels(request.url.path).observe(time.perf_counter() - started)
+
+
 @app.get("")
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
 
-# Store active connections
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: PyObjectId):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-
-    def disconnect(self, websocket: WebSocket, user_id: PyObjectId | None):
-        if user_id:
-            self.active_connections.pop(user_id, None)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str, user_ids: List[str]):
-        for user_id in user_ids:
-            connection = self.active_connections.get(user_id)
-            if connection:
-                await connection.send_text(message)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(latest_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 
-manager = ConnectionManager()
+# Open /stream/replies sockets of this process, events relayed between processes by the broker
+manager = ConnectionManager(get_stream_broker(), StreamEventLog(stream_event_collection, stream_counter_collection))
 
 
 @app.websocket("/stream/replies")  # {user_id}
-async def websocket_endpoint(websocket: WebSocket, token: str = ""):  # user_id: str
+async def websocket_endpoint(websocket: WebSocket, token: str = "", last_event_id: int | None = None):
+    # Reconnecting clients pass the last event_id they saw and get only the events they missed
     user = await get_current_user(token, True)
-    await manager.connect(websocket, user.id)
+    connection = await manager.connect(websocket, user.id, last_event_id)
     try:
         while True:
             data = await websocket.receive_text()  # This can receive a message from the client
             debug(f"Received message from: {data}")
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user.id)
+        manager.disconnect(connection, user.id)
         debug(f"User disconnected")
 
 
@@ -145,33 +160,36 @@ async def receive_receipts(request: Request):
     # is_vonage = verify_vonage_signature(headers)
     status_info = dict(request.query_params)
     debug("STATUS HEADERS RECEIVED", status_info)
-    await messages_collection.update_one(
-        {"sender_did": status_info.get("to"), "recipient_did": status_info.get("msisdn"),
-         "message_id": status_info.get("messageId")}, {"$set": {
-            "status": status_info.get("status")
-        }})
+    try:
+        await receipt_buffer.add(status_info)
+    except ReceiptBufferFull:
+        # Vonage retries receipts that aren't acknowledged with a 200
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
     return Response(status_code=status.HTTP_200_OK)
     # if not is_vonage:
     #     return HTTPStatus.BAD_REQUEST
 
 
+def normalize_msisdn(number: str | None) -> str | None:
+    # Vonage already sends E.164 digits; numbers that don't parse (e.g. short codes) are kept as received
+    return normalize_phone_number(number) or number
+
+
 @app.get("/messages/inbound", response_model=None)
 async def receive_replies(request: Request):
     try:
         message_data = dict(request.query_params)
         message = message_data.get("text")
-        sender_msisdn = message_data.get("msisdn")
-        recipient_did = message_data.get("to")
+        sender_msisdn = normalize_msisdn(message_data.get("msisdn"))
+        recipient_did = normalize_msisdn(message_data.get("to"))
+
+        # Campaigns and users that messaged this phone from this number, in one indexed lookup
+        route = await lookup_route(reply_route_collection, reply_route_cache, recipient_did, sender_msisdn)
 
         if message.lower() == "stop":
-            matching_campaigns = await sms_campaign_collection.find({
-                "sender_msisdn": recipient_did
-            }).to_list(None)
-
-            if matching_campaigns:
-                # Collect unique users who created these campaigns
-                user_ids = {campaign['created_by'] for campaign in matching_campaigns if
-                            campaign["include_opt_out"] == True}
+            if route:
+                # Users whose campaigns to this phone allow opting out
+                user_ids = set(route.get("opt_out_users", []))
                 dnc_list = []
 
                 # Add the number to the DNC list for each user
@@ -194,10 +212,11 @@ async def receive_replies(request: Request):
                         debug(f"Contact(s) already in DNC")
                     except BulkWriteError as e:
                         debug("Bulk write error occurred", e)
+                    await bump_dnc_version(dnc_version_collection, user_ids)
                 else:
                     debug("Matching campaigns have disabled opt-out")
             else:
-                print("No campaigns found with the matching sender_msisdn.")
+                print("No campaigns sent to this number from the matching sender_msisdn.")
 
             # TODO: Implement logic to get the user's id, instead of "admin"
             # dnc_contact = DNCEntry(phone_number=sender_msisdn, reason="Opted out", added_at=datetime.now(pst_tz),
@@ -214,17 +233,8 @@ async def receive_replies(request: Request):
         message_datetime = datetime.strptime(message_data.get("message-timestamp"), timestamp_format)
         debug("Converted datetime:", message_datetime)
 
-        related_campaign_ids = []
-        related_user_ids = []
-        contact = await contact_collection.find_one({"phone_number": sender_msisdn})
-        if contact:
-            related_campaigns = await sms_campaign_collection.find(
-                {"contact_groups": {"$in": contact["groups"]}}
-            ).to_list(length=None)
-
-            # Extract campaign IDs
-            related_campaign_ids = [str(campaign["_id"]) for campaign in related_campaigns]
-            related_user_ids = list({str(campaign["created_by"]) for campaign in related_campaigns})
+        related_campaign_ids = route["campaigns"] if route else []
+        related_user_ids = route["users"] if route else []
 
         db_message = {
             "type": MessageType.reply,
@@ -240,14 +250,22 @@ async def receive_replies(request: Request):
             "users": related_user_ids
         }
 
-        result = await messages_collection.insert_one(db_message)
+        try:
+            result = await messages_collection.insert_one(db_message)
+        except DuplicateKeyError:
+            # Vonage redelivers replies it didn't see acknowledged; this one is already stored, counted and pushed
+            debug(f"Reply {db_message['message_id']} was already received")
+            return Response(status_code=status.HTTP_200_OK)
+        await record_reply(campaign_stats_collection, related_campaign_ids)
+        await record_incoming(conversation_collection, related_campaign_ids, recipient_did, sender_msisdn, message,
+                              message_datetime)
         if result.inserted_id:
             ws_msg = db_message.copy()
             ws_msg.pop("_id", None)
             ws_msg["id"] = str(result.inserted_id)
             ws_msg["sent_at"] = message_datetime.isoformat()
             debug("WEBSOCKET MESSAGE: ", ws_msg)
-            await manager.broadcast(json.dumps(ws_msg), related_user_ids)
+            await manager.publish_event(ws_msg, related_user_ids)
         # debug(db_message, result)
 
         return Response(status_code=status.HTTP_200_OK)
@@ -261,11 +279,11 @@ async def receive_receipts(request: Request):
     # is_vonage = verify_vonage_signature(headers)
     status_info = dict(request.query_params)
     debug("STATUS HEADERS RECEIVED", status_info)
-    await messages_collection.update_one(
-        {"sender_did": status_info.get("to"), "recipient_did": status_info.get("msisdn"),
-         "message_id": status_info.get("messageId")}, {"$set": {
-            "status": status_info.get("status")
-        }})
+    try:
+        await receipt_buffer.add(status_info)
+    except ReceiptBufferFull:
+        # Vonage retries receipts that aren't acknowledged with a 200
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
     return Response(status_code=status.HTTP_200_OK)
     # if not is_vonage:
     #     return HTTPStatus.BAD_REQUEST
@@ -276,36 +294,34 @@ async def receive_replies(request: Request):
     try:
         message_data = dict(request.query_params)
         message = message_data.get("text")
-        sender_msisdn = message_data.get("msisdn")
+        sender_msisdn = normalize_msisdn(message_data.get("msisdn"))
+        recipient_did = normalize_msisdn(message_data.get("to"))
 
         if message.lower() == "stop":
             dnc_contact = DNCEntry(phone_number=sender_msisdn, reason="Opted out", added_at=datetime.utcnow(),
-                                   created_by="admin", scope="user")
-            add_dnc = await dnc_collection.insert_one(dnc_contact.model_dump(exclude_unset=True))
-            debug(add_dnc.inserted_id)
+                                   created_by=PLATFORM_DNC_OWNER, scope="user")
+            try:
+                add_dnc = await dnc_collection.insert_one(dnc_contact.model_dump(exclude_unset=True))
+                debug(add_dnc.inserted_id)
+            except DuplicateKeyError:
+                # Already opted out, e.g. a redelivered STOP; the reply itself is still stored below
+                debug("Contact already in DNC")
+            await bump_dnc_version(dnc_version_collection, [PLATFORM_DNC_OWNER])
         # debug(message_data)
 
         timestamp_format = "%Y-%m-%d %H:%M:%S"
         message_datetime = datetime.strptime(message_data.get("message-timestamp"), timestamp_format)
         debug("Converted datetime:", message_datetime)
 
-        related_campaign_ids = []
-        related_user_ids = []
-        contact = await contact_collection.find_one({"phone_number": sender_msisdn})
-        if contact:
-            related_campaigns = await sms_campaign_collection.find(
-                {"contact_groups": {"$in": contact["groups"]}}
-            ).to_list(length=None)
-
-            # Extract campaign IDs
-            related_campaign_ids = [str(campaign["_id"]) for campaign in related_campaigns]
-            related_user_ids = [str(campaign["created_by"]) for campaign in related_campaigns]
+        route = await lookup_route(reply_route_collection, reply_route_cache, recipient_did, sender_msisdn)
+        related_campaign_ids = route["campaigns"] if route else []
+        related_user_ids = route["users"] if route else []
 
         db_message = {
             "type": MessageType.reply,
             "message_type": message_data.get("type"),
             "sender_did": sender_msisdn,
-            "recipient_did": message_data.get("to"),
+            "recipient_did": recipient_did,
             "keyword": message_data.get("keyword"),
             "message_id": message_data.get("messageId"),
             "message": message,
@@ -315,7 +331,14 @@ async def receive_replies(request: Request):
             "users": related_user_ids
         }
 
-        results = await messages_collection.insert_one(db_message)
+        try:
+            results = await messages_collection.insert_one(db_message)
+        except DuplicateKeyError:
+            debug(f"Reply {db_message['message_id']} was already received")
+            return Response(status_code=status.HTTP_200_OK)
+        await record_reply(campaign_stats_collection, related_campaign_ids)
+        await record_incoming(conversation_collection, related_campaign_ids, recipient_did, sender_msisdn,
+                              message, message_datetime)
         debug(db_message, results)
 
         return Response(status_code=status.HTTP_200_OK)
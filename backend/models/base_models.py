@@ -9,8 +9,10 @@ from pydantic_extra_types.country import CountryAlpha2
 from vonage_utils.types import PhoneNumber
 
 from utilities import pst_tz
+from utils.phone_numbers import canonical_phone_number
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
+E164Number = Annotated[str, BeforeValidator(canonical_phone_number)]  # Canonical E.164 digits, see utils.phone_numbers
 
 
 class PSTConversionMixin:
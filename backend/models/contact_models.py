@@ -1,16 +1,15 @@
 from datetime import datetime
+from enum import Enum
 from typing import List
 
 from pydantic import BaseModel, Field, ConfigDict
-from vonage_utils.types import PhoneNumber
-
-from models.base_models import PyObjectId, UpdateModelResponse
+from models.base_models import PyObjectId, UpdateModelResponse, E164Number
 from utilities import make_optional_fields
 
 
 class BaseContact(BaseModel):
     name: str = Field(min_length=1)
-    phone_number: PhoneNumber
+    phone_number: E164Number
     groups: List[str] = Field(min_length=1, default=["default"])
 
 
@@ -24,6 +23,7 @@ OptionalContactUpdates = make_optional_fields(UpdateContact, model_name="Optiona
 
 
 class ContactEntry(UpdateContact):
+    phone_number: str  # As stored
     created_by: PyObjectId | None
     added_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime | None = None
@@ -32,3 +32,39 @@ class ContactEntry(UpdateContact):
 class ImportContactResponse(UpdateModelResponse):
     results: list[ContactEntry]
     # list[DNCEntry]
+
+
+class ContactGroup(BaseModel):
+    name: str
+    member_count: int
+    dnc_excluded_count: int  # Members on the owner's DNC lists
+    updated_at: datetime
+
+
+class ImportJobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class ImportRowError(BaseModel):
+    row: int  # Spreadsheet row, the header being row 1
+    error: str
+
+
+class ImportJob(BaseModel):
+    id: PyObjectId = Field(alias='_id')
+    group: str
+    filename: str
+    status: ImportJobStatus
+    estimated_rows: int  # From the upload's line count, exact unless values span lines
+    processed_rows: int = 0
+    added: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []  # The first IMPORT_MAX_ERRORS failed rows
+    error: str | None = None  # Why the whole import failed
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
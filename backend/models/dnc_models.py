@@ -2,9 +2,8 @@ from datetime import datetime
 from enum import Enum
 
 from pydantic import BaseModel, Field, ConfigDict
-from vonage_utils.types import PhoneNumber
 
-from models.base_models import PyObjectId
+from models.base_models import PyObjectId, E164Number
 
 
 class DNCScope(str, Enum):
@@ -18,7 +17,7 @@ class DNCScope(str, Enum):
 
 class BaseDNCEditable(BaseModel):
     name: str = Field(min_length=1, max_length=255)
-    phone_number: PhoneNumber | None
+    phone_number: E164Number | None
 
     model_config = ConfigDict(extra="forbid")
 
@@ -29,6 +28,7 @@ class BaseDNC(BaseDNCEditable):
 
 class DNCEntry(BaseDNC):
     id: PyObjectId | None = Field(None, alias="_id")
+    phone_number: str | None  # As stored
     added_at: datetime | None = None
     # updated_at: datetime | None = None
     created_by: PyObjectId | None
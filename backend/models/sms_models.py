@@ -120,6 +120,15 @@ class SMSCampaignStatus(str, Enum):
     failed = "failed"
 
 
+class QueueChunk(BaseModel):
+    index: int
+    start_seq: int = 0  # Exclusive lower bound in the audience snapshot
+    end_seq: int = 0  # Inclusive upper bound in the audience snapshot
+    last_seq: int | None = None  # Resume point of the chunk's recipient stream
+    completed: bool = False
+    run_id: str | None = None  # Current dispatch of the chunk, continuations carrying another one are stale
+
+
 class SMSCampaignQueue(BaseModel):
     id: PyObjectId | None = Field(None, alias="_id")
     campaign_id: PyObjectId | None = None
@@ -130,6 +139,12 @@ class SMSCampaignQueue(BaseModel):
     created_by: PyObjectId | None = None
     task_id: str | None = None
     schedule_time: datetime
+    audience_size: int | None = None  # Recipients in the audience snapshot, None for entries queued before snapshots
+    chunks: List[QueueChunk] = []
+    chunks_completed: int = 0
+    sent_count: int = 0
+    failed_count: int = 0
+    segment_count: int = 0  # Billed SMS segments of the messages sent so far
 
 
 class SMSCampaignQueueWithCampaign(SMSCampaignQueue):
@@ -142,6 +157,11 @@ class ChatContacts(BaseModel):
     original_sender: PhoneNumber
     original_recipient: PhoneNumber
     info: BaseContact
+    last_message: str | None = None
+    last_message_at: datetime | None = None
+    last_reply_at: datetime | None = None
+    reply_count: int = 0
+    unread_count: int = 0  # Replies since the chat was last opened
 
 
 class Reply(BaseModel):
@@ -161,6 +181,7 @@ class Message(BaseModel):
     status: MessageStatus
     campaigns: List[PyObjectId] = []
     users: List[PyObjectId] = []
+    segments: int | None = None
 
     # keyword: str
 
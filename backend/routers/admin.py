@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 from typing import List, Annotated
 
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks, Body
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks, Body, Response
 from pymongo import UpdateOne
 from pymongo.errors import DuplicateKeyError
 
@@ -11,6 +11,7 @@ from models.auth_models import UserWithUUID, UserCreate, DBUser, OptionalUserUpd
     VonageNumberWithUsers
 from models.base_models import BaseResponse, VonageNumberSearch, PyObjectId, VonageNumberSearchResult
 from utilities import validate_ids, debug, acquire_number
+from utils.pagination import PageParams, page_params, paginate, set_next_cursor
 from vonage_api import vonage_client
 from . import contact, profile, admin_reports, dnc
 from .utilities import verify_users_created_by_same_admin, get_password_hash, get_current_admin
@@ -24,8 +25,12 @@ CurrentAdminDependency = Depends(get_current_admin, use_cache=True)
 
 
 @router.get("/get/users", response_model=List[UserWithMSI])
-async def get_users(current_admin: Annotated[UserWithUUID, Depends(get_current_admin)]):
-    results = await user_collection.find({"created_by": current_admin.id}).to_list(length=None)
+async def get_users(current_admin: Annotated[UserWithUUID, Depends(get_current_admin)],
+                    page: Annotated[PageParams, Depends(page_params)],
+                    response: Response):
+    results, next_cursor = await paginate(user_collection, {"created_by": current_admin.id}, page,
+                                          projection={"hashed_password": 0})
+    set_next_cursor(response, next_cursor)
     return results
 
 
@@ -4,24 +4,41 @@ from typing import List, Annotated, Optional, Union
 
 from bson import ObjectId
 from celery.result import AsyncResult
-from fastapi import Depends, APIRouter, HTTPException, status, Body
-from pymongo import ReturnDocument
-from vonage_utils.types import PhoneNumber
+from fastapi import Depends, APIRouter, HTTPException, status, Body, Response, Query
+from pymongo import ReturnDocument, UpdateOne
 
 from database import contact_collection, sms_campaign_collection, sms_queue_collection, campaign_chat_collection, \
-    messages_collection
+    messages_collection, audience_collection, campaign_stats_collection, conversation_collection, \
+    contact_group_collection
 from environment import MESSAGE_STATUS_URL
 from models.auth_models import UserWithMSI
-from models.base_models import PyObjectId, BaseResponse
+from models.base_models import PyObjectId, BaseResponse, E164Number
 from models.sms_models import SMSCampaign, SMSCampaignQueue, SMSCampaignStatus, CampaignChat, SMSCampaignForm, \
     SMSCampaignFromDB, SMSCampaignQueueWithCampaign, QueueStatusUpdate, Message, CampaignWithMsg, ChatContacts, Reply, \
     MessageStatus, MessageType
 from utilities import debug, validate_message
-from vonage_api import vonage_client
+from utils.audience import build_audiences
+from utils.campaign_stats import record_sent
+from utils.contact_groups import bootstrap_groups, estimate_audience
+from utils.conversations import CONVERSATION_PROJECTION, mark_read, record_outgoing
+from utils.dnc_index import dnc_scope_owners
+from utils.indexes import ensure_indexes_async
+from utils.message_template import analyse_text
+from utils.pagination import PageParams, page_params, paginate, set_next_cursor
+from utils.rate_limiter import get_rate_limiter, RateLimitExceeded
+from utils.send_engine import send_sms
 from worker import send_bulk_sms
 from .utilities import get_current_active_user
 
 router = APIRouter(prefix="/sms", tags=["sms"])
+REPLY_MAX_RATE_LIMIT_WAIT = 5  # Seconds a chat reply may wait for a send token before being refused
+
+
+async def estimate_groups_audience(current_user: UserWithMSI, groups: List[str]) -> tuple[int, List[str]]:
+    # Users whose contacts predate the group catalogue get theirs built first
+    dnc_owners = dnc_scope_owners(current_user.id, current_user.created_by)
+    await bootstrap_groups(contact_collection, contact_group_collection, current_user.id, dnc_owners)
+    return await estimate_audience(contact_group_collection, current_user.id, groups)
 
 
 @router.get("/campaigns", response_model=List[SMSCampaignFromDB])
@@ -33,14 +50,11 @@ async def list_sms_campaigns(current_user: Annotated[UserWithMSI, Depends(get_cu
 @router.post("/campaigns", response_model=SMSCampaignFromDB)
 async def create_sms_campaign(campaign_data: SMSCampaignForm,
                               current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]):
-    # Step 1: Fetch all groups from the contacts created by the current user
     validate_message(campaign_data.message)
-    user_contacts = await contact_collection.find({"created_by": current_user.id}).to_list(length=None)
-    existing_groups = {group for contact in user_contacts for group in contact['groups']}
 
-    # Step 2: Check if all groups in campaign_data.contact_groups exist
-    missing_groups = [group for group in campaign_data.contact_groups if group not in existing_groups]
-    debug(existing_groups, "-------------================------------------", missing_groups)
+    # Check that all the campaign's groups exist, from the group catalogue
+    _, missing_groups = await estimate_groups_audience(current_user, campaign_data.contact_groups)
+    debug(campaign_data.contact_groups, "-------------================------------------", missing_groups)
     if missing_groups:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -89,6 +103,14 @@ async def create_sms_campaign(campaign_data: SMSCampaignForm,
     return new_campaign
 
 
+@router.get("/campaigns/estimate", response_model=BaseResponse)
+async def estimate_campaign_audience(contact_groups: Annotated[List[str], Query()],
+                                     current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]):
+    estimated_recipients, missing_groups = await estimate_groups_audience(current_user, contact_groups)
+    return BaseResponse(success=True, data={"estimated_recipients": estimated_recipients,
+                                            "missing_groups": missing_groups})
+
+
 @router.delete("/campaigns", response_model=BaseResponse)
 async def delete_campaign_queues(
         campaign_ids: Annotated[List[PyObjectId], Body()],
@@ -112,6 +134,7 @@ async def delete_campaign_queues(
     result = await sms_campaign_collection.delete_many(
         {"_id": {"$in": [entry["_id"] for entry in deleted_entries]}, "created_by": current_user.id}
     )
+    await campaign_stats_collection.delete_many({"_id": {"$in": [entry["_id"] for entry in deleted_entries]}})
 
     if result.deleted_count == 0:
         raise HTTPException(
@@ -125,22 +148,23 @@ async def delete_campaign_queues(
 
 
 @router.get("/queue", response_model=List[SMSCampaignQueueWithCampaign])
-async def list_sms_campaign_queue(current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]):
-    # Fetch all queued campaigns created by the current user
-    queued_campaigns = await sms_queue_collection.find(
-        {"created_by": current_user.id}
-    ).to_list(length=None)
-
-    if not queued_campaigns:
+async def list_sms_campaign_queue(current_user: Annotated[UserWithMSI, Depends(get_current_active_user)],
+                                  page: Annotated[PageParams, Depends(page_params)],
+                                  response: Response):
+    # Fetch a page of the queued campaigns created by the current user
+    queued_campaigns, next_cursor = await paginate(sms_queue_collection, {"created_by": current_user.id}, page)
+    set_next_cursor(response, next_cursor)
+
+    if not queued_campaigns and not page.cursor:
         raise HTTPException(status_code=404, detail="No queued campaigns found.")
 
-    # Fetch details of the campaigns
-    campaign_ids = [ObjectId(queue['campaign_id']) for queue in queued_campaigns]
+    # Fetch details of the page's campaigns
+    campaign_ids = list({ObjectId(queue['campaign_id']) for queue in queued_campaigns})
     # debug(campaign_ids)
 
     campaigns = await sms_campaign_collection.find(
         {"_id": {"$in": campaign_ids}}
-    ).to_list(length=None)
+    ).to_list(len(campaign_ids))
 
     campaign_map = {str(campaign['_id']): campaign for campaign in campaigns}
     # debug(campaigns, campaign_map)
@@ -185,25 +209,40 @@ async def add_campaigns_to_queue(
             detail=f"Campaign(s) {', '.join(missing_ids)} not found or unauthorized"
         )
 
-    # Prepare queue entries
-    now = datetime.now(timezone.utc)
-    new_queue_data = []
+    # find() returns campaigns in any order, pair them with their start times by ID
+    campaigns_by_id = {str(campaign["_id"]): campaign for campaign in campaigns}
+    campaigns = [campaigns_by_id[str(cid)] for cid in campaign_ids]
+
+    # Freeze every audience in one aggregation: groups resolved, duplicates and DNC numbers removed, rows numbered
+    # for the worker. Queue IDs are pre-generated since the audience rows are keyed by them.
+    queue_ids = [ObjectId() for _ in campaigns]
+    dnc_owners = dnc_scope_owners(current_user.id, current_user.created_by)
+    await ensure_indexes_async(audience_collection)  # $merge needs the unique (queue_id, seq) index
+    audience_sizes = await build_audiences(
+        contact_collection, audience_collection, current_user.id,
+        {str(queue_id): campaign["contact_groups"] for queue_id, campaign in zip(queue_ids, campaigns)}, dnc_owners
+    )
 
-    for campaign, start_time in zip(campaigns, start_times):
-        campaign_contacts = await contact_collection.count_documents(
-            {"created_by": campaign["created_by"], "groups": {"$in": campaign["contact_groups"]}}
+    empty_campaigns = [str(campaign["_id"]) for queue_id, campaign in zip(queue_ids, campaigns)
+                       if audience_sizes[str(queue_id)] == 0]
+    if empty_campaigns:
+        await audience_collection.delete_many({"queue_id": {"$in": list(audience_sizes)}})
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No contacts found for campaign(s) {', '.join(empty_campaigns)}"
         )
 
-        if campaign_contacts == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"No contacts found for campaign '{campaign['_id']}'"
-            )
+    # Prepare queue entries
+    now = datetime.now(timezone.utc)
+    new_queue_data = []
 
-        total_batches = ceil(campaign_contacts / campaign["batch_size"])
+    for queue_id, campaign, start_time in zip(queue_ids, campaigns, start_times):
+        schedule_time = start_time.replace(tzinfo=timezone.utc) if start_time else now
+        audience_size = audience_sizes[str(queue_id)]
+        total_batches = ceil(audience_size / campaign["batch_size"])
 
-        # Determine the status based on the start_time
-        campaign_status = SMSCampaignStatus.scheduled if start_time else SMSCampaignStatus.in_progress
+        # Future campaigns are left to the scheduler process, the rest start right away
+        campaign_status = SMSCampaignStatus.scheduled if schedule_time > now else SMSCampaignStatus.in_progress
 
         # Create the queue entry with the given start_time or immediate start
         queue_data = SMSCampaignQueue(
@@ -213,45 +252,30 @@ async def add_campaigns_to_queue(
             total_batches=total_batches,
             created_at=now,
             created_by=current_user.id,  # Store the user ID
-            schedule_time=start_time if start_time else now  # Store the schedule time in the queue
+            schedule_time=schedule_time,  # Store the schedule time in the queue
+            audience_size=audience_size
         )
         queue_entry = queue_data.model_dump(exclude_unset=True, by_alias=True)
+        queue_entry["_id"] = queue_id
         new_queue_data.append(queue_entry)
 
     # Insert all queue entries in a single operation
     result = await sms_queue_collection.insert_many(new_queue_data)
 
-    # Schedule SMS sending tasks
-    for queue_id, (campaign, start_time) in zip(result.inserted_ids, zip(campaigns, start_times)):
-        celery_task = None
-        debug("Starting task soon: ", queue_id, campaign, start_time)
-
-        if start_time:  # If start_time is provided (datetime), schedule it
-            schedule_time = start_time.replace(tzinfo=timezone.utc)
-            delay = (schedule_time - now).total_seconds()
-            debug(delay)
-
-            if delay > 0:
-                # Schedule the task for the future
-                celery_task = send_bulk_sms.apply_async(
-                    (str(queue_id), current_user.id),
-                    countdown=delay
-                )
-                debug("Task in future", celery_task)
-            else:
-                # If the scheduled time has already passed, run it immediately
-                celery_task = send_bulk_sms.delay(str(queue_id), current_user.id)
-                debug("Task in present because time is past", celery_task)
-        else:
-            # Run the campaign immediately
-            celery_task = send_bulk_sms.delay(str(queue_id), current_user.id)
-            debug("Task in present as requested", celery_task)
-
-        # Update the task_id in the queue entry
-        await sms_queue_collection.update_one(
-            {"_id": queue_id},
-            {"$set": {"task_id": celery_task.id}}
-        )
+    # Start the immediate campaigns; scheduled ones are dispatched by the scheduler process when due
+    task_updates = []
+    for queue_id, queue_entry in zip(result.inserted_ids, new_queue_data):
+        if queue_entry["status"] == SMSCampaignStatus.scheduled:
+            debug("Task scheduled for: ", queue_id, queue_entry["schedule_time"])
+            continue
+
+        celery_task = send_bulk_sms.delay(str(queue_id), current_user.id)
+        debug("Task in present as requested", celery_task)
+        task_updates.append(UpdateOne({"_id": queue_id}, {"$set": {"task_id": celery_task.id}}))
+
+    # Store every task_id in a single operation
+    if task_updates:
+        await sms_queue_collection.bulk_write(task_updates, ordered=False)
 
     debug(result)
     return BaseResponse(success=True, data=[str(qid) for qid in result.inserted_ids])
@@ -280,6 +304,7 @@ async def delete_campaign_queues(
     result = await sms_queue_collection.delete_many(
         {"_id": {"$in": [entry["_id"] for entry in deleted_entries]}, "created_by": current_user.id}
     )
+    await audience_collection.delete_many({"queue_id": {"$in": [str(entry["_id"]) for entry in deleted_entries]}})
 
     if result.deleted_count == 0:
         raise HTTPException(
@@ -306,6 +331,23 @@ async def update_queue_status(
         if not queue_entry:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Queue entry not found")
 
+        # Entries still waiting for the scheduler have no task yet; claiming them keeps the scheduler off them
+        if queue_entry.get("status") == SMSCampaignStatus.scheduled and not queue_entry.get("task_id"):
+            if new_status not in [SMSCampaignStatus.cancelled, SMSCampaignStatus.in_progress]:
+                raise HTTPException(status_code=400, detail=f"Task is scheduled, it can only be started or cancelled.")
+
+            now = datetime.now(timezone.utc)
+            claimed = await sms_queue_collection.find_one_and_update(
+                {"_id": ObjectId(queue_id), "status": SMSCampaignStatus.scheduled},
+                {"$set": {"status": new_status, "dispatched_at": now, "updated_at": now}}
+            )
+            if not claimed:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Task was dispatched meanwhile")
+            if new_status == SMSCampaignStatus.in_progress:
+                new_task = send_bulk_sms.delay(queue_id, current_user.id)
+                await sms_queue_collection.update_one({"_id": ObjectId(queue_id)}, {"$set": {"task_id": new_task.id}})
+            continue
+
         task_id = queue_entry.get("task_id")
         if not task_id:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Task ID for queue not found")
@@ -315,9 +357,13 @@ async def update_queue_status(
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="This task does not exist")
         debug(celery_task.state)
 
+        # Chunk tasks check the queue status before every batch, so pausing or cancelling a fanned-out
+        # campaign only needs the status change; the coordinator task itself may already have finished.
+        queue_status = queue_entry.get("status")
+
         # Handle status updates based on the new status
         if new_status == SMSCampaignStatus.paused:
-            if celery_task.state == "STARTED":
+            if celery_task.state == "STARTED" or queue_status == SMSCampaignStatus.in_progress:
                 celery_task.revoke(terminate=True, signal="SIGABRT")
                 await sms_queue_collection.update_one(
                     {"_id": ObjectId(queue_id)},
@@ -327,7 +373,8 @@ async def update_queue_status(
                 raise HTTPException(status_code=400, detail=f"Task is not running, cannot pause.")
 
         elif new_status == SMSCampaignStatus.cancelled:
-            if celery_task.state in ["STARTED", "RETRY", "PENDING"]:
+            if celery_task.state in ["STARTED", "RETRY", "PENDING"] or queue_status in [
+                SMSCampaignStatus.in_progress, SMSCampaignStatus.paused, SMSCampaignStatus.failed]:
                 celery_task.revoke(terminate=True, signal="SIGTERM")
                 await sms_queue_collection.update_one(
                     {"_id": ObjectId(queue_id)},
@@ -346,15 +393,17 @@ async def update_queue_status(
         #         raise HTTPException(status_code=400, detail=f"Task is not in a pending state, cannot schedule.")
 
         elif new_status == SMSCampaignStatus.in_progress:
-            if celery_task.state == "PENDING":
+            if celery_task.state == "PENDING" or queue_status in [SMSCampaignStatus.paused, SMSCampaignStatus.failed]:
                 celery_task.revoke(terminate=True)
+                # A paused or failed campaign resumes its unfinished chunks from their stored cursors, under new
+                # run ids, so a chunk that failed mid-way retries its batch and the completion callback still fires
                 new_task = send_bulk_sms.delay(queue_id, current_user.id)
                 await sms_queue_collection.update_one(
                     {"_id": ObjectId(queue_id)},
                     {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc), "task_id": new_task.id}}
                 )
             else:
-                raise HTTPException(status_code=400, detail=f"Task is not scheduled or paused, cannot start.")
+                raise HTTPException(status_code=400, detail=f"Task is not scheduled, paused or failed, cannot start.")
 
     return BaseResponse(message="Queue statuses updated successfully", success=True)
 
@@ -362,88 +411,17 @@ async def update_queue_status(
 @router.get("/chats", response_model=List[CampaignWithMsg])
 async def get_campaign_chats(
         current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]) -> List[CampaignWithMsg]:
+    # Counters are kept by the worker and the webhooks (utils.campaign_stats), the campaigns are joined by _id
     pipeline = [
-        {
-            "$match": {
-                "created_by": current_user.id
-            }
-        },
-        {
-            "$lookup": {
-                "from": "messages",
-                "let": {
-                    "campaign_id": {"$toString": "$_id"},
-                    "sender_msisdn": "$sender_msisdn"
-                },
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$in": ["$$campaign_id", "$campaigns"]},
-                                    {"$eq": ["$recipient_did", "$$sender_msisdn"]},
-                                    {"$eq": ["$type", "reply"]}
-                                ]
-                            }
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": None,
-                            "totalReplies": {"$sum": 1}
-                        }
-                    }
-                ],
-                "as": "replies_count"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "messages",
-                "let": {"campaign_id": {"$toString": "$_id"}},
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$in": ["$$campaign_id", "$campaigns"]},
-                                    {"$not": {"$in": ["$status", ["failed", "expired", "rejected"]]}},
-                                    {"$eq": ["$type", "sent"]},
-                                ]
-                            }
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": None,
-                            "totalSent": {"$sum": 1}
-                        }
-                    }
-                ],
-                "as": "sent_count"
-            }
-        },
-        {
-            "$match": {
-                "replies_count": {"$ne": []},
-                "sent_count": {"$ne": []}
-            }
-        },
-        {
-            "$project": {
-                "_id": 1,
-                "name": 1,
-                "message": 1,
-                "sender_msisdn": 1,
-                "totalReplies": {"$arrayElemAt": ["$replies_count.totalReplies", 0]},
-                "totalSent": {"$arrayElemAt": ["$sent_count.totalSent", 0]}
-            }
-        }
+        {"$match": {"created_by": current_user.id, "sent": {"$gt": 0}, "replies": {"$gt": 0}}},
+        {"$lookup": {"from": "sms campaign", "localField": "_id", "foreignField": "_id",
+                     "pipeline": [{"$project": {"name": 1, "message": 1, "sender_msisdn": 1}}], "as": "campaign"}},
+        {"$unwind": "$campaign"},
+        {"$project": {"_id": 1, "name": "$campaign.name", "message": "$campaign.message",
+                      "sender_msisdn": "$campaign.sender_msisdn", "totalReplies": "$replies", "totalSent": "$sent"}}
     ]
 
-    # TODO: Disable updating of campaign sender_msisdn so that message retrieval is easier
-    campaigns_with_messages = await sms_campaign_collection.aggregate(pipeline).to_list(length=None)
-    print(campaigns_with_messages)
+    campaigns_with_messages = await campaign_stats_collection.aggregate(pipeline).to_list(length=None)
 
     return campaigns_with_messages
 
@@ -454,134 +432,91 @@ async def get_campaign_chats(
 
 @router.get("/chats/{campaign_id}", response_model=List[ChatContacts])
 async def get_chat_contacts(campaign_id: PyObjectId,
-                            current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]) -> List[
-    ChatContacts]:
-    msg_contacts_pipeline = [
-        {
-            '$match': {
-                'campaigns': campaign_id,
-                'users': current_user.id,
-                'type': 'sent'
-            }
-        }, {
-            '$lookup': {
-                'from': 'messages',
-                'let': {
-                    'sent_recipient': '$recipient_did',
-                    'sent_sender': '$sender_did'
-                },
-                'pipeline': [
-                    {
-                        '$match': {
-                            '$expr': {
-                                '$and': [
-                                    {
-                                        '$eq': [
-                                            '$sender_did', '$$sent_recipient'
-                                        ]
-                                    }, {
-                                        '$eq': [
-                                            '$recipient_did', '$$sent_sender'
-                                        ]
-                                    }, {
-                                        '$eq': [
-                                            '$type', 'reply'
-                                        ]
-                                    }, {
-                                        '$in': [
-                                            campaign_id, '$campaigns'
-                                        ]
-                                    }
-                                ]
-                            }
-                        }
-                    }
-                ],
-                'as': 'replies'
-            }
-        }, {
-            '$match': {
-                'replies': {
-                    '$ne': []
-                }
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'original_sender': '$sender_did',
-                    'original_recipient': '$recipient_did'
-                },
-                'replyCount': {
-                    '$sum': 1
-                }
-            }
-        }, {
-            '$lookup': {
-                'from': 'contact',
-                'localField': '_id.original_recipient',
-                'foreignField': 'phone_number',
-                'as': 'contact_info'
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'original_sender': '$_id.original_sender',
-                'original_recipient': '$_id.original_recipient',
-                'info': {
-                    '$arrayElemAt': [
-                        '$contact_info', 0
-                    ]
-                }
-            }
-        }
-    ]
+                            current_user: Annotated[UserWithMSI, Depends(get_current_active_user)],
+                            page: Annotated[PageParams, Depends(page_params)],
+                            response: Response) -> List[ChatContacts]:
+    # Contacts that replied, latest reply first
+    conversations, next_cursor = await paginate(
+        conversation_collection,
+        {"campaign_id": campaign_id, "created_by": current_user.id, "last_reply_at": {"$ne": None}},
+        page, sort=[("last_reply_at", -1), ("_id", -1)], projection=CONVERSATION_PROJECTION
+    )
+    set_next_cursor(response, next_cursor)
 
-    contacts = await messages_collection.aggregate(msg_contacts_pipeline).to_list(length=None)
-    if not contacts:
+    if not conversations and not page.cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No chats for this campaign")
-    return contacts
+
+    # Contact details of the page only
+    phone_numbers = [conversation["contact_phone"] for conversation in conversations]
+    contacts = {contact["phone_number"]: contact async for contact in contact_collection.find(
+        {"created_by": current_user.id, "phone_number": {"$in": phone_numbers}},
+        {"_id": 0, "name": 1, "phone_number": 1, "groups": 1}
+    )}
+
+    return [ChatContacts(
+        original_sender=conversation["our_number"],
+        original_recipient=conversation["contact_phone"],
+        # Deleted contacts still show, under the name they were messaged with
+        info=contacts.get(conversation["contact_phone"]) or {
+            "name": conversation.get("contact_name") or conversation["contact_phone"],
+            "phone_number": conversation["contact_phone"]
+        },
+        last_message=(conversation.get("last_message") or {}).get("message"),
+        last_message_at=conversation.get("last_message_at"),
+        last_reply_at=conversation.get("last_reply_at"),
+        reply_count=conversation.get("reply_count", 0),
+        unread_count=conversation.get("unread_count", 0)
+    ) for conversation in conversations]
 
 
 @router.get("/chats/{campaign_id}/{contact_phone}", response_model=List[Message])
-async def get_chat(campaign_id: PyObjectId, contact_phone: PhoneNumber,
-                   current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]) -> List[CampaignChat]:
-    print(campaign_id, contact_phone)
-    chat_pipeline = [
-        {
-            '$match': {
-                'campaigns': campaign_id,
-                '$or': [
-                    {
-                        'sender_did': contact_phone
-                    }, {
-                        'recipient_did': contact_phone
-                    }
-                ]
+async def get_chat(campaign_id: PyObjectId, contact_phone: E164Number,
+                   current_user: Annotated[UserWithMSI, Depends(get_current_active_user)],
+                   page: Annotated[PageParams, Depends(page_params)],
+                   response: Response) -> List[CampaignChat]:
+    debug("Chat requested:", campaign_id, contact_phone)
+    chat_query = {
+        'campaigns': campaign_id,
+        '$or': [
+            {
+                'sender_did': contact_phone
+            }, {
+                'recipient_did': contact_phone
             }
-        }, {
-            '$sort': {
-                'sent_at': 1
-            }
-        }
-    ]
-    chat = await messages_collection.aggregate(chat_pipeline).to_list(length=None)
-    print(chat)
+        ]
+    }
+    # Newest first, so the first page is the latest of the conversation and the next pages go back in time
+    chat, next_cursor = await paginate(messages_collection, chat_query, page, sort=[("sent_at", -1), ("_id", -1)])
+    set_next_cursor(response, next_cursor)
 
-    if not chat:
+    if not chat and not page.cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campaign chat not found or unauthorized")
+
+    # Opening the chat reads its replies
+    await mark_read(conversation_collection, campaign_id, contact_phone, current_user.id)
     return chat
 
 
 @router.post("/chat/{campaign_id}/{contact_phone}/reply", response_model=Message)
-async def reply_to_campaign_chat(campaign_id: PyObjectId, contact_phone: PhoneNumber,
+async def reply_to_campaign_chat(campaign_id: PyObjectId, contact_phone: E164Number,
                                  current_user: Annotated[UserWithMSI, Depends(get_current_active_user)],
                                  reply_data: Annotated[Reply, Body()]) -> Message:
     campaign = await sms_campaign_collection.find_one({"_id": ObjectId(campaign_id), "created_by": current_user.id})
-    sms_resp = vonage_client.sms.send_message({
+    if not campaign:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found or unauthorized")
+
+    try:
+        await get_rate_limiter().acquire(campaign["sender_msisdn"], max_wait=REPLY_MAX_RATE_LIMIT_WAIT)
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail=f"The sender number is busy, try again in {ceil(e.wait)} second(s)")
+
+    message_type, segments = analyse_text(reply_data.message)
+    sms_resp = await send_sms({
         "from": campaign["sender_msisdn"],
         "to": contact_phone,
         "text": reply_data.message,
-        "type": "text",
+        "type": message_type.value,
         "callback": MESSAGE_STATUS_URL
     })
 
@@ -590,7 +525,7 @@ async def reply_to_campaign_chat(campaign_id: PyObjectId, contact_phone: PhoneNu
         raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
                             detail="An error occurred while sending the message")
 
-    print("Message sent successfully.")
+    debug("Message sent successfully.")
     message_id = sms_resp["messages"][0].get("message-id", None)
     valid_msg = Message(**{
         "type": MessageType.sent,
@@ -600,16 +535,20 @@ async def reply_to_campaign_chat(campaign_id: PyObjectId, contact_phone: PhoneNu
         "campaign_id": campaign_id,
         "message": reply_data.message,
         "sent_at": reply_data.sent_at,
-        "message_type": "text",
+        "message_type": message_type,
+        "segments": segments,
         "status": MessageStatus.unknown,
         "campaigns": [campaign_id],
         "users": [current_user.id]
     })
-    print(valid_msg.model_dump(exclude_unset=True))
+    debug(valid_msg.model_dump(exclude_unset=True))
     msg_insert_res = await messages_collection.insert_one(valid_msg.model_dump(exclude_unset=True))
+    await record_sent(campaign_stats_collection, campaign_id, current_user.id)
+    await record_outgoing(conversation_collection, campaign_id, campaign["sender_msisdn"], contact_phone,
+                          current_user.id, reply_data.message, reply_data.sent_at)
 
     message = await messages_collection.find_one({"_id": msg_insert_res.inserted_id})
-    print(message)
+    debug(message)
 
     if not message:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campaign chat not found or unauthorized")
@@ -617,7 +556,7 @@ async def reply_to_campaign_chat(campaign_id: PyObjectId, contact_phone: PhoneNu
 
 
 @router.post("/chat/{campaign_id}/dnc", response_model=CampaignChat)
-async def add_to_dnc_list_from_chat(campaign_id: PyObjectId, phone_number: PhoneNumber,
+async def add_to_dnc_list_from_chat(campaign_id: PyObjectId, phone_number: E164Number,
                                     current_user: Annotated[UserWithMSI, Depends(get_current_active_user)]):
     chat = await campaign_chat_collection.find_one({"campaign_id": campaign_id, "created_by": current_user.id})
     if not chat:
@@ -637,6 +576,8 @@ async def add_to_dnc_list_from_chat(campaign_id: PyObjectId, phone_number: Phone
 @router.get("/messages/{phone_number}", response_model=List[Message])
 async def get_message_history(phone_number: str,
                               current_user: Annotated[UserWithMSI, Depends(get_current_active_user)],
+                              page: Annotated[PageParams, Depends(page_params)],
+                              response: Response,
                               start_date: Optional[datetime] = None,
                               end_date: Optional[datetime] = None):
     query = {"phone_number": phone_number, "user_id": current_user.id}
@@ -646,9 +587,10 @@ async def get_message_history(phone_number: str,
     if end_date:
         query.setdefault("sent_at", {})["$lte"] = end_date
 
-    messages = await messages_collection.find(query).sort("sent_at", 1).to_list(length=None)
+    messages, next_cursor = await paginate(messages_collection, query, page, sort=[("sent_at", 1), ("_id", 1)])
+    set_next_cursor(response, next_cursor)
 
-    if not messages:
+    if not messages and not page.cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No messages found for this number")
 
     return messages
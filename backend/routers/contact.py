@@ -1,39 +1,67 @@
-from datetime import datetime
 from typing import Annotated
 
-import aiofiles
-import pandas as pd
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, Body
-from pydantic import ValidationError
-from pymongo import UpdateOne, UpdateMany
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Form, Body, Response
+from pymongo import UpdateOne
 from pymongo.errors import BulkWriteError
 
-from database import contact_collection
+from database import contact_collection, import_job_collection, contact_group_collection, dnc_collection, \
+    dnc_version_collection
 from models.auth_models import UserWithUUID
 from models.base_models import BaseResponse, UpdateModelResponse, PyObjectId
-from models.contact_models import ContactEntry, BaseContact, OptionalContactUpdates
+from models.contact_models import ContactEntry, BaseContact, OptionalContactUpdates, ImportJob, ContactGroup, \
+    ImportJobStatus
 from utilities import debug
+from utils.contact_groups import remove_group, record_contact_changes, remove_group_entry, bootstrap_groups, \
+    GROUP_PROJECTION
+from utils.contact_import import start_import
+from utils.dnc_index import dnc_index, dnc_scope_owners
+from utils.pagination import PageParams, page_params, paginate, set_next_cursor
 from .utilities import get_current_active_user, handlePhoneBulkWriteError
 
 router = APIRouter(prefix="/contact", tags=["contact"])
 
 
+def get_dnc_owners(current_user: UserWithUUID) -> list[str]:
+    return dnc_scope_owners(current_user.id, current_user.created_by)
+
+
+async def sync_contact_groups(current_user: UserWithUUID, removed: list[dict], added: list[dict]):
+    # Keep the group catalogue's member and DNC-excluded counts in step with a contact write
+    dnc_owners = get_dnc_owners(current_user)
+    if await bootstrap_groups(contact_collection, contact_group_collection, current_user.id, dnc_owners):
+        return
+    numbers = [contact["phone_number"] for contact in removed + added]
+    await dnc_index.refresh_async(dnc_collection, dnc_version_collection, dnc_owners)
+    blocked = {number for number, is_dnc in zip(numbers, dnc_index.contains(dnc_owners, numbers)) if is_dnc}
+    await record_contact_changes(contact_group_collection, current_user.id, removed, added, blocked)
+
+
 @router.get("", response_model=list[ContactEntry])
 @router.get("/", response_model=list[ContactEntry])
 async def list_contacts(
-        current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]):
-    user_contacts = await contact_collection.find({"created_by": current_user.id}).to_list(length=None)
-    debug(user_contacts)
+        current_user: Annotated[UserWithUUID, Depends(get_current_active_user)],
+        page: Annotated[PageParams, Depends(page_params)],
+        response: Response):
+    user_contacts, next_cursor = await paginate(contact_collection, {"created_by": current_user.id}, page)
+    set_next_cursor(response, next_cursor)
     return user_contacts
 
 
 @router.get("/groups", response_model=list[str])
 async def list_groups(
         current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]):
-    contact_groups = await contact_collection.distinct("groups", {"created_by": current_user.id})
-    debug(contact_groups)
-    return contact_groups
+    await bootstrap_groups(contact_collection, contact_group_collection, current_user.id, get_dnc_owners(current_user))
+    return [group["name"] async for group in contact_group_collection.find(
+        {"created_by": current_user.id}, {"_id": 0, "name": 1}).sort("name", 1)]
+
+
+@router.get("/groups/details", response_model=list[ContactGroup])
+async def list_group_details(
+        current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]):
+    await bootstrap_groups(contact_collection, contact_group_collection, current_user.id, get_dnc_owners(current_user))
+    return await contact_group_collection.find({"created_by": current_user.id}, GROUP_PROJECTION).sort(
+        "name", 1).to_list(None)
 
 
 @router.post("/add", response_model=list[ContactEntry])
@@ -51,6 +79,8 @@ async def add_contact(entries: list[BaseContact],
     try:
         result = await contact_collection.insert_many(entries_mod)
     except BulkWriteError as e:
+        # Inserts are ordered, the contacts before the first error were added
+        await sync_contact_groups(current_user, [], entries_mod[:e.details["nInserted"]])
         errors = []
         # I can't output the full object because there is an ObjectId in the details
         debug(e, "=-=-=-=-=-=-=", e.details["writeErrors"][0]["errmsg"])
@@ -63,6 +93,7 @@ async def add_contact(entries: list[BaseContact],
         debug(errors)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
 
+    await sync_contact_groups(current_user, [], entries_mod)
     added = await contact_collection.find({"_id": {"$in": result.inserted_ids}}).to_list(len(result.inserted_ids))
     return added
 
@@ -86,6 +117,7 @@ async def remove_contact(contacts: list[PyObjectId],
     debug(contacts, current_user.id)
     result = await contact_collection.delete_many(
         {"_id": {"$in": contacts}, "created_by": current_user.id})
+    await sync_contact_groups(current_user, contact_entries, [])
 
     return BaseResponse(message=f"Deleted {result.deleted_count} contact(s) successfully", success=True)
 
@@ -95,42 +127,15 @@ async def remove_contact_group(
         group_name: Annotated[str, Body()],
         current_user: UserWithUUID = Depends(get_current_active_user)
 ) -> BaseResponse:
-    # Find all contacts with the group to be removed
-    contacts_with_group = await contact_collection.find({
-        "created_by": current_user.id,
-        "groups": group_name
-    }).to_list(None)
+    # Two server-side statements (per range for very large groups) instead of one operation per contact
+    deleted, updated = await remove_group(contact_collection, current_user.id, group_name)
+    await remove_group_entry(contact_group_collection, current_user.id, group_name)
 
-    if not contacts_with_group:
+    if not deleted and not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
 
-    # Create a bulk update operation to remove the group from contacts with other groups
-    update_operations = []
-    delete_operations = []
-
-    for contact in contacts_with_group:
-        if len(contact["groups"]) > 1:
-            # If contact has other groups, remove the group
-            update_operations.append(
-                UpdateMany(
-                    {"_id": contact["_id"]},
-                    {"$pull": {"groups": group_name}}
-                )
-            )
-        else:
-            # If the contact only belongs to this group, mark for deletion
-            delete_operations.append(contact["_id"])
-
-    # Perform bulk update to remove group from contacts
-    if update_operations:
-        await contact_collection.bulk_write(update_operations)
-
-    # Delete contacts that only belong to the removed group
-    if delete_operations:
-        result = await contact_collection.delete_many({"_id": {"$in": delete_operations}})
-
-    return BaseResponse(success=True, status=status.HTTP_200_OK,
-                        message="Group deleted successfully")
+    return BaseResponse(success=True, status=status.HTTP_200_OK, message="Group deleted successfully",
+                        data={"deleted": deleted, "updated": updated})
 
 
 @router.put("/update", response_model=UpdateModelResponse)
@@ -148,9 +153,6 @@ async def update_contact(updates: list[OptionalContactUpdates],
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Some contacts cannot be updated. Check that they exist and that they belong to you."
         )
-    for update in updates:
-        update.phone_number = update.phone_number.strip("+")
-
     update_operations = [
         UpdateOne({"_id": ObjectId(update.id), "created_by": current_user.id},
                   {"$set": update.model_dump(exclude_unset=True)})
@@ -160,13 +162,22 @@ async def update_contact(updates: list[OptionalContactUpdates],
     if not update_operations:
         raise HTTPException(status_code=400, detail="No valid updates provided")
 
+    # The contacts as they will be after their update, for the group catalogue
+    entries_by_id = {str(entry["_id"]): entry for entry in contact_entries}
+    old_entries = [entries_by_id[str(update.id)] for update in updates]
+    new_entries = [{**entries_by_id[str(update.id)], **update.model_dump(exclude_unset=True)} for update in updates]
+
     # Execute bulk operations
     try:
         result = await contact_collection.bulk_write(update_operations)
     except BulkWriteError as e:
         debug(e)
+        # Updates are ordered, the ones before the first error were applied
+        applied = e.details["writeErrors"][0]["index"]
+        await sync_contact_groups(current_user, old_entries[:applied], new_entries[:applied])
         handlePhoneBulkWriteError(e)
 
+    await sync_contact_groups(current_user, old_entries, new_entries)
     return UpdateModelResponse(matched=result.matched_count, modified=result.modified_count)
 
 
@@ -228,110 +239,36 @@ async def update_contact(updates: list[OptionalContactUpdates],
 #     return new_contacts
 
 
-@router.post("/import", response_model=UpdateModelResponse)
+@router.post("/import", response_model=ImportJob, status_code=status.HTTP_202_ACCEPTED)
 async def import_contacts(
         file: UploadFile,
         group: Annotated[str, Form()],
         current_user: UserWithUUID = Depends(get_current_active_user)
-) -> UpdateModelResponse:
-    existing_group = await contact_collection.find_one({
-        "groups": group,
-        "created_by": current_user.id
+):
+    group = group.lower()
+    existing_group = await contact_group_collection.find_one({"created_by": current_user.id, "name": group})
+    # Groups of imports still running aren't in the catalogue yet
+    importing_group = await import_job_collection.find_one({
+        "created_by": current_user.id, "group": group,
+        "status": {"$in": [ImportJobStatus.pending.value, ImportJobStatus.running.value]}
     })
 
-    if existing_group:
+    if existing_group or importing_group:
         raise HTTPException(status_code=400, detail="Group name already exists.")
 
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Invalid file type. Please upload a CSV file.")
 
-    # Read the file content asynchronously
-    async with aiofiles.open(file.filename, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
-
-    # Read the CSV file
-    df = pd.read_csv(file.filename, dtype=str).fillna("")
-
-    debug([row for row in df.iterrows()])
+    # Rows are imported in the background, poll GET /contact/import/{job_id} for progress
+    return await start_import(contact_collection, import_job_collection, contact_group_collection, file,
+                              current_user.id, group, get_dnc_owners(current_user))
 
-    # Validate required columns
-    required_columns = ['NUMBER', 'NAME']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-
-    if missing_columns:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"CSV file is missing required column(s): {', '.join(missing_columns)}."
-        )
 
-    # Prepare bulk operations
-    bulk_operations = []
-    new_contacts = []
-    for index, row in df.iterrows():
-        new_info = {
-            "name": row["NAME"],
-            "phone_number": row["NUMBER"].strip("+"),
-            "groups": [group.lower()]
-        }
-
-        # row["name"] = row["NAME"]
-        # row["groups"] = [group]
-        # row["phone_number"] = row["NUMBER"].strip("+")
-
-        debug(new_info)
-        debug(row)
-        try:
-            # Convert the row to a dictionary and validate using Pydantic
-            valid_data = BaseContact(**new_info)
-        except ValidationError as e:
-            # Raise HTTPException with validation error details to the user
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Row {index + 1} is invalid"
-            )
-
-            # debug("---------------------------------------------------------------")
-            # debug(update_data)
-            # debug("---------------------------------------------------------------")
-
-        bulk_operations.append(
-            UpdateOne({'phone_number': valid_data.phone_number, 'created_by': current_user.id},
-                      {
-                          "$setOnInsert": {
-                              'added_at': datetime.utcnow(),
-                          },
-                          "$set": {**valid_data.model_dump(exclude_unset=True, exclude={"groups"}),
-                                   "updated_at": datetime.utcnow()},
-                          "$addToSet": {"groups": {"$each": valid_data.groups}}
-                      },
-                      True,
-                      )
-        )
-
-    if not bulk_operations:
-        raise HTTPException(status_code=400, detail="No valid data to process.")
-
-    debug(bulk_operations)
-    # Execute bulk operations
-    try:
-        result = await contact_collection.bulk_write(bulk_operations)
-        # ids_added = [objectId for objectId in result.upserted_ids.values()]
-        # # debug(ids_added)
-        # if ids_added:
-        #     new_contacts = await contact_collection.find(
-        #         {'_id': {'$in': ids_added}}).to_list(
-        #         length=len(ids_added))
-    except BulkWriteError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.details["writeErrors"][0]["errmsg"])
-
-    debug(result)
-    # return ImportContactResponse(
-    #     matched=result.matched_count,
-    #     added=result.upserted_count, modified=result.modified_count,
-    #     results=new_contacts
-    # )
-    return UpdateModelResponse(matched=result.matched_count, modified=result.modified_count,
-                               added=result.inserted_count, upserted=result.upserted_count,
-                               ids=[str(objectId) for objectId in result.upserted_ids.values()])
+@router.get("/import/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: PyObjectId,
+                         current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]):
+    job = await import_job_collection.find_one({"_id": ObjectId(job_id), "created_by": current_user.id})
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job
@@ -4,17 +4,19 @@ from typing import Annotated
 import aiofiles
 import pandas as pd
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Body, Response
 from pydantic import ValidationError
 from pymongo import UpdateOne
 from pymongo.errors import BulkWriteError
-from vonage_utils.types import PhoneNumber
 
-from database import dnc_collection
+from database import dnc_collection, dnc_version_collection
 from models.auth_models import UserWithUUID, PyObjectId
-from models.base_models import BaseResponse, UpdateModelResponse, DeleteModelResponse
+from models.base_models import BaseResponse, UpdateModelResponse, DeleteModelResponse, E164Number
 from models.dnc_models import DNCEntry, BaseDNC, BaseDNCEditable
-from utilities import is_valid_phone_number, convert_to_string, debug
+from utilities import debug
+from utils.dnc_index import dnc_index, bump_dnc_version, dnc_scope_owners
+from utils.pagination import PageParams, page_params, paginate, set_next_cursor
+from utils.phone_numbers import normalize_phone_numbers
 from .utilities import get_current_active_user, handlePhoneBulkWriteError
 
 router = APIRouter(prefix="/dnc", tags=["dnc"])
@@ -22,9 +24,13 @@ router = APIRouter(prefix="/dnc", tags=["dnc"])
 
 @router.get("", response_model=list[DNCEntry])
 @router.get("/", response_model=list[DNCEntry])
-async def get_dnc_entries(current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]):
-    results = await dnc_collection.find({"created_by": {"$in": [current_user.id, current_user.created_by]}}).to_list(
-        length=None)
+async def get_dnc_entries(current_user: Annotated[UserWithUUID, Depends(get_current_active_user)],
+                          page: Annotated[PageParams, Depends(page_params)],
+                          response: Response):
+    results, next_cursor = await paginate(
+        dnc_collection, {"created_by": {"$in": [current_user.id, current_user.created_by]}}, page
+    )
+    set_next_cursor(response, next_cursor)
     return results
 
 
@@ -46,6 +52,7 @@ async def add_to_dnc(entries: list[BaseDNC],
         debug(e, "=-=-=-=-=-=-=", e.details["writeErrors"][0]["errmsg"])
         handlePhoneBulkWriteError(e)
 
+    await bump_dnc_version(dnc_version_collection, [current_user.id])
     admin = await dnc_collection.find({"_id": {"$in": result.inserted_ids}}).to_list(len(result.inserted_ids))
     return admin
 
@@ -67,13 +74,14 @@ async def remove_from_dnc(ids: list[PyObjectId],
 
     # Delete the DNCs
     result = await dnc_collection.delete_many({"_id": {"$in": oid_arr}})
+    await bump_dnc_version(dnc_version_collection, [current_user.id])
 
     return DeleteModelResponse(message=f"Deleted {result.deleted_count} DNC(s) successfully", success=True,
                                deleted=result.deleted_count)
 
 
 @router.put("/update", response_model=UpdateModelResponse)
-async def update_dnc(updates: list[BaseDNCEditable], phone_numbers: list[PhoneNumber],
+async def update_dnc(updates: list[BaseDNCEditable], phone_numbers: list[E164Number],
                      current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]) -> UpdateModelResponse:
     dncs = await dnc_collection.find({
         "phone_number": {"$in": phone_numbers},
@@ -102,10 +110,25 @@ async def update_dnc(updates: list[BaseDNCEditable], phone_numbers: list[PhoneNu
 
     # Execute bulk operations
     result = await dnc_collection.bulk_write(update_operations)
+    await bump_dnc_version(dnc_version_collection, [current_user.id])
 
     return UpdateModelResponse(matched=result.matched_count, modified=result.modified_count)
 
 
+@router.post("/check", response_model=BaseResponse)
+async def check_dnc_numbers(phone_numbers: Annotated[list[E164Number], Body()],
+                            current_user: Annotated[UserWithUUID, Depends(get_current_active_user)]) -> BaseResponse:
+    # Checks the whole list against the user's, their admin's and the platform DNC lists in one pass
+    dnc_owners = dnc_scope_owners(current_user.id, current_user.created_by)
+    await dnc_index.refresh_async(dnc_collection, dnc_version_collection, dnc_owners)
+    is_dnc = dnc_index.contains(dnc_owners, phone_numbers)
+
+    return BaseResponse(success=True, data={
+        "dnc": [number for number, blocked in zip(phone_numbers, is_dnc) if blocked],
+        "allowed": [number for number, blocked in zip(phone_numbers, is_dnc) if not blocked]
+    })
+
+
 @router.post("/import", response_model=UpdateModelResponse)
 async def import_dnc_contacts(
         file: UploadFile,
@@ -131,43 +154,38 @@ async def import_dnc_contacts(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="CSV file must contain 'NAME' column.")
 
+    # Normalise the whole column at once, dropping rows without a valid number
+    df["NUMBER"] = normalize_phone_numbers(df["NUMBER"], user_input=True)
+    df = df[df["NUMBER"].notna()]
+
     # Prepare bulk operations
     bulk_operations = []
     dncs = []
     for index, row in df.iterrows():
-        phone_number = row['NUMBER'].strip("+")
-        name = row.get('NAME', "")  # Use .get() to handle optional column
-
-        if pd.notna(phone_number) and is_valid_phone_number(convert_to_string(phone_number)):
-            update_data = {
-                "name": convert_to_string(name) if pd.notna(name) else ""
-            }
-
-            # debug("---------------------------------------------------------------")
-            # debug(update_data)
-            # debug("---------------------------------------------------------------")
-
-            try:
-                dncs.append(BaseDNC(phone_number=phone_number, name=name))
-            except ValidationError as e:
-                # Raise HTTPException with validation error details to the user
-                debug(row, "===================", e)
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail=f"Row {index + 1} is invalid"
-                )
-
-            bulk_operations.append(
-                UpdateOne({'phone_number': convert_to_string(phone_number), 'created_by': current_user.id},
-                          {"$setOnInsert": {
-                              'added_at': datetime.utcnow(),
-                              "scope": "platform" if current_user.is_admin else "user"},
-                              "$set": update_data
-                          },
-                          True,
-                          )
+        phone_number = row["NUMBER"]
+        name = row["NAME"]
+
+        try:
+            dncs.append(BaseDNC(phone_number=phone_number, name=name))
+        except ValidationError as e:
+            # Raise HTTPException with validation error details to the user
+            debug(row, "===================", e)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Row {index + 1} is invalid"
             )
 
+        bulk_operations.append(
+            UpdateOne({'phone_number': phone_number, 'created_by': current_user.id},
+                      {"$setOnInsert": {
+                          'added_at': datetime.utcnow(),
+                          "scope": "platform" if current_user.is_admin else "user"},
+                          "$set": {"name": name}
+                      },
+                      True,
+                      )
+        )
+
     if not dncs:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No valid data to process.")
 
@@ -184,6 +202,7 @@ async def import_dnc_contacts(
     except BulkWriteError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.details["writeErrors"][0]["errmsg"])
 
+    await bump_dnc_version(dnc_version_collection, [current_user.id])
     debug(result)
     return UpdateModelResponse(matched=result.matched_count, modified=result.modified_count,
                                added=result.inserted_count, upserted=result.upserted_count,
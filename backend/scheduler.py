@@ -0,0 +1,76 @@
+"""Dispatches scheduled campaigns when they are due.
+
+Scheduled queue entries stay in MongoDB instead of sitting in RabbitMQ as countdown (ETA) tasks, which workers
+hold in memory until they are due and get redelivered on every restart. This process polls the
+(status, schedule_time) index, claims due entries atomically and only then enqueues `send_bulk_sms`, so any
+number of schedulers can run side by side and tens of thousands of scheduled campaigns cost nothing until due.
+
+    python scheduler.py
+"""
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from environment import SCHEDULER_POLL_INTERVAL, SCHEDULER_BATCH_SIZE, SCHEDULER_CLAIM_LEASE
+from models.sms_models import SMSCampaignStatus
+from utilities import debug
+from utils.indexes import ensure_indexes
+from worker import mongo_queue_collection, send_bulk_sms
+
+running = True
+
+
+def stop(signum, frame):
+    global running
+    print("Scheduler stopping...")
+    running = False
+
+
+def claim_due_entry(now: datetime) -> dict | None:
+    """Atomically moves one due entry to in_progress, so no other scheduler dispatches it too.
+
+    Entries claimed by a scheduler that died before storing the task ID are claimed again once the lease expires.
+    """
+    return mongo_queue_collection.find_one_and_update(
+        {"$or": [
+            {"status": SMSCampaignStatus.scheduled, "schedule_time": {"$lte": now}},
+            {"status": SMSCampaignStatus.in_progress, "task_id": None,
+             "dispatched_at": {"$lt": now - timedelta(seconds=SCHEDULER_CLAIM_LEASE)}}
+        ]},
+        {"$set": {"status": SMSCampaignStatus.in_progress, "dispatched_at": now, "updated_at": now}},
+        sort=[("schedule_time", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def dispatch_due_entries() -> int:
+    dispatched = 0
+    while running and dispatched < SCHEDULER_BATCH_SIZE:
+        queue_entry = claim_due_entry(datetime.now(timezone.utc))
+        if not queue_entry:
+            break
+
+        queue_id = str(queue_entry["_id"])
+        celery_task = send_bulk_sms.delay(queue_id, str(queue_entry["created_by"]))
+        mongo_queue_collection.update_one({"_id": queue_entry["_id"]}, {"$set": {"task_id": celery_task.id}})
+        debug("Dispatched scheduled campaign: ", queue_id, celery_task.id)
+        dispatched += 1
+    return dispatched
+
+
+def main():
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    ensure_indexes(mongo_queue_collection)
+
+    print("Scheduler started")
+    while running:
+        # A full batch means more entries are due, so poll again right away
+        if dispatch_due_entries() < SCHEDULER_BATCH_SIZE:
+            time.sleep(SCHEDULER_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
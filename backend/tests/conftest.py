@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The backend modules import each other from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings the app reads at import time
+for name, value in {"SECRET_KEY": "test", "SMTP_SERVER": "localhost", "SMTP_PORT": "25", "SMTP_USERNAME": "test",
+                    "SMTP_PASSWORD": "test", "SMTP_DOMAIN": "test@example.com"}.items():
+    os.environ.setdefault(name, value)
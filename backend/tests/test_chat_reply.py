@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models.auth_models import UserWithMSI
+from routers import campaign
+from routers.utilities import get_current_active_user
+
+USER_ID = str(ObjectId())
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+
+
+class Limiter:
+    def __init__(self):
+        self.acquired = []
+
+    async def acquire(self, key, max_wait=None):
+        self.acquired.append(key)
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    database = mongomock.MongoClient().db
+    limiter, sent = Limiter(), []
+
+    async def send_sms(params):
+        sent.append(params)
+        return {"message-count": "1", "messages": [{"status": "0", "message-id": "out-1"}]}
+
+    for name in ["sms_campaign_collection", "messages_collection", "campaign_stats_collection",
+                 "conversation_collection"]:
+        monkeypatch.setattr(campaign, name, AsyncCollection(database[name]))
+    monkeypatch.setattr(campaign, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(campaign, "send_sms", send_sms)
+
+    app = FastAPI()
+    app.include_router(campaign.router)
+    app.dependency_overrides[get_current_active_user] = lambda: UserWithMSI(
+        _id=USER_ID, username="u", email="u@example.com", first_name="U", last_name="U", company=None,
+        created_at=datetime(2024, 1, 1))
+    return TestClient(app), database, limiter, sent
+
+
+def reply_url(campaign_id):
+    return f"/sms/chat/{campaign_id}/12015550123/reply"
+
+
+def test_reply_to_an_unknown_campaign_is_not_found(chat):
+    client, database, limiter, sent = chat
+    response = client.post(reply_url(ObjectId()), json={"message": "Hi", "sent_at": "2024-05-01T12:00:00"})
+    assert response.status_code == 404
+    assert not limiter.acquired and not sent
+
+
+def test_reply_is_sent_from_the_campaign_number(chat):
+    client, database, limiter, sent = chat
+    campaign_id = database.sms_campaign_collection.insert_one(
+        {"created_by": USER_ID, "sender_msisdn": "15550009999"}).inserted_id
+
+    response = client.post(reply_url(campaign_id), json={"message": "Hi", "sent_at": "2024-05-01T12:00:00"})
+    assert response.status_code == 200
+    assert response.json()["message_id"] == "out-1"
+    assert limiter.acquired == ["15550009999"]
+    assert [(params["from"], params["to"]) for params in sent] == [("15550009999", "12015550123")]
@@ -0,0 +1,48 @@
+import asyncio
+
+import mongomock
+
+from utils import contact_groups
+from utils.contact_groups import bootstrap_groups
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+
+def run_bootstrap(monkeypatch, contacts, entries):
+    database = mongomock.MongoClient().db
+    if contacts:
+        database.contact.insert_many(contacts)
+    if entries:
+        database.groups.insert_many(entries)
+    refreshed = []
+
+    async def refresh_groups(contact_collection, group_collection, user_id, dnc_owners, groups=None):
+        refreshed.append((user_id, dnc_owners, groups))
+
+    monkeypatch.setattr(contact_groups, "refresh_groups", refresh_groups)
+    built = asyncio.run(bootstrap_groups(AsyncCollection(database.contact), AsyncCollection(database.groups),
+                                         "u1", ["u1", "admin"]))
+    return built, refreshed
+
+
+def test_builds_the_catalogue_of_a_user_with_contacts_and_no_entries(monkeypatch):
+    built, refreshed = run_bootstrap(monkeypatch, [{"created_by": "u1", "phone_number": "1", "groups": ["a"]}], [])
+    assert built
+    assert refreshed == [("u1", ["u1", "admin"], None)]
+
+
+def test_leaves_an_existing_catalogue_alone(monkeypatch):
+    built, refreshed = run_bootstrap(monkeypatch, [{"created_by": "u1", "phone_number": "1", "groups": ["a"]}],
+                                     [{"created_by": "u1", "name": "a", "member_count": 1}])
+    assert not built and not refreshed
+
+
+def test_nothing_to_build_without_contacts(monkeypatch):
+    built, refreshed = run_bootstrap(monkeypatch, [{"created_by": "u2", "phone_number": "1", "groups": ["a"]}], [])
+    assert not built and not refreshed
@@ -0,0 +1,46 @@
+import io
+
+import pandas as pd
+
+from utils.contact_import import validate_chunk
+
+CSV = """NUMBER,NAME,CITY
+4792345678,Kari,Oslo
+447911123456,Oliver,London
++49 151 23456789,Lena,Berlin
+0033 6 12 34 56 78,Chloé,Paris
+(415) 555-2671,Sam,San Francisco
+12345,Bad,Nowhere
+3612345678,,Budapest
+"""
+
+
+def read_chunk(text):
+    return pd.read_csv(io.StringIO(text), dtype=str, usecols=["NUMBER", "NAME"], keep_default_na=False)
+
+
+def test_foreign_numbers_are_imported_as_international():
+    contacts, invalid, errors = validate_chunk(read_chunk(CSV), max_errors=10)
+
+    assert contacts[["phone_number", "name", "row"]].values.tolist() == [
+        ["4792345678", "Kari", 2],
+        ["447911123456", "Oliver", 3],
+        ["4915123456789", "Lena", 4],
+        ["33612345678", "Chloé", 5],
+        ["14155552671", "Sam", 6],  # National numbers fall back to the default region
+    ]
+    assert invalid == 2
+    assert errors == [{"row": 7, "error": "Invalid phone number: '12345'"}, {"row": 8, "error": "Missing name"}]
+
+
+def test_a_number_repeated_in_a_chunk_keeps_its_last_name():
+    contacts, invalid, errors = validate_chunk(read_chunk("NUMBER,NAME\n4792345678,Kari\n+47 92 34 56 78,Kari N\n"),
+                                               max_errors=10)
+    assert contacts[["phone_number", "name"]].values.tolist() == [["4792345678", "Kari N"]]
+    assert (invalid, errors) == (0, [])
+
+
+def test_errors_are_capped():
+    _, invalid, errors = validate_chunk(read_chunk("NUMBER,NAME\n1,a\n2,b\n3,c\n"), max_errors=2)
+    assert invalid == 3
+    assert [error["row"] for error in errors] == [2, 3]
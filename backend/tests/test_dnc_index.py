@@ -0,0 +1,41 @@
+import numpy as np
+
+from utils.dnc_index import DNCIndex, PLATFORM_DNC_OWNER, dnc_scope_owners, phone_numbers_to_int
+
+
+def make_index(owner_numbers: dict) -> DNCIndex:
+    index = DNCIndex()
+    for owner, numbers in owner_numbers.items():
+        index._store(owner, 1, numbers)
+    return index
+
+
+def test_phone_numbers_to_int_flags_malformed_numbers():
+    values, valid = phone_numbers_to_int(["12015550123", "+447911123456", "1234567890123456789", "١٢٣", "", "12a"])
+    assert valid.tolist() == [True, True, False, False, False, False]
+    assert values[:2].tolist() == [12015550123, 447911123456]
+
+
+def test_contains():
+    index = make_index({"user": ["12015550123", "13235648048"], "admin": ["447911123456"]})
+    mask = index.contains(["user", "admin"], ["13235648048", "16098665457", "+447911123456"])
+    assert mask.tolist() == [True, False, True]
+
+
+def test_malformed_entries_match_nothing():
+    # A malformed DNC entry used to share its -1 sentinel with every malformed contact number
+    index = make_index({"user": ["not a number", "99999999999999999999", "12015550123"]})
+    mask = index.contains(["user"], ["bad", "١٢٣٤", "123456789012345678901", "12015550123"])
+    assert mask.tolist() == [False, False, False, True]
+    assert index._scopes["user"][1].tolist() == [12015550123]
+
+
+def test_unknown_owner_and_empty_list():
+    index = make_index({"user": []})
+    assert not index.contains(["user", "other"], ["12015550123"]).any()
+    assert index.contains(["user"], []).dtype == np.bool_
+
+
+def test_dnc_scope_owners_include_the_platform_list():
+    assert dnc_scope_owners("u1", "a1") == ["u1", "a1", PLATFORM_DNC_OWNER]
+    assert dnc_scope_owners("a1", None) == ["a1", PLATFORM_DNC_OWNER]
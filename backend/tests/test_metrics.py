@@ -0,0 +1,11 @@
+import socket
+
+from utils.metrics import start_metrics_server
+
+
+def test_port_in_use_is_a_warning_not_an_error(caplog):
+    with socket.socket() as taken:
+        taken.bind(("", 0))
+        taken.listen()
+        assert not start_metrics_server(taken.getsockname()[1])
+    assert "Metrics server not started" in caplog.text
@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from utils.pagination import decode_cursor, encode_cursor
+
+SORT = [("sent_at", -1), ("_id", -1)]
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 5, 1, 12, 30), ObjectId()]
+    assert decode_cursor(encode_cursor(values), SORT) == values
+
+
+@pytest.mark.parametrize("payload", [
+    b'[{"$oid": "not-an-id"}, 1]',  # InvalidId
+    b'[{"$date": "yesterday"}, 1]',
+    b'[1, 2',
+    b'\xff\xfe',
+    b'[1]',  # One value per sort key
+    b'{"a": 1}',
+])
+def test_invalid_cursors_are_bad_requests(payload):
+    cursor = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, SORT)
+    assert error.value.status_code == 400
+
+
+def test_cursor_that_is_not_base64():
+    with pytest.raises(HTTPException):
+        decode_cursor("a", SORT)
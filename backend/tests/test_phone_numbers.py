@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.phone_numbers import normalize_phone_number, normalize_phone_numbers
+
+
+@pytest.mark.parametrize("stored", [
+    "4792345678",  # Norway, was read as a US number
+    "3612345678",  # Hungary
+    "3235648048",  # Belgium
+    "447911123456",
+    "4915123456789",
+    "33612345678",
+    "12015550123",
+])
+def test_bare_digits_are_international(stored):
+    assert normalize_phone_number(stored) == stored
+    assert normalize_phone_number(stored, user_input=True) == stored
+
+
+@pytest.mark.parametrize("national, expected", [
+    ("4155552671", "14155552671"),
+    ("(212) 555-1234", "12125551234"),
+    ("718.555.0199", "17185550199"),
+])
+def test_user_input_falls_back_to_national_numbers_of_the_default_region(national, expected):
+    assert normalize_phone_number(national, user_input=True) == expected
+    # Stored and webhook numbers never do
+    assert normalize_phone_number(national) is None
+
+
+@pytest.mark.parametrize("number, expected", [
+    ("+32 2 564 80 48", "3225648048"),
+    ("0044 7911 123456", "447911123456"),
+    ("+1 (201) 555-0123", "12015550123"),
+    ("+47 92 34 56 78", "4792345678"),
+    (12015550123, "12015550123"),
+    (12015550123.0, "12015550123"),
+])
+def test_prefixed_and_numeric_values(number, expected):
+    assert normalize_phone_number(number) == expected
+
+
+@pytest.mark.parametrize("number", ["", "abc", "123", "0000000", None, float("nan"), 1.5])
+def test_invalid_numbers(number):
+    assert normalize_phone_number(number) is None
+    assert normalize_phone_number(number, user_input=True) is None
+
+
+def test_batch_keeps_the_index_of_a_series():
+    numbers = pd.Series(["(415) 555-2671", "bad", None, "4792345678"], index=[10, 11, 12, 13])
+    assert normalize_phone_numbers(numbers, user_input=True).to_dict() == {10: "14155552671", 11: None, 12: None,
+                                                                           13: "4792345678"}
+
+
+def test_batch_of_an_array():
+    result = normalize_phone_numbers(np.array(["3612345678", 12015550123, np.nan, "4155552671"], dtype=object))
+    assert result.tolist() == ["3612345678", "12015550123", None, None]
@@ -0,0 +1,53 @@
+import asyncio
+
+import mongomock
+from bson import ObjectId
+
+from utils.receipt_buffer import ReceiptBuffer
+
+
+class AsyncCollection:
+    """Motor-like wrapper of a mongomock collection; like Motor, it refuses truth testing."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __bool__(self):
+        raise NotImplementedError("Collection objects do not implement truth value testing or bool()")
+
+    async def bulk_write(self, operations, **kwargs):
+        return self.collection.bulk_write(operations, **kwargs)
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+
+        class Cursor:
+            async def to_list(self, length):
+                return list(cursor)
+
+        return Cursor()
+
+
+def test_flush_with_stats_collection_updates_messages_and_counters():
+    database = mongomock.MongoClient().db
+    campaign_id = ObjectId()
+    database.messages.insert_many([
+        {"message_id": "m1", "type": "sent", "status": "unknown", "campaigns": [str(campaign_id)]},
+        {"message_id": "m2", "type": "sent", "status": "unknown", "campaigns": [str(campaign_id)]},
+    ])
+    database.stats.insert_one({"_id": campaign_id, "sent": 2, "delivered": 0, "failed": 0})
+
+    async def run():
+        buffer = ReceiptBuffer(AsyncCollection(database.messages), batch_size=10, flush_interval=0.01,
+                               stats_collection=AsyncCollection(database.stats))
+        buffer.start()
+        await buffer.add({"messageId": "m1", "status": "delivered"})
+        await buffer.add({"messageId": "m2", "status": "failed"})
+        await asyncio.wait_for(buffer.stop(), 5)
+
+    asyncio.run(run())
+
+    assert {doc["message_id"]: doc["status"] for doc in database.messages.find()} == {"m1": "delivered",
+                                                                                       "m2": "failed"}
+    stats = database.stats.find_one({"_id": campaign_id})
+    assert (stats["sent"], stats["delivered"], stats["failed"]) == (1, 1, 1)
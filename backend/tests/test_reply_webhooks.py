@@ -0,0 +1,54 @@
+import mongomock
+import pymongo
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    database = mongomock.MongoClient().db
+    database.messages.create_index([("message_id", pymongo.ASCENDING)], unique=True)
+    calls = []
+
+    async def lookup_route(*args):
+        return {"campaigns": ["c1"], "users": ["u1"], "opt_out_users": []}
+
+    def recorder(name):
+        async def record(*args, **kwargs):
+            calls.append(name)
+        return record
+
+    monkeypatch.setattr(main, "messages_collection", AsyncCollection(database.messages))
+    monkeypatch.setattr(main, "lookup_route", lookup_route)
+    monkeypatch.setattr(main, "record_reply", recorder("record_reply"))
+    monkeypatch.setattr(main, "record_incoming", recorder("record_incoming"))
+    monkeypatch.setattr(main.manager, "publish_event", recorder("publish_event"))
+    return TestClient(main.app), database, calls
+
+
+def reply():
+    return {"msisdn": "447911123456", "to": "12015550123", "messageId": "reply-1", "text": "Hello", "type": "text",
+            "message-timestamp": "2024-05-01 12:00:00"}
+
+
+@pytest.mark.parametrize("path, counted", [
+    ("/messages/inbound", ["record_reply", "record_incoming", "publish_event"]),
+    ("/special/replies", ["record_reply", "record_incoming"]),
+])
+def test_redelivered_reply_is_acknowledged_and_counted_once(webhook, path, counted):
+    client, database, calls = webhook
+    assert client.get(path, params=reply()).status_code == 200
+    assert client.get(path, params=reply()).status_code == 200
+    assert database.messages.count_documents({"message_id": "reply-1"}) == 1
+    assert calls == counted
+
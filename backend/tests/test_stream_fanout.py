@@ -0,0 +1,207 @@
+import asyncio
+import json
+
+import mongomock
+from redis.exceptions import ConnectionError
+
+from utils.stream_events import StreamEventLog
+from utils.stream_fanout import ConnectionManager, InMemoryStreamBroker, RedisStreamBroker
+
+
+class FakePubSub:
+    def __init__(self, items, error=None):
+        self.items = items
+        self.error = error
+        self.closed = False
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for item in self.items:
+            yield item
+        if self.error:
+            raise self.error
+        await asyncio.Event().wait()  # Stays subscribed
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self.opened = []
+
+    def pubsub(self):
+        pubsub = self.subscriptions[len(self.opened)]
+        self.opened.append(pubsub)
+        return pubsub
+
+
+def message(data):
+    return {"type": "message", "data": data}
+
+
+def test_listener_skips_bad_events_and_resubscribes_after_a_connection_error():
+    event = json.dumps({"message": "hi", "user_ids": ["u1"], "event_id": 7})
+    redis = FakeRedis([
+        FakePubSub([{"type": "subscribe", "data": 1}, message(b"not json"), message(event)],
+                   error=ConnectionError("Connection reset")),
+        FakePubSub([message(event)]),
+    ])
+    broker = RedisStreamBroker.__new__(RedisStreamBroker)
+    broker.redis = redis
+    broker._listener = None
+    broker.RECONNECT_DELAY = 0
+    delivered = []
+
+    async def handler(text, user_ids, event_id):
+        delivered.append((text, user_ids, event_id))
+
+    async def run():
+        await broker.start(handler)
+        for _ in range(100):
+            if len(delivered) == 2:
+                break
+            await asyncio.sleep(0)
+        await broker.stop()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert delivered == [("hi", ["u1"], 7)] * 2
+    assert len(redis.opened) == 2
+    assert all(pubsub.closed for pubsub in redis.opened)
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+    async def insert_one(self, document):
+        return self.collection.insert_one(document)
+
+    async def delete_many(self, *args, **kwargs):
+        return self.collection.delete_many(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+
+        class Cursor:
+            def sort(self, *args):
+                cursor.sort(*args)
+                return self
+
+            async def __aiter__(self):
+                for doc in cursor:
+                    yield doc
+
+        return Cursor()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+async def flush():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def event_log():
+    database = mongomock.MongoClient().db
+    return StreamEventLog(AsyncCollection(database.events), AsyncCollection(database.counters)), database
+
+
+def test_in_memory_broker_hands_events_to_the_handler_once_started():
+    broker = InMemoryStreamBroker()
+    delivered = []
+
+    async def handler(text, user_ids, event_id):
+        delivered.append((text, user_ids, event_id))
+
+    async def run():
+        await broker.publish("early", ["u1"])  # No handler yet, dropped
+        await broker.start(handler)
+        await broker.publish("hi", ["u1", "u2"], 3)
+
+    asyncio.run(run())
+    assert delivered == [("hi", ["u1", "u2"], 3)]
+
+
+def test_every_connection_of_a_user_gets_the_event():
+    tabs, other = [FakeWebSocket(), FakeWebSocket()], FakeWebSocket()
+
+    async def run():
+        manager = ConnectionManager(InMemoryStreamBroker())
+        await manager.start()
+        for websocket in tabs:
+            await manager.connect(websocket, "u1")
+        await manager.connect(other, "u2")
+        await manager.broadcast(json.dumps({"event": "reply"}), ["u1"])
+        await flush()
+        await manager.stop()
+
+    asyncio.run(run())
+    assert [websocket.sent for websocket in tabs] == [[{"event": "reply"}]] * 2
+    assert other.sent == []
+    assert all(websocket.closed for websocket in tabs + [other])
+
+
+def test_reconnecting_client_gets_the_missed_events_once_and_in_order():
+    log, _ = event_log()
+    first, second = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        manager = ConnectionManager(InMemoryStreamBroker(), log)
+        await manager.start()
+        connection = await manager.connect(first, "u1")
+        await manager.publish_event({"event": "reply", "n": 1}, ["u1"])
+        await flush()
+        manager.disconnect(connection, "u1")
+
+        for n in (2, 3):
+            await manager.publish_event({"event": "reply", "n": n}, ["u1"])
+        await manager.connect(second, "u1", last_event_id=first.sent[-1]["event_id"])
+        await manager.publish_event({"event": "reply", "n": 4}, ["u1"])
+        await flush()
+        await manager.stop()
+
+    asyncio.run(run())
+    assert first.sent == [{"event": "reply", "n": 1, "event_id": 1}]
+    assert second.sent == [{"event": "reply", "n": n, "event_id": n} for n in (2, 3, 4)]
+
+
+def test_reconnecting_client_is_told_to_reload_when_its_events_were_trimmed():
+    log, database = event_log()
+    websocket = FakeWebSocket()
+
+    async def run():
+        manager = ConnectionManager(InMemoryStreamBroker(), log)
+        await manager.start()
+        for n in (1, 2, 3):
+            await manager.publish_event({"event": "reply", "n": n}, ["u1"])
+        database.events.delete_many({"event_id": {"$lte": 2}})
+        await manager.connect(websocket, "u1", last_event_id=0)
+        await flush()
+        await manager.stop()
+
+    asyncio.run(run())
+    assert websocket.sent == [{"event": "reset", "event_id": 3}]
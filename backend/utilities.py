@@ -11,8 +11,10 @@ from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 from itsdangerous import URLSafeTimedSerializer, BadTimeSignature, SignatureExpired, BadSignature
 from pydantic import BaseModel, create_model, ConfigDict, EmailStr
 
-from database import dnc_collection, contact_collection, sms_queue_collection
+from database import dnc_collection, contact_collection, sms_queue_collection, dnc_version_collection
 from environment import APP_ENVIRONMENT, SECRET_KEY, SMTP_PASSWORD, SMTP_PORT, SMTP_USERNAME, SMTP_SERVER, SMTP_DOMAIN
+from utils.dnc_index import dnc_index, dnc_scope_owners
+from utils.metrics import DNC_FILTER_SECONDS
 from vonage_api import vonage_client
 
 logging.basicConfig(level=logging.DEBUG, filename='app.log', filemode='a',
@@ -116,23 +118,6 @@ def make_optional_fields(model: Type[BaseModel], config: ConfigDict = {}, model_
     # return create_model(model_name, **{k: (v, ...) for k, v in annotations.items()})
 
 
-def convert_to_string(value: any) -> str:
-    global string
-    if isinstance(value, int):
-        string = str(value)
-    if isinstance(value, float):
-        string = str(int(value))
-    if isinstance(value, str):
-        string = "".join(value.split("."))
-
-    return string
-
-
-def is_valid_phone_number(number: str) -> bool:
-    pattern = re.compile(r'^[1-9]\d{6,14}$')  # Phone number must be 7 to 15 digits long, and cannot start with 0 or +
-    return bool(pattern.match(number))
-
-
 async def retrieve_contacts(
         campaign_data,
         current_user
@@ -164,17 +149,15 @@ async def retrieve_contacts(
             detail=f"The following contact group(s) do(es) not exist: {', '.join(missing_groups)}"
         )
 
-    # Step 3: Fetch DNC contacts in bulk (only once)
-    dnc_contacts = await dnc_collection.find(
-        {"created_by": {"$in": [current_user.id, current_user.created_by]}}
-    ).to_list(length=None)
-    dnc_phone_numbers = {contact["phone_number"] for contact in dnc_contacts}
+    # Step 3: Load the DNC scopes into the in-memory index (only reloaded when they changed)
+    dnc_owners = dnc_scope_owners(current_user.id, current_user.created_by)
+    with DNC_FILTER_SECONDS.labels("api").time():
+        await dnc_index.refresh_async(dnc_collection, dnc_version_collection, dnc_owners)
 
     # Step 4: Filter out DNC contacts from the results
     contact_groups = {}
     for group in user_contacts_grouped:
-        filtered_contacts = [contact for contact in group["contacts"] if
-                             contact["phone_number"] not in dnc_phone_numbers]
+        filtered_contacts = dnc_index.exclude(dnc_owners, group["contacts"])
         if not filtered_contacts:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,125 @@
+"""Frozen audience snapshots: the recipients of a queue entry, resolved once when the campaign is queued.
+
+Groups are resolved, numbers deduplicated across groups and DNC entries removed server-side in one aggregation
+that `$merge`s compact rows (queue_id, seq, phone_number, name) into the `campaign audience` collection. The
+worker streams rows by `seq`, so totals are exact, resuming is a single integer and chunks are plain sequence
+ranges. Opt-outs arriving after the snapshot are still filtered out at send time.
+"""
+from math import ceil
+from typing import Callable, Dict, List
+
+from pymongo.collection import Collection
+
+AUDIENCE_COLLECTION = "campaign audience"
+AUDIENCE_PROJECTION = {"_id": 0, "seq": 1, "phone_number": 1, "name": 1}
+
+
+def audience_pipeline(user_id: str, audiences: Dict[str, List[str]], dnc_owners: List[str]) -> List[dict]:
+    """Builds the audiences of several queue entries ({queue_id: contact_groups}) of one user in a single pass."""
+    all_groups = sorted({group for contact_groups in audiences.values() for group in contact_groups})
+    targets = [{"queue_id": queue_id, "groups": contact_groups} for queue_id, contact_groups in audiences.items()]
+    return [
+        {"$match": {"created_by": user_id, "groups": {"$in": all_groups}}},
+        # Queue entries whose groups the contact belongs to
+        {"$project": {"phone_number": 1, "name": 1, "queue_id": {"$map": {
+            "input": {"$filter": {"input": {"$literal": targets},
+                                  "cond": {"$gt": [{"$size": {"$setIntersection": ["$$this.groups", "$groups"]}}, 0]}}},
+            "in": "$$this.queue_id"
+        }}}},
+        {"$unwind": "$queue_id"},
+        {"$sort": {"_id": 1}},
+        # A number in several groups is messaged once, under the name of its oldest contact
+        {"$group": {"_id": {"queue_id": "$queue_id", "phone_number": "$phone_number"},
+                    "name": {"$first": "$name"}, "first_id": {"$first": "$_id"}}},
+        {"$lookup": {"from": "dnc", "localField": "_id.phone_number", "foreignField": "phone_number",
+                     "pipeline": [{"$match": {"created_by": {"$in": dnc_owners}}}, {"$limit": 1},
+                                  {"$project": {"_id": 1}}],
+                     "as": "dnc"}},
+        {"$match": {"dnc": {"$size": 0}}},
+        {"$setWindowFields": {"partitionBy": "$_id.queue_id", "sortBy": {"first_id": 1},
+                              "output": {"seq": {"$documentNumber": {}}}}},
+        {"$project": {"_id": 0, "queue_id": "$_id.queue_id", "seq": 1, "phone_number": "$_id.phone_number",
+                      "name": 1}},
+        {"$merge": {"into": AUDIENCE_COLLECTION, "on": ["queue_id", "seq"], "whenMatched": "replace",
+                    "whenNotMatched": "insert"}}
+    ]
+
+
+def audience_sizes_pipeline(queue_ids: List[str]) -> List[dict]:
+    return [
+        {"$match": {"queue_id": {"$in": queue_ids}}},
+        {"$group": {"_id": "$queue_id", "size": {"$sum": 1}}}
+    ]
+
+
+async def build_audiences(contact_collection, audience_collection, user_id: str, audiences: Dict[str, List[str]],
+                          dnc_owners: List[str]) -> Dict[str, int]:
+    """Materialises the audiences of `audiences` ({queue_id: contact_groups}, Motor) and returns their sizes.
+
+    Two round trips whatever the number of queue entries: the build and one grouped count.
+    """
+    await contact_collection.aggregate(audience_pipeline(user_id, audiences, dnc_owners),
+                                       allowDiskUse=True).to_list(None)
+    sizes = {doc["_id"]: doc["size"] async for doc in audience_collection.aggregate(
+        audience_sizes_pipeline(list(audiences)))}
+    return {queue_id: sizes.get(queue_id, 0) for queue_id in audiences}
+
+
+def build_audiences_sync(contact_collection: Collection, audience_collection: Collection, user_id: str,
+                         audiences: Dict[str, List[str]], dnc_owners: List[str]) -> Dict[str, int]:
+    """pymongo counterpart of `build_audiences`, for entries queued before audiences were snapshotted."""
+    list(contact_collection.aggregate(audience_pipeline(user_id, audiences, dnc_owners), allowDiskUse=True))
+    sizes = {doc["_id"]: doc["size"] for doc in audience_collection.aggregate(
+        audience_sizes_pipeline(list(audiences)))}
+    return {queue_id: sizes.get(queue_id, 0) for queue_id in audiences}
+
+
+def fetch_audience_batch(
+        audience_collection: Collection,
+        queue_id: str,
+        batch_size: int,
+        after_seq: int = 0,
+        end_seq: int | None = None,
+        exclude: Callable[[List[dict]], List[dict]] | None = None
+) -> tuple[List[dict], int]:
+    """Reads the next `batch_size` recipients after `after_seq` (and up to `end_seq`), in `seq` order.
+
+    `exclude` drops unwanted recipients (e.g. late opt-outs) from each page; pages are read until the batch is
+    full or the range runs out. Returns the batch and the last `seq` scanned, which is where the next batch resumes.
+    """
+    batch = []
+    last_seq = after_seq
+
+    while len(batch) < batch_size:
+        page_size = batch_size - len(batch)
+        seq_range = {"$gt": last_seq}
+        if end_seq is not None:
+            seq_range["$lte"] = end_seq
+        page = list(audience_collection.find({"queue_id": queue_id, "seq": seq_range}, AUDIENCE_PROJECTION)
+                    .sort("seq", 1).limit(page_size))
+
+        if not page:
+            break
+
+        last_seq = page[-1]["seq"]
+        batch.extend(exclude(page) if exclude else page)
+
+        if len(page) < page_size:
+            break
+
+    return batch, last_seq
+
+
+def split_audience_ranges(total: int, chunk_size: int, max_chunks: int, align: int = 1) -> List[dict]:
+    """Splits `total` recipients into at most `max_chunks` contiguous `seq` ranges of roughly `chunk_size`.
+
+    Boundaries fall on multiples of `align` (the campaign batch size) so chunks don't add partial batches.
+    Each range is {"start_seq": exclusive lower bound, "end_seq": inclusive upper bound}.
+    """
+    chunks = max(1, min(max_chunks, ceil(total / chunk_size)))
+    boundaries = sorted({round(total * index / chunks / align) * align for index in range(1, chunks)})
+    boundaries = [boundary for boundary in boundaries if 0 < boundary < total]
+
+    starts = [0] + boundaries
+    ends = boundaries + [total]
+    return [{"start_seq": start, "end_seq": end} for start, end in zip(starts, ends)]
@@ -0,0 +1,122 @@
+"""Per-campaign message counters for the chats dashboard, kept in the `campaign stats` collection.
+
+One document per campaign (`_id` is the campaign ID) with:
+    sent       messages accepted by Vonage that haven't failed since
+    delivered  messages with a delivered receipt
+    failed     messages rejected on submit or with a failed/expired/rejected receipt
+    replies    inbound replies routed to the campaign
+
+The worker, the chat reply endpoint, the receipt buffer and the inbound webhooks `$inc` the counters as they
+write messages, so the dashboard reads them instead of scanning `messages`. `rebuild_stats` recomputes every
+document from `messages`, for history written before the counters existed or to correct drift:
+
+    python -m utils.campaign_stats rebuild
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from models.sms_models import MessageStatus, MessageType
+
+STATS_COLLECTION = "campaign stats"
+FAILED_STATUSES = [MessageStatus.failed.value, MessageStatus.expired.value, MessageStatus.rejected.value]
+
+
+def status_counters(message_status: str | None) -> Dict[str, int]:
+    """The counters a sent message with `message_status` contributes to."""
+    failed = message_status in FAILED_STATUSES
+    return {"sent": int(not failed), "delivered": int(message_status == MessageStatus.delivered), "failed": int(failed)}
+
+
+def status_change(old_status: str | None, new_status: str | None) -> Dict[str, int]:
+    """Counter deltas for a sent message moving from `old_status` to `new_status`."""
+    old, new = status_counters(old_status), status_counters(new_status)
+    return {counter: new[counter] - old[counter] for counter in new if new[counter] != old[counter]}
+
+
+def stats_update(increments: Dict[str, int]) -> dict:
+    return {"$inc": increments, "$set": {"updated_at": datetime.now(timezone.utc)}}
+
+
+def record_batch(stats_collection: Collection, campaign_id: str, user_id: str, sent: int, failed: int):
+    """Counts a worker batch; creates the campaign's document on its first batch."""
+    update = stats_update({"sent": sent, "failed": failed})
+    update["$setOnInsert"] = {"created_by": user_id}
+    stats_collection.update_one({"_id": ObjectId(campaign_id)}, update, upsert=True)
+
+
+async def record_sent(stats_collection, campaign_id: str, user_id: str):
+    """Counts a single message sent from the chat (Motor)."""
+    update = stats_update({"sent": 1})
+    update["$setOnInsert"] = {"created_by": user_id}
+    await stats_collection.update_one({"_id": ObjectId(campaign_id)}, update, upsert=True)
+
+
+async def record_status_changes(stats_collection, messages: Iterable[dict], statuses: Dict[str, str]):
+    """Applies receipts to the counters in one bulk write.
+
+    `messages` are the sent messages as they were before the receipts (message_id, status, campaigns) and
+    `statuses` maps message IDs to their new status. Repeated receipts don't change the status, so they
+    don't count twice.
+    """
+    increments: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for message in messages:
+        for counter, delta in status_change(message.get("status"), statuses[message["message_id"]]).items():
+            for campaign_id in message.get("campaigns", []):
+                increments[campaign_id][counter] += delta
+
+    operations = [UpdateOne({"_id": ObjectId(campaign_id)}, stats_update(dict(deltas)))
+                  for campaign_id, deltas in increments.items() if any(deltas.values())]
+    if operations:
+        await stats_collection.bulk_write(operations, ordered=False)
+
+
+async def record_reply(stats_collection, campaign_ids: List[str]):
+    if campaign_ids:
+        await stats_collection.update_many({"_id": {"$in": [ObjectId(campaign_id) for campaign_id in campaign_ids]}},
+                                           stats_update({"replies": 1}))
+
+
+def rebuild_stats(database):
+    """Recomputes the counters of every campaign from `messages`."""
+    database["messages"].aggregate([
+        {"$match": {"type": {"$in": [MessageType.sent.value, MessageType.reply.value]}}},
+        {"$unwind": "$campaigns"},
+        {"$group": {
+            "_id": "$campaigns",
+            "sent": {"$sum": {"$cond": [{"$and": [{"$eq": ["$type", MessageType.sent.value]},
+                                                  {"$not": {"$in": ["$status", FAILED_STATUSES]}}]}, 1, 0]}},
+            "delivered": {"$sum": {"$cond": [{"$and": [{"$eq": ["$type", MessageType.sent.value]},
+                                                       {"$eq": ["$status", MessageStatus.delivered.value]}]}, 1, 0]}},
+            "failed": {"$sum": {"$cond": [{"$and": [{"$eq": ["$type", MessageType.sent.value]},
+                                                    {"$in": ["$status", FAILED_STATUSES]}]}, 1, 0]}},
+            "replies": {"$sum": {"$cond": [{"$eq": ["$type", MessageType.reply.value]}, 1, 0]}}
+        }},
+        {"$set": {"_id": {"$toObjectId": "$_id"}}},
+        {"$lookup": {"from": "sms campaign", "localField": "_id", "foreignField": "_id",
+                     "pipeline": [{"$project": {"created_by": 1}}], "as": "campaign"}},
+        {"$unwind": "$campaign"},  # Drops stats of deleted campaigns
+        {"$set": {"created_by": "$campaign.created_by", "updated_at": "$$NOW"}},
+        {"$unset": "campaign"},
+        {"$merge": {"into": STATS_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Campaign message counters maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from pymongo import MongoClient
+
+    from environment import MONGODB_URL
+    from utils.indexes import ensure_indexes
+
+    db = MongoClient(MONGODB_URL).get_database("fastapi")
+    ensure_indexes(db[STATS_COLLECTION])
+    rebuild_stats(db)
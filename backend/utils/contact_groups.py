@@ -0,0 +1,249 @@
+"""Contact group maintenance and the `contact groups` catalogue.
+
+The catalogue holds one document per (owner, group name) with its member count, how many members are on the
+owner's DNC lists and when it last changed, so group listings, campaign validation and audience estimates read
+O(groups) documents instead of scanning contacts. Contact add, update and delete apply counter deltas, imports
+and group removals recount or drop their group. A user's catalogue is built from `contact` on first use
+(`bootstrap_groups`) when they have contacts but no entries. DNC list changes are not tracked per group;
+`rebuild_groups` recomputes the whole catalogue from `contact`, to correct drift:
+
+    python -m utils.contact_groups rebuild
+
+Removing a group is two server-side statements: contacts whose only group it is are deleted, and the group is
+`$pull`ed from the contacts that also belong to others. Groups larger than GROUP_REMOVAL_BATCH_SIZE are processed
+in `_id` ranges, with the range boundaries computed by the server, so each pair of statements stays bounded
+(and fits in a transaction) and progress is logged as ranges complete. With MONGODB_TRANSACTIONS each range is
+removed atomically.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Set
+
+from pymongo import UpdateOne
+
+from environment import GROUP_REMOVAL_BATCH_SIZE, MONGODB_TRANSACTIONS
+from utils.dnc_index import dnc_scope_owners
+
+logger = logging.getLogger("utilities")
+
+GROUPS_COLLECTION = "contact groups"
+GROUP_PROJECTION = {"_id": 0, "name": 1, "member_count": 1, "dnc_excluded_count": 1, "updated_at": 1}
+
+
+def group_filter(user_id: str, group: str) -> dict:
+    return {"created_by": user_id, "groups": group}
+
+
+def only_group_filter(user_id: str, group: str) -> dict:
+    # Every entry is `group`, which also covers arrays that repeat it
+    return {"created_by": user_id, "groups": {"$eq": group, "$not": {"$elemMatch": {"$ne": group}}}}
+
+
+def range_boundaries_pipeline(user_id: str, group: str, batch_size: int) -> List[dict]:
+    """The `_id` of every `batch_size`-th member of the group, in `_id` order."""
+    return [
+        {"$match": group_filter(user_id, group)},
+        {"$project": {"_id": 1}},
+        {"$setWindowFields": {"sortBy": {"_id": 1}, "output": {"position": {"$documentNumber": {}}}}},
+        {"$match": {"$expr": {"$eq": [{"$mod": ["$position", batch_size]}, 0]}}}
+    ]
+
+
+def in_range(query: dict, id_range: dict | None) -> dict:
+    return {**query, "_id": id_range} if id_range else query
+
+
+async def _remove_range(contact_collection, user_id: str, group: str, id_range: dict | None,
+                        session=None) -> tuple[int, int]:
+    # Delete first: pulling first would leave contacts of this group only with an empty group list
+    deleted = await contact_collection.delete_many(in_range(only_group_filter(user_id, group), id_range),
+                                                   session=session)
+    updated = await contact_collection.update_many(in_range(group_filter(user_id, group), id_range),
+                                                   {"$pull": {"groups": group}}, session=session)
+    return deleted.deleted_count, updated.modified_count
+
+
+async def remove_range(contact_collection, user_id: str, group: str, id_range: dict | None) -> tuple[int, int]:
+    if not MONGODB_TRANSACTIONS:
+        return await _remove_range(contact_collection, user_id, group, id_range)
+
+    async with await contact_collection.database.client.start_session() as session:
+        return await session.with_transaction(
+            lambda transaction: _remove_range(contact_collection, user_id, group, id_range, transaction)
+        )
+
+
+async def remove_group(contact_collection, user_id: str, group: str) -> tuple[int, int]:
+    """Removes `group` from the user's contacts (Motor). Returns the deleted and updated contact counts."""
+    total = await contact_collection.count_documents(group_filter(user_id, group))
+    boundaries = []
+    if total > GROUP_REMOVAL_BATCH_SIZE:
+        boundaries = [doc["_id"] async for doc in contact_collection.aggregate(
+            range_boundaries_pipeline(user_id, group, GROUP_REMOVAL_BATCH_SIZE), allowDiskUse=True)]
+    if not boundaries:
+        return await remove_range(contact_collection, user_id, group, None)
+
+    # (..., b1], (b1, b2], ..., (bn, ...): the last range also picks up contacts added since the count
+    id_ranges = [{"$lte": boundaries[0]}] + [{"$gt": start, "$lte": end} for start, end in
+                                              zip(boundaries, boundaries[1:])] + [{"$gt": boundaries[-1]}]
+    deleted = updated = 0
+    for index, id_range in enumerate(id_ranges, start=1):
+        range_deleted, range_updated = await remove_range(contact_collection, user_id, group, id_range)
+        deleted += range_deleted
+        updated += range_updated
+        logger.info(f"Removing group {group!r} of user {user_id}: range {index}/{len(id_ranges)}, "
+                    f"{deleted + updated}/{total} contacts ({deleted} deleted, {updated} updated)")
+    return deleted, updated
+
+
+def group_deltas(contacts: Iterable[dict], sign: int, blocked: Set[str]) -> tuple[Dict[str, int], Dict[str, int]]:
+    """Member and DNC-excluded count changes of adding (`sign` 1) or removing (-1) `contacts`."""
+    members, dnc = defaultdict(int), defaultdict(int)
+    for contact in contacts:
+        for group in set(contact.get("groups") or []):
+            members[group] += sign
+            if contact["phone_number"] in blocked:
+                dnc[group] += sign
+    return members, dnc
+
+
+async def record_contact_changes(group_collection, user_id: str, removed: Iterable[dict], added: Iterable[dict],
+                                 blocked: Set[str]):
+    """Applies a contact write to the catalogue (Motor).
+
+    `removed` and `added` are the contacts (phone_number, groups) before and after the write and `blocked`
+    the numbers among them on the owner's DNC lists.
+    """
+    members, dnc = defaultdict(int), defaultdict(int)
+    for contacts, sign in [(removed, -1), (added, 1)]:
+        contact_members, contact_dnc = group_deltas(contacts, sign, blocked)
+        for group, delta in contact_members.items():
+            members[group] += delta
+        for group, delta in contact_dnc.items():
+            dnc[group] += delta
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"created_by": user_id, "name": group},
+                  {"$inc": {"member_count": members[group], "dnc_excluded_count": dnc[group]},
+                   "$set": {"updated_at": now}}, upsert=True)
+        for group in members if members[group] or dnc[group]
+    ]
+    if not operations:
+        return
+
+    await group_collection.bulk_write(operations, ordered=False)
+    await group_collection.delete_many({"created_by": user_id, "name": {"$in": list(members)},
+                                        "member_count": {"$lte": 0}})
+
+
+def group_counts_pipeline(user_id: str, dnc_owners: List[str], groups: List[str] | None = None) -> List[dict]:
+    """Member and DNC-excluded counts of the user's groups (all of them without `groups`)."""
+    match = {"created_by": user_id}
+    if groups is not None:
+        match["groups"] = {"$in": groups}
+    pipeline = [
+        {"$match": match},
+        {"$project": {"phone_number": 1, "groups": 1}},
+        {"$lookup": {"from": "dnc", "localField": "phone_number", "foreignField": "phone_number",
+                     "pipeline": [{"$match": {"created_by": {"$in": dnc_owners}}}, {"$limit": 1},
+                                  {"$project": {"_id": 1}}],
+                     "as": "dnc"}},
+        {"$unwind": "$groups"}
+    ]
+    if groups is not None:
+        pipeline.append({"$match": {"groups": {"$in": groups}}})
+    pipeline.append({"$group": {
+        "_id": "$groups",
+        "member_count": {"$sum": 1},
+        "dnc_excluded_count": {"$sum": {"$cond": [{"$gt": [{"$size": "$dnc"}, 0]}, 1, 0]}}
+    }})
+    return pipeline
+
+
+def group_count_writes(user_id: str, counts: List[dict], groups: List[str] | None = None) -> tuple[List, dict]:
+    """Upserts for recounted groups, and the filter of the user's groups that no longer have members."""
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"created_by": user_id, "name": count["_id"]},
+                  {"$set": {"member_count": count["member_count"], "dnc_excluded_count": count["dnc_excluded_count"],
+                            "updated_at": now}}, upsert=True)
+        for count in counts
+    ]
+    counted = [count["_id"] for count in counts]
+    empty = {"created_by": user_id, "name": {"$nin": counted}}
+    if groups is not None:
+        empty["name"]["$in"] = groups
+    return operations, empty
+
+
+async def refresh_groups(contact_collection, group_collection, user_id: str, dnc_owners: List[str],
+                         groups: List[str] | None = None):
+    """Recounts some (or all) of a user's groups from `contact` (Motor)."""
+    counts = await contact_collection.aggregate(group_counts_pipeline(user_id, dnc_owners, groups)).to_list(None)
+    operations, empty = group_count_writes(user_id, counts, groups)
+    if operations:
+        await group_collection.bulk_write(operations, ordered=False)
+    await group_collection.delete_many(empty)
+
+
+async def bootstrap_groups(contact_collection, group_collection, user_id: str, dnc_owners: List[str]) -> bool:
+    """Builds the catalogue of a user who has contacts but no catalogue entries yet (Motor), such as contacts
+    added before the catalogue existed. Returns whether it did; the recount already includes any write in progress.
+    """
+    if await group_collection.find_one({"created_by": user_id}, {"_id": 1}) is not None:
+        return False
+    if await contact_collection.find_one({"created_by": user_id}, {"_id": 1}) is None:
+        return False
+    logger.info(f"Building the contact group catalogue of user {user_id}")
+    await refresh_groups(contact_collection, group_collection, user_id, dnc_owners)
+    return True
+
+
+async def remove_group_entry(group_collection, user_id: str, group: str):
+    await group_collection.delete_one({"created_by": user_id, "name": group})
+
+
+async def estimate_audience(group_collection, user_id: str, groups: List[str]) -> tuple[int, List[str]]:
+    """Upper bound of the recipients of a campaign to `groups` and the groups that don't exist.
+
+    Members of several groups are counted once per group, the exact audience is resolved when queueing.
+    """
+    entries = await group_collection.find({"created_by": user_id, "name": {"$in": groups}},
+                                          GROUP_PROJECTION).to_list(None)
+    found = {entry["name"] for entry in entries}
+    return (sum(entry["member_count"] - entry["dnc_excluded_count"] for entry in entries),
+            [group for group in groups if group not in found])
+
+
+def rebuild_groups(database):
+    """Recomputes the catalogue of every user with contacts."""
+    users = {str(user["_id"]): user.get("created_by") for user in database["users"].find({}, {"created_by": 1})}
+    group_collection = database[GROUPS_COLLECTION]
+    user_ids = database["contact"].distinct("created_by")
+    group_collection.delete_many({"created_by": {"$nin": user_ids}})
+    for user_id in user_ids:
+        dnc_owners = dnc_scope_owners(user_id, users.get(user_id))
+        counts = list(database["contact"].aggregate(group_counts_pipeline(user_id, dnc_owners), allowDiskUse=True))
+        operations, empty = group_count_writes(user_id, counts)
+        if operations:
+            group_collection.bulk_write(operations, ordered=False)
+        group_collection.delete_many(empty)
+        logger.info(f"Rebuilt {len(counts)} contact group(s) of user {user_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contact group catalogue maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from pymongo import MongoClient
+
+    from environment import MONGODB_URL
+    from utils.indexes import ensure_indexes
+
+    db = MongoClient(MONGODB_URL).get_database("fastapi")
+    ensure_indexes(db[GROUPS_COLLECTION])
+    rebuild_groups(db)
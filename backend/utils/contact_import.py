@@ -0,0 +1,202 @@
+"""Background CSV contact imports, tracked in the `import jobs` collection.
+
+The upload is streamed to a temporary file and read back IMPORT_CHUNK_SIZE rows at a time. Each chunk is
+validated and normalised column-wise with pandas and upserted in one unordered bulk write, so memory use and
+write sizes stay bounded whatever the size of the file. Rows that fail validation or that the database refuses
+are counted and reported on the job (the first IMPORT_MAX_ERRORS of them) instead of aborting the import.
+Clients poll `GET /contact/import/{job_id}` for progress. Once the rows are written the group is recounted in
+the `contact groups` catalogue.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import List
+
+import aiofiles
+import pandas as pd
+from bson import ObjectId
+from fastapi import HTTPException, UploadFile, status
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from environment import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from models.contact_models import ImportJobStatus
+from utils.contact_groups import bootstrap_groups, refresh_groups
+from utils.phone_numbers import normalize_phone_numbers
+
+logger = logging.getLogger("utilities")
+
+IMPORT_JOBS_COLLECTION = "import jobs"
+REQUIRED_COLUMNS = ["NUMBER", "NAME"]
+UPLOAD_READ_SIZE = 1024 * 1024
+
+_running_imports: set[asyncio.Task] = set()
+
+
+async def save_upload(file: UploadFile) -> tuple[str, int]:
+    """Streams `file` to a temporary file. Returns its path and its number of data rows, counted from its lines."""
+    handle, path = tempfile.mkstemp(prefix="contact-import-", suffix=".csv")
+    os.close(handle)
+    lines, last_byte = 0, b"\n"
+    try:
+        async with aiofiles.open(path, "wb") as out_file:
+            while chunk := await file.read(UPLOAD_READ_SIZE):
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+                await out_file.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    if last_byte != b"\n":
+        lines += 1  # No newline after the last row
+    return path, max(lines - 1, 0)
+
+
+def missing_columns(path: str) -> List[str]:
+    try:
+        columns = pd.read_csv(path, nrows=0).columns
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError):
+        columns = []
+    return [column for column in REQUIRED_COLUMNS if column not in columns]
+
+
+def validate_chunk(chunk: pd.DataFrame, max_errors: int) -> tuple[pd.DataFrame, int, List[dict]]:
+    """Normalises and validates a chunk of rows.
+
+    Returns the valid contacts (phone_number, name, row), the number of invalid rows and the errors of the
+    first `max_errors` of them.
+    """
+    rows = chunk.index.to_numpy() + 2  # The index counts data rows from 0 across chunks, after the header row
+    raw_numbers = chunk["NUMBER"].fillna("")
+    names = chunk["NAME"].fillna("").str.strip()
+    numbers = normalize_phone_numbers(raw_numbers, user_input=True)
+    valid_number = numbers.notna().to_numpy()
+    valid = valid_number & (names.str.len() > 0).to_numpy()
+
+    invalid = ~valid
+    errors = [
+        {"row": int(row), "error": "Missing name" if number_ok else f"Invalid phone number: {number!r}"}
+        for row, number, number_ok in zip(rows[invalid][:max_errors], raw_numbers[invalid][:max_errors],
+                                          valid_number[invalid][:max_errors])
+    ]
+
+    contacts = pd.DataFrame({"phone_number": numbers[valid], "name": names[valid], "row": rows[valid]})
+    # A number repeated within the chunk is written once, with its last name
+    contacts = contacts.drop_duplicates("phone_number", keep="last")
+    return contacts, int(invalid.sum()), errors
+
+
+def upsert_operations(contacts: pd.DataFrame, user_id: str, group: str) -> List[UpdateOne]:
+    now = datetime.utcnow()
+    return [
+        UpdateOne({"phone_number": phone_number, "created_by": user_id},
+                  {"$setOnInsert": {"added_at": now},
+                   "$set": {"name": name, "phone_number": phone_number, "updated_at": now},
+                   "$addToSet": {"groups": group}},
+                  upsert=True)
+        for phone_number, name in zip(contacts["phone_number"], contacts["name"])
+    ]
+
+
+async def write_chunk(contact_collection, contacts: pd.DataFrame, user_id: str, group: str,
+                      max_errors: int) -> tuple[dict, List[dict]]:
+    """Upserts `contacts` in one unordered bulk write. Returns the counters to add to the job and the row errors."""
+    if contacts.empty:
+        return {"added": 0, "updated": 0, "failed": 0}, []
+
+    try:
+        result = (await contact_collection.bulk_write(upsert_operations(contacts, user_id, group),
+                                                      ordered=False)).bulk_api_result
+        write_errors = []
+    except BulkWriteError as e:
+        result = e.details
+        write_errors = e.details["writeErrors"]
+
+    rows = contacts["row"].tolist()
+    errors = [{"row": rows[error["index"]], "error": error["errmsg"]} for error in write_errors[:max_errors]]
+    return {"added": result["nUpserted"], "updated": result["nModified"], "failed": len(write_errors)}, errors
+
+
+async def finish_job(jobs_collection, job_id: ObjectId, job_status: ImportJobStatus, error: str | None = None):
+    now = datetime.utcnow()
+    await jobs_collection.update_one({"_id": job_id}, {"$set": {"status": job_status.value, "error": error,
+                                                                "updated_at": now, "finished_at": now}})
+
+
+async def run_import(contact_collection, jobs_collection, group_collection, job_id: ObjectId, path: str,
+                     user_id: str, group: str, dnc_owners: List[str]):
+    reader = None
+    error_budget = IMPORT_MAX_ERRORS
+    try:
+        await jobs_collection.update_one({"_id": job_id}, {"$set": {"status": ImportJobStatus.running.value,
+                                                                    "updated_at": datetime.utcnow()}})
+        # The recount at the end only covers the imported group, the others need a catalogue already
+        await bootstrap_groups(contact_collection, group_collection, user_id, dnc_owners)
+        reader = pd.read_csv(path, dtype=str, usecols=REQUIRED_COLUMNS, keep_default_na=False,
+                             chunksize=IMPORT_CHUNK_SIZE)
+        # Parsing runs in a thread to keep the event loop free
+        while (chunk := await asyncio.to_thread(next, reader, None)) is not None:
+            contacts, invalid, errors = validate_chunk(chunk, error_budget)
+            counters, write_errors = await write_chunk(contact_collection, contacts, user_id, group,
+                                                       error_budget - len(errors))
+            errors += write_errors
+            error_budget -= len(errors)
+
+            update = {"$inc": {**counters, "failed": counters["failed"] + invalid, "processed_rows": len(chunk)},
+                      "$set": {"updated_at": datetime.utcnow()}}
+            if errors:
+                update["$push"] = {"errors": {"$each": errors}}
+            await jobs_collection.update_one({"_id": job_id}, update)
+
+        await refresh_groups(contact_collection, group_collection, user_id, dnc_owners, [group])
+    except asyncio.CancelledError:
+        await finish_job(jobs_collection, job_id, ImportJobStatus.failed, "Import interrupted")
+        raise
+    except Exception as e:
+        logger.exception(f"Contact import {job_id} failed")
+        await finish_job(jobs_collection, job_id, ImportJobStatus.failed, str(e))
+        # Count the rows written before the failure
+        await refresh_groups(contact_collection, group_collection, user_id, dnc_owners, [group])
+    else:
+        await finish_job(jobs_collection, job_id, ImportJobStatus.completed)
+    finally:
+        if reader is not None:
+            reader.close()
+        os.remove(path)
+
+
+async def start_import(contact_collection, jobs_collection, group_collection, file: UploadFile, user_id: str,
+                       group: str, dnc_owners: List[str]) -> dict:
+    """Saves the upload, records its job and starts importing it in the background. Returns the job."""
+    path, estimated_rows = await save_upload(file)
+
+    missing = missing_columns(path)
+    if missing:
+        os.remove(path)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"CSV file is missing required column(s): {', '.join(missing)}."
+        )
+
+    now = datetime.utcnow()
+    job = {"_id": ObjectId(), "created_by": user_id, "group": group, "filename": file.filename,
+           "status": ImportJobStatus.pending.value, "estimated_rows": estimated_rows, "processed_rows": 0, "added": 0,
+           "updated": 0, "failed": 0, "errors": [], "error": None, "created_at": now, "updated_at": now,
+           "finished_at": None}
+    await jobs_collection.insert_one(job)
+
+    task = asyncio.create_task(run_import(contact_collection, jobs_collection, group_collection, job["_id"], path,
+                                          user_id, group, dnc_owners))
+    _running_imports.add(task)
+    task.add_done_callback(_running_imports.discard)
+    return job
+
+
+async def stop_imports():
+    """Cancels the imports still running on shutdown; their jobs are marked failed."""
+    for task in list(_running_imports):
+        task.cancel()
+    await asyncio.gather(*_running_imports, return_exceptions=True)
@@ -0,0 +1,143 @@
+"""Conversation index for the chat contact lists: one document per (campaign, our number, contact phone).
+
+Each conversation keeps its last message, when the contact last replied and its reply and unread counts. The
+worker and the chat reply endpoint upsert it as messages go out, the inbound webhooks update it as replies
+come in, and opening the chat clears the unread count. The contact list pages through it by `last_reply_at`
+instead of self-joining `messages`. `rebuild_conversations` backfills it from `messages`:
+
+    python -m utils.conversations rebuild
+"""
+import argparse
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from models.sms_models import MessageType
+
+CONVERSATIONS_COLLECTION = "conversations"
+CONVERSATION_PROJECTION = {"_id": 1, "our_number": 1, "contact_phone": 1, "contact_name": 1, "last_message": 1,
+                           "last_message_at": 1, "last_reply_at": 1, "reply_count": 1, "unread_count": 1}
+
+
+def conversation_key(campaign_id: str, our_number: str, contact_phone: str) -> dict:
+    return {"campaign_id": str(campaign_id), "our_number": our_number, "contact_phone": contact_phone}
+
+
+def last_message(text: str, message_type: MessageType, sent_at: datetime) -> dict:
+    return {"last_message": {"message": text, "type": message_type, "sent_at": sent_at}, "last_message_at": sent_at}
+
+
+def sent_update(user_id: str, text: str, sent_at: datetime, contact_name: str | None = None) -> dict:
+    on_insert = {"created_by": str(user_id), "last_reply_at": None, "reply_count": 0, "unread_count": 0}
+    if contact_name is not None:
+        on_insert["contact_name"] = contact_name
+    return {"$set": last_message(text, MessageType.sent, sent_at), "$setOnInsert": on_insert}
+
+
+def record_sent_batch(conversation_collection: Collection, campaign_id: str, our_number: str, user_id: str,
+                      messages: List[dict]):
+    """Upserts the conversations of a worker batch (`messages`: contact_phone, contact_name, text) in one write."""
+    if not messages:
+        return
+
+    now = datetime.now(timezone.utc)
+    conversation_collection.bulk_write([
+        UpdateOne(conversation_key(campaign_id, our_number, message["contact_phone"]),
+                  sent_update(user_id, message["text"], now, message.get("contact_name")), upsert=True)
+        for message in messages
+    ], ordered=False)
+
+
+async def record_outgoing(conversation_collection, campaign_id: str, our_number: str, contact_phone: str,
+                          user_id: str, text: str, sent_at: datetime):
+    """Motor: records a message sent from the chat."""
+    await conversation_collection.update_one(conversation_key(campaign_id, our_number, contact_phone),
+                                             sent_update(user_id, text, sent_at), upsert=True)
+
+
+async def record_incoming(conversation_collection, campaign_ids: List[str], our_number: str, contact_phone: str,
+                          text: str, sent_at: datetime):
+    """Motor: records an inbound reply on the conversations of every campaign it was routed to."""
+    if not campaign_ids:
+        return
+
+    await conversation_collection.update_many(
+        {"campaign_id": {"$in": [str(campaign_id) for campaign_id in campaign_ids]}, "our_number": our_number,
+         "contact_phone": contact_phone},
+        {"$set": {**last_message(text, MessageType.reply, sent_at), "last_reply_at": sent_at},
+         "$inc": {"reply_count": 1, "unread_count": 1}}
+    )
+
+
+async def mark_read(conversation_collection, campaign_id: str, contact_phone: str, user_id: str):
+    await conversation_collection.update_many(
+        {"campaign_id": str(campaign_id), "contact_phone": contact_phone, "created_by": str(user_id)},
+        {"$set": {"unread_count": 0}}
+    )
+
+
+def rebuild_conversations(database):
+    """Recomputes every conversation from `messages`, keeping unread counts of conversations that exist."""
+    messages = database["messages"]
+    # Conversations with their last sent message
+    messages.aggregate([
+        {"$match": {"type": MessageType.sent.value}},
+        {"$unwind": "$campaigns"},
+        {"$sort": {"sent_at": 1}},
+        {"$group": {
+            "_id": {"campaign_id": "$campaigns", "our_number": "$sender_did", "contact_phone": "$recipient_did"},
+            "created_by": {"$first": {"$arrayElemAt": ["$users", 0]}},
+            "last_message": {"$last": {"message": "$message", "type": "$type", "sent_at": "$sent_at"}},
+            "last_message_at": {"$last": "$sent_at"}
+        }},
+        {"$project": {"_id": 0, "campaign_id": "$_id.campaign_id", "our_number": "$_id.our_number",
+                      "contact_phone": "$_id.contact_phone", "created_by": 1, "last_message": 1,
+                      "last_message_at": 1, "last_reply_at": {"$literal": None}, "reply_count": {"$literal": 0},
+                      "unread_count": {"$literal": 0}}},
+        {"$merge": {"into": CONVERSATIONS_COLLECTION, "on": ["campaign_id", "our_number", "contact_phone"],
+                    "whenMatched": [{"$set": {"created_by": "$$new.created_by",
+                                              "last_message": "$$new.last_message",
+                                              "last_message_at": "$$new.last_message_at"}}],
+                    "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+
+    # Then their replies, a later reply becomes the last message
+    messages.aggregate([
+        {"$match": {"type": MessageType.reply.value}},
+        {"$unwind": "$campaigns"},
+        {"$sort": {"sent_at": 1}},
+        {"$group": {
+            "_id": {"campaign_id": "$campaigns", "our_number": "$recipient_did", "contact_phone": "$sender_did"},
+            "reply_count": {"$sum": 1},
+            "last_reply": {"$last": {"message": "$message", "type": "$type", "sent_at": "$sent_at"}},
+            "last_reply_at": {"$last": "$sent_at"}
+        }},
+        {"$project": {"_id": 0, "campaign_id": "$_id.campaign_id", "our_number": "$_id.our_number",
+                      "contact_phone": "$_id.contact_phone", "reply_count": 1, "last_reply": 1, "last_reply_at": 1}},
+        {"$merge": {"into": CONVERSATIONS_COLLECTION, "on": ["campaign_id", "our_number", "contact_phone"],
+                    "whenMatched": [{"$set": {
+                        "reply_count": "$$new.reply_count",
+                        "last_reply_at": "$$new.last_reply_at",
+                        "last_message": {"$cond": [{"$gt": ["$$new.last_reply_at", "$last_message_at"]},
+                                                   "$$new.last_reply", "$last_message"]},
+                        "last_message_at": {"$max": ["$$new.last_reply_at", "$last_message_at"]}
+                    }}],
+                    "whenNotMatched": "discard"}}  # Replies to numbers the campaign never messaged
+    ], allowDiskUse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversation index maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from pymongo import MongoClient
+
+    from environment import MONGODB_URL
+    from utils.indexes import ensure_indexes
+
+    db = MongoClient(MONGODB_URL).get_database("fastapi")
+    ensure_indexes(db[CONVERSATIONS_COLLECTION])  # $merge needs the unique conversation key index
+    rebuild_conversations(db)
@@ -0,0 +1,101 @@
+import threading
+from typing import Iterable, List
+
+import numpy as np
+from pymongo.collection import Collection
+
+PLATFORM_DNC_OWNER = "admin"  # created_by of platform-wide opt-outs
+
+
+def dnc_scope_owners(user_id: str, admin_id: str | None) -> List[str]:
+    """DNC scopes of a user's contacts: their own list, their admin's list and the platform-wide opt-outs."""
+    return [owner for owner in [user_id, admin_id, PLATFORM_DNC_OWNER] if owner]
+
+
+MAX_PHONE_DIGITS = 15  # E.164 numbers have at most 15 digits, so they always fit in an int64
+
+
+def phone_numbers_to_int(phone_numbers: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Converts digit strings to int64.
+
+    Returns the values and a mask of the numbers that are plain ASCII digits of E.164 length; the value of any
+    other number is 0 and must be ignored.
+    """
+    digits = [str(number).lstrip("+") for number in phone_numbers]
+    valid = np.fromiter((number.isascii() and number.isdigit() and len(number) <= MAX_PHONE_DIGITS
+                         for number in digits), dtype=bool, count=len(digits))
+    values = np.fromiter((int(number) if is_valid else 0 for number, is_valid in zip(digits, valid)),
+                         dtype=np.int64, count=len(digits))
+    return values, valid
+
+
+class DNCIndex:
+    """Per-process cache of DNC numbers, one sorted int64 array per owner (user, admin or platform).
+
+    Each owner has a counter in the `dnc versions` collection that every DNC write bumps; a scope is
+    reloaded only when its stored version moved past the cached one. Loading streams the numbers from
+    a cursor, so it is not bound by the 16MB `distinct` limit.
+    """
+
+    def __init__(self):
+        self._scopes: dict[str, tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _stale_owners(self, owners: List[str], versions: dict[str, int]) -> List[str]:
+        with self._lock:
+            return [owner for owner in owners
+                    if owner not in self._scopes or self._scopes[owner][0] != versions.get(owner, 0)]
+
+    def _store(self, owner: str, version: int, phone_numbers: List[str]):
+        with self._lock:
+            values, valid = phone_numbers_to_int(phone_numbers)
+            # Malformed entries are left out, they can't be the number of any contact
+            self._scopes[owner] = (version, np.unique(values[valid]))
+
+    def refresh(self, dnc_collection: Collection, version_collection: Collection, owners: List[str]):
+        versions = {doc["_id"]: doc["version"] for doc in version_collection.find({"_id": {"$in": owners}})}
+        for owner in self._stale_owners(owners, versions):
+            numbers = [doc["phone_number"] for doc in
+                       dnc_collection.find({"created_by": owner}, {"_id": 0, "phone_number": 1})]
+            self._store(owner, versions.get(owner, 0), numbers)
+
+    async def refresh_async(self, dnc_collection, version_collection, owners: List[str]):
+        """Motor counterpart of `refresh` for the API process."""
+        versions = {doc["_id"]: doc["version"] async for doc in version_collection.find({"_id": {"$in": owners}})}
+        for owner in self._stale_owners(owners, versions):
+            numbers = [doc["phone_number"] async for doc in
+                       dnc_collection.find({"created_by": owner}, {"_id": 0, "phone_number": 1})]
+            self._store(owner, versions.get(owner, 0), numbers)
+
+    def contains(self, owners: List[str], phone_numbers: Iterable[str]) -> np.ndarray:
+        """Vectorised membership: a boolean mask telling which numbers are on any of the owners' lists."""
+        values, valid = phone_numbers_to_int(phone_numbers)
+        mask = np.zeros(len(values), dtype=bool)
+
+        with self._lock:
+            scopes = [self._scopes[owner][1] for owner in owners if owner in self._scopes]
+
+        for numbers in scopes:
+            if not len(numbers):
+                continue
+            positions = np.minimum(np.searchsorted(numbers, values), len(numbers) - 1)
+            mask |= numbers[positions] == values
+
+        # Malformed numbers never match
+        return mask & valid
+
+    def exclude(self, owners: List[str], contacts: List[dict]) -> List[dict]:
+        """Drops contacts whose phone_number is on any of the owners' DNC lists."""
+        if not contacts:
+            return contacts
+        mask = self.contains(owners, [contact["phone_number"] for contact in contacts])
+        return [contact for contact, is_dnc in zip(contacts, mask) if not is_dnc]
+
+
+dnc_index = DNCIndex()
+
+
+async def bump_dnc_version(version_collection, owners: Iterable[str]):
+    """Invalidates the cached DNC scopes of `owners` in every process."""
+    for owner in set(owners):
+        await version_collection.update_one({"_id": owner}, {"$inc": {"version": 1}}, upsert=True)
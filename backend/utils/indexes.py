@@ -0,0 +1,238 @@
+"""Declarative registry of every MongoDB index the API, the worker and the webhooks rely on.
+
+Each spec lists the queries it serves, so `python -m utils.indexes list` documents why an index exists and
+`python -m utils.indexes diff` shows what the live database is missing. The API diffs and builds missing
+indexes in the background on startup (`sync_indexes`); the worker uses `ensure_indexes` for the collections
+it owns.
+"""
+import argparse
+import logging
+from dataclasses import dataclass, field
+from typing import List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.collection import Collection
+
+logger = logging.getLogger("utilities")
+
+DATABASE_NAME = "fastapi"
+ID_INDEX = [("_id", ASCENDING)]
+
+
+@dataclass
+class IndexSpec:
+    collection: str
+    keys: List[tuple[str, int]]
+    serves: List[str]  # Queries (module: function) that rely on the index
+    unique: bool = False
+    partial_filter: dict | None = field(default=None)
+
+    @property
+    def name(self) -> str:
+        # Same naming scheme as MongoDB's default index names
+        return "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+    def model(self) -> IndexModel:
+        options = {"unique": True} if self.unique else {}
+        if self.partial_filter:
+            options["partialFilterExpression"] = self.partial_filter
+        return IndexModel(self.keys, name=self.name, background=True, **options)
+
+    def matches(self, info: dict) -> bool:
+        return [(key, int(direction)) for key, direction in info["key"]] == self.keys
+
+    def conflicts(self, info: dict) -> bool:
+        """Same keys but different options, which MongoDB refuses to build next to the live index."""
+        return (bool(info.get("unique")) != self.unique
+                or info.get("partialFilterExpression") != self.partial_filter)
+
+
+INDEXES: List[IndexSpec] = [
+    # users
+    IndexSpec("users", [("username", ASCENDING)], ["routers.utilities: get_user"], unique=True),
+    IndexSpec("users", [("email", ASCENDING)], ["routers.utilities: get_user", "main: verify_user_email"],
+              unique=True),
+    IndexSpec("users", [("created_by", ASCENDING), ("_id", ASCENDING)],
+              ["routers.admin: get_users (keyset pages)", "routers.admin_reports"]),
+
+    # dnc
+    IndexSpec("dnc", [("phone_number", ASCENDING), ("created_by", ASCENDING)],
+              ["routers.dnc: add_to_dnc, update_dnc, import_dnc_contacts", "routers.dnc: check_dnc_numbers"],
+              unique=True),
+    IndexSpec("dnc", [("created_by", ASCENDING), ("phone_number", ASCENDING)],
+              ["utils.dnc_index: DNCIndex.refresh (covered)", "routers.user_reports: totals"]),
+    IndexSpec("dnc", [("created_by", ASCENDING), ("_id", ASCENDING)], ["routers.dnc: get_dnc_entries (keyset pages)"]),
+    IndexSpec("dnc versions", ID_INDEX, ["utils.dnc_index: DNCIndex.refresh, bump_dnc_version"]),
+
+    # contact
+    IndexSpec("contact", [("phone_number", ASCENDING), ("created_by", ASCENDING), ("group", ASCENDING)],
+              ["routers.contact: add_contact (duplicates)", "main: receive_replies (contact by phone)"],
+              unique=True),
+    IndexSpec("contact", [("groups", ASCENDING)], ["routers.contact: group lookups"]),
+    IndexSpec("contact", [("created_by", ASCENDING), ("groups", ASCENDING), ("_id", ASCENDING)],
+              ["utils.audience: build_audiences",
+               "utils.contact_groups: remove_group (per _id range), refresh_groups",
+               "utilities: retrieve_contacts"]),
+    IndexSpec("contact", [("created_by", ASCENDING), ("_id", ASCENDING)],
+              ["routers.contact: list_contacts (keyset pages)"]),
+
+    # sms campaign
+    IndexSpec("sms campaign", [("name", ASCENDING)], ["routers.campaign: create_sms_campaign"], unique=True),
+    IndexSpec("sms campaign", [("created_by", ASCENDING)],
+              ["routers.campaign: list_sms_campaigns", "routers.user_reports"]),
+    IndexSpec("sms campaign", [("sender_msisdn", ASCENDING)], ["main: receive_replies (STOP opt-outs)"]),
+
+    # sms queue
+    IndexSpec("sms queue", [("created_by", ASCENDING), ("_id", ASCENDING)],
+              ["routers.campaign: list_sms_campaign_queue (keyset pages)", "utilities: retrieve_queues"]),
+    IndexSpec("sms queue", [("status", ASCENDING), ("schedule_time", ASCENDING)],
+              ["scheduler: claim_due_entry"]),
+
+    # campaign chat
+    IndexSpec("campaign chat", [("campaign_id", ASCENDING), ("created_by", ASCENDING)],
+              ["routers.campaign: add_to_dnc_list_from_chat"]),
+
+    # messages
+    IndexSpec("messages", [("message_id", ASCENDING)], ["utils.receipt_buffer: ReceiptBuffer (delivery receipts)"],
+              unique=True, partial_filter={"message_id": {"$type": "string"}}),
+    IndexSpec("messages", [("campaigns", ASCENDING), ("sent_at", ASCENDING)],
+              ["routers.campaign: get_chat (keyset pages)", "utils.campaign_stats: rebuild_stats"]),
+    IndexSpec("messages", [("users", ASCENDING), ("sent_at", DESCENDING)],
+              ["routers.user_reports: message totals, past-12-months", "routers.admin_reports: messages summary"]),
+    IndexSpec("messages", [("sent_at", ASCENDING)], ["routers.campaign: get_message_report"]),
+
+    # reply routes
+    IndexSpec("reply routes", [("our_number", ASCENDING), ("phone_number", ASCENDING)],
+              ["utils.reply_routes: lookup_route (main: receive_replies)", "utils.reply_routes: record_routes",
+               "utils.reply_routes: rebuild_routes ($merge)"], unique=True),
+
+    # stream events
+    IndexSpec("stream events", [("user_id", ASCENDING), ("event_id", ASCENDING)],
+              ["utils.stream_events: StreamEventLog.replay, append (trim)"], unique=True),
+    IndexSpec("stream counters", ID_INDEX, ["utils.stream_events: StreamEventLog.append"]),
+
+    # campaign audience
+    IndexSpec("campaign audience", [("queue_id", ASCENDING), ("seq", ASCENDING)],
+              ["utils.audience: build_audiences ($merge, sizes), fetch_audience_batch",
+               "routers.campaign: delete_campaign_queues"], unique=True),
+
+    # campaign stats
+    IndexSpec("campaign stats", [("created_by", ASCENDING)], ["routers.campaign: get_campaign_chats"]),
+
+    # conversations
+    IndexSpec("conversations", [("campaign_id", ASCENDING), ("our_number", ASCENDING), ("contact_phone", ASCENDING)],
+              ["utils.conversations: record_sent_batch, record_outgoing, record_incoming",
+               "utils.conversations: rebuild_conversations ($merge)"], unique=True),
+    IndexSpec("conversations", [("campaign_id", ASCENDING), ("created_by", ASCENDING), ("last_reply_at", DESCENDING),
+                                ("_id", DESCENDING)],
+              ["routers.campaign: get_chat_contacts (keyset pages)", "utils.conversations: mark_read"]),
+
+    # contact groups
+    IndexSpec("contact groups", [("created_by", ASCENDING), ("name", ASCENDING)],
+              ["routers.contact: list_groups, import_contacts", "routers.campaign: create_sms_campaign",
+               "utils.contact_groups: record_contact_changes, refresh_groups, estimate_audience"], unique=True),
+
+    # import jobs
+    IndexSpec("import jobs", ID_INDEX, ["routers.contact: get_import_job", "utils.contact_import: run_import"]),
+    IndexSpec("import jobs", [("created_by", ASCENDING), ("group", ASCENDING), ("status", ASCENDING)],
+              ["routers.contact: import_contacts (group of a running import)"]),
+
+    # send ledger
+    IndexSpec("send ledger", [("queue_id", ASCENDING), ("recipient", ASCENDING)],
+              ["utils.send_ledger: claim_recipients, record_send"], unique=True),
+]
+
+
+def specs_for(collection_name: str) -> List[IndexSpec]:
+    return [spec for spec in INDEXES if spec.collection == collection_name]
+
+
+def diff_indexes(specs: List[IndexSpec], live_indexes: dict) -> tuple[List[IndexSpec], List[IndexSpec]]:
+    """Splits specs into those missing from `live_indexes` (index_information()) and those in conflict."""
+    missing, conflicting = [], []
+    for spec in specs:
+        if spec.keys == ID_INDEX:
+            continue  # Always there, listed only to document what it serves
+        live = next((info for info in live_indexes.values() if spec.matches(info)), None)
+        if live is None:
+            missing.append(spec)
+        elif spec.conflicts(live):
+            conflicting.append(spec)
+    return missing, conflicting
+
+
+def ensure_indexes(collection: Collection):
+    """Builds the registered indexes missing from a (pymongo) collection."""
+    missing, conflicting = diff_indexes(specs_for(collection.name), collection.index_information())
+    for spec in conflicting:
+        logger.error(f"Index {spec.name} on {spec.collection} exists with different options, not rebuilding")
+    if missing:
+        collection.create_indexes([spec.model() for spec in missing])
+
+
+async def ensure_indexes_async(collection) -> List[IndexSpec]:
+    """Motor counterpart of `ensure_indexes`. Returns the indexes it built."""
+    built = []
+    missing, conflicting = diff_indexes(specs_for(collection.name), await collection.index_information())
+    for spec in conflicting:
+        logger.error(f"Index {spec.name} on {spec.collection} exists with different options, not rebuilding")
+
+    for spec in missing:
+        try:
+            await collection.create_indexes([spec.model()])
+            built.append(spec)
+            logger.info(f"Built index {spec.name} on {spec.collection}")
+        except Exception as error:
+            # e.g. existing duplicates for a unique index; keep building the others
+            logger.error(f"Failed to build index {spec.name} on {spec.collection}: {error}")
+    return built
+
+
+async def sync_indexes(database) -> List[IndexSpec]:
+    """Builds the missing indexes of every registered collection (Motor). Returns the indexes it built."""
+    built = []
+    for collection_name in dict.fromkeys(spec.collection for spec in INDEXES):
+        built += await ensure_indexes_async(database.get_collection(collection_name))
+    return built
+
+
+def print_registry():
+    for spec in INDEXES:
+        options = ", ".join(option for option, enabled in
+                            [("unique", spec.unique), ("partial", spec.partial_filter)] if enabled)
+        print(f"{spec.collection}.{spec.name}" + (f" ({options})" if options else ""))
+        for query in spec.serves:
+            print(f"    {query}")
+
+
+def print_diff(database, build: bool = False):
+    for collection_name in dict.fromkeys(spec.collection for spec in INDEXES):
+        collection = database.get_collection(collection_name)
+        live_indexes = collection.index_information()
+        missing, conflicting = diff_indexes(specs_for(collection_name), live_indexes)
+        unregistered = [name for name, info in live_indexes.items() if name != "_id_"
+                        and not any(spec.matches(info) for spec in specs_for(collection_name))]
+
+        for spec in missing:
+            print(f"missing     {collection_name}.{spec.name}")
+        for spec in conflicting:
+            print(f"conflicting {collection_name}.{spec.name}")
+        for name in unregistered:
+            print(f"unregistered {collection_name}.{name}")
+
+        if build and missing:
+            collection.create_indexes([spec.model() for spec in missing])
+            print(f"built {len(missing)} index(es) on {collection_name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index registry: list, diff or build the registered indexes")
+    parser.add_argument("command", choices=["list", "diff", "build"])
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print_registry()
+    else:
+        from environment import MONGODB_URL
+
+        print_diff(MongoClient(MONGODB_URL).get_database(DATABASE_NAME), build=args.command == "build")
@@ -0,0 +1,107 @@
+import re
+from functools import lru_cache
+from math import ceil
+from typing import List, NamedTuple
+
+from models.sms_models import MessageTextType
+from utilities import validate_message, ACCEPTED_MSG_VARS
+
+# GSM 03.38 basic character set (1 septet each) and its extension table (escape + char, 2 septets each)
+GSM7_BASIC = set("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+                 "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+GSM7_SINGLE_SEGMENT, GSM7_MULTI_SEGMENT = 160, 153  # Septets per segment
+UCS2_SINGLE_SEGMENT, UCS2_MULTI_SEGMENT = 70, 67  # UTF-16 code units per segment
+
+
+class TextStats(NamedTuple):
+    is_gsm7: bool
+    septets: int
+    utf16_units: int
+
+    def __add__(self, other: "TextStats") -> "TextStats":
+        return TextStats(self.is_gsm7 and other.is_gsm7, self.septets + other.septets,
+                         self.utf16_units + other.utf16_units)
+
+
+class RenderedMessage(NamedTuple):
+    text: str
+    type: MessageTextType
+    segments: int
+
+
+def text_stats(text: str) -> TextStats:
+    septets = 0
+    is_gsm7 = True
+    for char in text:
+        if char in GSM7_BASIC:
+            septets += 1
+        elif char in GSM7_EXTENDED:
+            septets += 2
+        else:
+            is_gsm7 = False
+    return TextStats(is_gsm7, septets, len(text.encode("utf-16-le")) // 2)
+
+
+def count_segments(stats: TextStats) -> tuple[MessageTextType, int]:
+    """Vonage message type for the text and how many SMS segments it is billed as."""
+    if stats.is_gsm7:
+        message_type, length = MessageTextType.text, stats.septets
+        single, multi = GSM7_SINGLE_SEGMENT, GSM7_MULTI_SEGMENT
+    else:
+        message_type, length = MessageTextType.unicode, stats.utf16_units
+        single, multi = UCS2_SINGLE_SEGMENT, UCS2_MULTI_SEGMENT
+
+    if length <= single:
+        return message_type, 1
+    return message_type, ceil(length / multi)
+
+
+def analyse_text(text: str) -> tuple[MessageTextType, int]:
+    return count_segments(text_stats(text))
+
+
+class MessageTemplate:
+    """A campaign message parsed once into literal and placeholder segments.
+
+    Literal segments are measured at compile time, so rendering a recipient only measures the
+    substituted values to work out the encoding and segment count.
+    """
+
+    def __init__(self, message: str):
+        validate_message(message)
+        self.parts: List[tuple[bool, str]] = []  # (is_placeholder, literal text or contact field)
+        literal_stats = TextStats(True, 0, 0)
+
+        for part in re.split(r'({.*?})', message):
+            if not part:
+                continue
+            if part in ACCEPTED_MSG_VARS:
+                self.parts.append((True, part[1:-1]))
+            else:
+                self.parts.append((False, part))
+                literal_stats += text_stats(part)
+
+        self.literal_stats = literal_stats
+
+    def render(self, contact: dict) -> RenderedMessage:
+        chunks = []
+        stats = self.literal_stats
+        for is_placeholder, value in self.parts:
+            if is_placeholder:
+                value = str(contact.get(value, ""))
+                stats += text_stats(value)
+            chunks.append(value)
+
+        message_type, segments = count_segments(stats)
+        return RenderedMessage("".join(chunks), message_type, segments)
+
+    def render_batch(self, contacts: List[dict]) -> List[RenderedMessage]:
+        return [self.render(contact) for contact in contacts]
+
+
+@lru_cache(maxsize=256)
+def compile_template(message: str) -> MessageTemplate:
+    """Compiled templates are cached per process, so every batch task of a campaign reuses the same one."""
+    return MessageTemplate(message)
@@ -0,0 +1,106 @@
+import logging
+import os
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess, \
+    start_http_server
+
+logger = logging.getLogger("utilities")
+
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "bulk_sms_rate_limit_wait_seconds",
+    "Time spent waiting for send tokens",
+    ["scope"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RATE_LIMIT_ACQUIRED = Counter(
+    "bulk_sms_rate_limit_acquired_total",
+    "Send tokens granted, by whether the caller had to wait",
+    ["scope", "outcome"]
+)
+RATE_LIMIT_DENIED = Counter(
+    "bulk_sms_rate_limit_denied_total",
+    "Send token requests denied because the wait exceeded the caller's limit",
+    ["scope"]
+)
+VONAGE_SEND_SECONDS = Histogram(
+    "bulk_sms_vonage_send_seconds",
+    "Latency of Vonage /sms/json requests",
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+SMS_SEND_OUTCOMES = Counter(
+    "bulk_sms_send_outcomes_total",
+    "Vonage send responses by status code (-1 when the request itself failed)",
+    ["status"]
+)
+CAMPAIGN_MESSAGES = Counter(
+    "bulk_sms_campaign_messages_total",
+    "Campaign messages sent or failed, by campaign and sender number",
+    ["campaign_id", "sender", "outcome"]
+)
+BATCH_DURATION_SECONDS = Histogram(
+    "bulk_sms_batch_duration_seconds",
+    "Time to send and checkpoint one campaign batch",
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+)
+DNC_FILTER_SECONDS = Histogram(
+    "bulk_sms_dnc_filter_seconds",
+    "Time to refresh the DNC index and filter a page of recipients",
+    ["process"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+WEBHOOK_SECONDS = Histogram(
+    "bulk_sms_webhook_seconds",
+    "Processing time of Vonage webhooks",
+    ["path"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+WEBSOCKET_BROADCAST_CONNECTIONS = Histogram(
+    "bulk_sms_websocket_broadcast_connections",
+    "Connections a WebSocket broadcast was delivered to",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100)
+)
+WEBSOCKET_BROADCAST_SECONDS = Histogram(
+    "bulk_sms_websocket_broadcast_seconds",
+    "Time to fan a WebSocket broadcast out to every connection",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+)
+WEBSOCKET_DROPPED_CLIENTS = Counter(
+    "bulk_sms_websocket_dropped_clients_total",
+    "WebSocket clients disconnected because their send queue was full"
+)
+RECEIPTS_FLUSHED = Counter(
+    "bulk_sms_receipts_flushed_total",
+    "Delivery receipt status updates written to messages"
+)
+RECEIPTS_REJECTED = Counter(
+    "bulk_sms_receipts_rejected_total",
+    "Delivery receipts turned away because the ingestion buffer was full"
+)
+RECEIPT_FLUSH_SECONDS = Histogram(
+    "bulk_sms_receipt_flush_seconds",
+    "Time of one delivery receipt bulk write",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose; with PROMETHEUS_MULTIPROC_DIR set it aggregates every (e.g. Celery prefork) process."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def latest_metrics() -> bytes:
+    return generate_latest(metrics_registry())
+
+
+def start_metrics_server(port: int) -> bool:
+    """Serves the metrics on `port`; returns False, with a warning, when another process already holds it."""
+    try:
+        start_http_server(port, registry=metrics_registry())
+    except OSError as error:
+        logger.warning(f"Metrics server not started on port {port}: {error}")
+        return False
+    return True
@@ -0,0 +1,85 @@
+"""Keyset pagination shared by the list endpoints.
+
+Pages are read with a range query on the sort keys (always ending in `_id`, so every position is unique)
+instead of `skip`, so any page costs one indexed seek whatever its depth. The position is handed to the
+client as an opaque cursor; the next page is requested with `?cursor=...`, and the `X-Next-Cursor` response
+header carries the cursor of the following page (absent on the last page).
+"""
+import base64
+from dataclasses import dataclass
+from typing import Annotated, Any, List
+
+from bson import json_util
+from fastapi import HTTPException, Query, Response, status
+
+from environment import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SortSpec = List[tuple[str, int]]
+
+
+@dataclass
+class PageParams:
+    limit: int
+    cursor: str | None = None
+
+
+def page_params(limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                cursor: str | None = None) -> PageParams:
+    """FastAPI dependency for the `limit` and `cursor` query parameters."""
+    return PageParams(limit=limit, cursor=cursor)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        # Tampered cursors fail in many ways: bad base64 or JSON, malformed extended JSON ($oid, $date, ...)
+        values = None
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def field_value(document: dict, field: str) -> Any:
+    for key in field.split("."):
+        document = (document or {}).get(key)
+    return document
+
+
+def keyset_filter(sort: SortSpec, values: List[Any]) -> dict:
+    """Documents after `values` in `sort` order: (a > x) or (a == x and b > y) or ..."""
+    clauses = []
+    for index, (field, direction) in enumerate(sort):
+        clause = {sort_field: value for (sort_field, _), value in zip(sort[:index], values)}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[index]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def paginate(collection, query: dict, params: PageParams, sort: SortSpec | None = None,
+                   projection: dict | None = None) -> tuple[List[dict], str | None]:
+    """Reads one page of `query` in `sort` order (Motor). Returns the documents and the next page's cursor.
+
+    `sort` must end with `_id` and `projection` must keep the sort fields.
+    """
+    sort = sort or [("_id", 1)]
+    if params.cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(params.cursor, sort))]}
+
+    documents = await collection.find(query, projection).sort(sort).limit(params.limit + 1).to_list(None)
+    if len(documents) <= params.limit:
+        return documents, None
+
+    documents = documents[:params.limit]
+    return documents, encode_cursor([field_value(documents[-1], field) for field, _ in sort])
+
+
+def set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
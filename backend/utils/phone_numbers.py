@@ -0,0 +1,89 @@
+"""Canonical phone numbers: E.164 digits without the leading "+" (e.g. "12015550123").
+
+Every number entering the system (contact and DNC writes and imports, the webhooks, the worker's recipients) goes
+through `normalize_phone_number` or its batch form, so a number is stored and matched in a single format whatever
+way it was typed. Bare digits are country-code digits, the format numbers are stored in and Vonage sends; a "+"
+or "00" prefix is accepted too. Input typed by users (`user_input`: API writes and CSV imports) may also be a
+national number of PHONE_DEFAULT_REGION, which is tried only when the international reading isn't a number.
+Numbers are checked with `phonenumbers` (PHONE_VALIDATION "valid" checks the number is assigned, "possible" only
+its length). Results are memoised, since imports and campaigns see the same numbers over and over.
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import phonenumbers
+from phonenumbers import NumberParseException, PhoneNumberFormat
+
+from environment import PHONE_DEFAULT_REGION, PHONE_VALIDATION, PHONE_CACHE_SIZE
+
+SEPARATORS = re.compile(r"[\s\-().]")
+
+
+def _is_acceptable(number: phonenumbers.PhoneNumber) -> bool:
+    if PHONE_VALIDATION == "possible":
+        return phonenumbers.is_possible_number(number)
+    return phonenumbers.is_valid_number(number)
+
+
+def _parse(text: str) -> str | None:
+    try:
+        number = phonenumbers.parse(text, PHONE_DEFAULT_REGION)
+    except NumberParseException:
+        return None
+    return phonenumbers.format_number(number, PhoneNumberFormat.E164)[1:] if _is_acceptable(number) else None
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _normalize_text(text: str, user_input: bool) -> str | None:
+    text = SEPARATORS.sub("", text)
+    if text.startswith("00"):
+        text = "+" + text[2:]
+    if text.startswith("+"):
+        return _parse(text)
+    # Stored and webhook numbers are always international; only a user's national number falls back to the region
+    return _parse("+" + text) or (_parse(text) if user_input else None)
+
+
+def normalize_phone_number(value: Any, user_input: bool = False) -> str | None:
+    """Canonical form of `value` (str, int or a float read from a spreadsheet), None if it isn't a valid number."""
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value) or not float(value).is_integer():
+            return None
+        value = int(value)
+    if isinstance(value, (int, np.integer)):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return _normalize_text(value.strip(), user_input)
+
+
+def normalize_phone_numbers(values: pd.Series | np.ndarray | list, user_input: bool = False) -> pd.Series | np.ndarray:
+    """Batch form of `normalize_phone_number`; invalid numbers become None.
+
+    Returns a Series (same index) for a Series and an object array otherwise. Each distinct value is parsed
+    once, then the results are scattered back with a single take.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(np.asarray(values, dtype=object))
+    if pd.api.types.infer_dtype(series, skipna=True) == "string":
+        # Strip separators column-wise first, so differently typed copies of a number share a parse
+        series = series.str.replace(SEPARATORS, "", regex=True)
+
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([normalize_phone_number(value, user_input) for value in uniques] + [None], dtype=object)
+    result = normalized[codes]  # Missing values have code -1, which takes the trailing None
+
+    if isinstance(values, pd.Series):
+        return pd.Series(result, index=values.index, name=values.name)
+    return result
+
+
+def canonical_phone_number(value: Any) -> str:
+    """Pydantic validator for `E164Number`, the numbers of API requests."""
+    normalized = normalize_phone_number(value, user_input=True)
+    if normalized is None:
+        raise ValueError(f"{value!r} is not a valid phone number")
+    return normalized
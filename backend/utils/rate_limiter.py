@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+from redis import asyncio as aioredis
+
+from environment import REDIS_URL, RATE_LIMIT_STORE, SENDER_RATE_LIMIT, ACCOUNT_RATE_LIMIT, VONAGE_API_KEY
+from utils.metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_ACQUIRED, RATE_LIMIT_DENIED
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key: str, wait: float):
+        super().__init__(f"Rate limit for '{key}' would require waiting {wait:.2f}s")
+        self.key = key
+        self.wait = wait
+
+
+class TokenBucketStore:
+    """Holds token bucket state. `take` reserves tokens and returns (granted, seconds to wait).
+
+    Buckets may go negative: a granted caller sleeps for the returned wait instead of polling,
+    which keeps the long-run rate exact however many workers share the bucket.
+    """
+
+    async def take(self, key: str, rate: float, capacity: float, tokens: float = 1,
+                   max_wait: float | None = None) -> tuple[bool, float]:
+        raise NotImplementedError
+
+    async def refund(self, key: str, rate: float, capacity: float, tokens: float = 1):
+        await self.take(key, rate, capacity, -tokens)
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """Single-process store, for tests and for running without Redis."""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    async def take(self, key, rate, capacity, tokens=1, max_wait=None):
+        with self._lock:
+            now = time.monotonic()
+            available, updated_at = self._buckets.get(key, (capacity, now))
+            available = min(capacity, available + (now - updated_at) * rate)
+            wait = max(0.0, (tokens - available) / rate)
+
+            granted = max_wait is None or wait <= max_wait
+            if granted:
+                available -= tokens
+            self._buckets[key] = (min(capacity, available), now)
+
+        return granted, wait
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Store shared by every API process and Celery worker, updated atomically by a Lua script."""
+
+    TAKE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local requested = tonumber(ARGV[3])
+    local max_wait = tonumber(ARGV[4])
+
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local wait = math.max(0, (requested - tokens) / rate)
+    local granted = 0
+    if max_wait < 0 or wait <= max_wait then
+        tokens = tokens - requested
+        granted = 1
+    end
+
+    redis.call('HSET', KEYS[1], 'tokens', math.min(capacity, tokens), 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+    return {granted, tostring(wait)}
+    """
+
+    def __init__(self, url: str = REDIS_URL):
+        self.redis = aioredis.from_url(url)
+        self._take = self.redis.register_script(self.TAKE_SCRIPT)
+
+    async def take(self, key, rate, capacity, tokens=1, max_wait=None):
+        granted, wait = await self._take(keys=[f"ratelimit:{key}"],
+                                         args=[rate, capacity, tokens, -1 if max_wait is None else max_wait])
+        return bool(granted), float(wait)
+
+
+class RateLimiter:
+    """Token buckets keyed by sender number and by Vonage API account."""
+
+    def __init__(self, store: TokenBucketStore, sender_rate: float = SENDER_RATE_LIMIT,
+                 account_rate: float = ACCOUNT_RATE_LIMIT, account: str | None = VONAGE_API_KEY):
+        self.store = store
+        self.account = account or "default"
+        # Allow a one-second burst on each bucket
+        self.limits = {
+            "sender": (sender_rate, max(1.0, sender_rate)),
+            "account": (account_rate, max(1.0, account_rate))
+        }
+
+    def _buckets(self, sender: str):
+        return [("sender", f"sender:{sender}"), ("account", f"account:{self.account}")]
+
+    async def acquire(self, sender: str, max_wait: float | None = None):
+        """Waits until a message from `sender` may be sent.
+
+        Raises RateLimitExceeded, without consuming any tokens, if that would take longer than `max_wait`.
+        """
+        reserved = []
+        longest_wait = 0.0
+        for scope, key in self._buckets(sender):
+            rate, capacity = self.limits[scope]
+            granted, wait = await self.store.take(key, rate, capacity, max_wait=max_wait)
+
+            if not granted:
+                RATE_LIMIT_DENIED.labels(scope=scope).inc()
+                for reserved_scope, reserved_key in reserved:
+                    await self.store.refund(reserved_key, *self.limits[reserved_scope])
+                raise RateLimitExceeded(key, wait)
+
+            reserved.append((scope, key))
+            RATE_LIMIT_ACQUIRED.labels(scope=scope, outcome="waited" if wait > 0 else "immediate").inc()
+            RATE_LIMIT_WAIT_SECONDS.labels(scope=scope).observe(wait)
+            longest_wait = max(longest_wait, wait)
+
+        if longest_wait > 0:
+            await asyncio.sleep(longest_wait)
+
+
+_rate_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        store = RedisTokenBucketStore() if RATE_LIMIT_STORE == "redis" else InMemoryTokenBucketStore()
+        _rate_limiter = RateLimiter(store)
+    return _rate_limiter
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from models.sms_models import MessageType
+from utils.campaign_stats import record_status_changes
+from utils.metrics import RECEIPTS_FLUSHED, RECEIPTS_REJECTED, RECEIPT_FLUSH_SECONDS
+
+logger = logging.getLogger("utilities")
+
+FLUSH_RETRY_DELAY = 0.5  # Seconds between attempts when Mongo rejects a flush
+MAX_FLUSH_ATTEMPTS = 5
+
+
+class ReceiptBufferFull(Exception):
+    pass
+
+
+class ReceiptBuffer:
+    """Coalesces Vonage delivery receipts and writes them to `messages` in unordered bulk writes.
+
+    The webhook only enqueues the receipt, so Vonage is acknowledged right away. A single flusher drains up to
+    `batch_size` receipts at a time, waiting at most `flush_interval` seconds for a batch to fill; receipts for
+    the same message collapse into its latest status. The queue is bounded: when Mongo falls behind and it
+    stays full for `enqueue_timeout` seconds, `add` raises ReceiptBufferFull so the webhook can answer with an
+    error and Vonage redelivers the receipt later.
+
+    With `stats_collection`, each flush also moves the campaign counters of the messages whose status changed.
+    """
+
+    def __init__(self, messages_collection, batch_size: int = 1000, flush_interval: float = 0.05,
+                 max_pending: int = 50000, enqueue_timeout: float = 1.0, stats_collection=None):
+        self.collection = messages_collection
+        self.stats_collection = stats_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_pending)
+        self._flusher: asyncio.Task | None = None
+
+    def start(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued, then stops the flusher."""
+        if self._flusher:
+            await self._queue.join()
+            self._flusher.cancel()
+            self._flusher = None
+
+    async def add(self, receipt: dict):
+        try:
+            self._queue.put_nowait(receipt)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(receipt), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                RECEIPTS_REJECTED.inc()
+                raise ReceiptBufferFull()
+
+    async def _next_batch(self) -> list[dict]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            except Exception:
+                # One bad batch must not stop receipt ingestion
+                logger.exception(f"Receipt flush of {len(batch)} receipts failed")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _previous_statuses(self, message_ids: list[str]) -> list[dict]:
+        return await self.collection.find(
+            {"message_id": {"$in": message_ids}, "type": MessageType.sent},
+            {"_id": 0, "message_id": 1, "status": 1, "campaigns": 1}
+        ).to_list(None)
+
+    async def _flush(self, batch: list[dict]):
+        # Later receipts of the same message (e.g. accepted -> delivered) win
+        statuses = {}
+        for receipt in batch:
+            if receipt.get("messageId"):
+                statuses[receipt["messageId"]] = receipt.get("status")
+
+        if not statuses:
+            return
+
+        operations = [UpdateOne({"message_id": message_id}, {"$set": {"status": message_status}})
+                      for message_id, message_status in statuses.items()]
+
+        previous = None
+        for attempt in range(1, MAX_FLUSH_ATTEMPTS + 1):
+            try:
+                with RECEIPT_FLUSH_SECONDS.time():
+                    if previous is None and self.stats_collection is not None:
+                        # Read once, before the first write: a retry would see the statuses already updated
+                        previous = await self._previous_statuses(list(statuses))
+                    await self.collection.bulk_write(operations, ordered=False)
+                break
+            except PyMongoError as error:
+                logger.error(f"Receipt flush of {len(operations)} updates failed (attempt {attempt}): {error}")
+                # Holding the batch keeps the queue full, which is what pushes back on the webhook
+                await asyncio.sleep(FLUSH_RETRY_DELAY * attempt)
+        else:
+            logger.error(f"Dropped {len(operations)} delivery receipts after {MAX_FLUSH_ATTEMPTS} attempts")
+            return
+
+        RECEIPTS_FLUSHED.inc(len(operations))
+        if previous:
+            await self._record_stats(previous, statuses)
+
+    async def _record_stats(self, previous: list[dict], statuses: dict[str, str]):
+        # Retried on its own with the statuses read before the receipts were written
+        for attempt in range(1, MAX_FLUSH_ATTEMPTS + 1):
+            try:
+                await record_status_changes(self.stats_collection, previous, statuses)
+                return
+            except PyMongoError as error:
+                logger.error(f"Campaign counter update for {len(previous)} receipts failed (attempt {attempt}): "
+                             f"{error}")
+                await asyncio.sleep(FLUSH_RETRY_DELAY * attempt)
+
+        logger.error(f"Dropped campaign counter updates of {len(previous)} receipts after {MAX_FLUSH_ATTEMPTS} "
+                     f"attempts")
@@ -0,0 +1,127 @@
+"""Routing table for inbound replies: (our number, contact phone) -> campaigns and users that messaged it.
+
+The worker upserts a route for every recipient of a batch, so an inbound SMS is attributed to the tenants that
+actually texted that phone from that number with a single point lookup on the unique
+(our_number, phone_number) index. Lookups go through a per-process LRU with a TTL.
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+ROUTE_PROJECTION = {"_id": 0, "campaigns": 1, "users": 1, "opt_out_users": 1}
+
+
+class RouteCache:
+    """Thread-safe LRU of route lookups (misses included) that expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str]) -> tuple[bool, dict | None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, route = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, route
+
+    def set(self, key: tuple[str, str], route: dict | None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, route)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: tuple[str, str]):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def record_routes(route_collection: Collection, our_number: str, campaign_id: str, user_id: str,
+                  phone_numbers: List[str], include_opt_out: bool):
+    """Adds the campaign and its owner to the route of every recipient, in one unordered bulk write."""
+    if not phone_numbers:
+        return
+
+    add_to_set = {"campaigns": str(campaign_id), "users": str(user_id)}
+    if include_opt_out:
+        add_to_set["opt_out_users"] = str(user_id)
+    now = datetime.now(timezone.utc)
+
+    route_collection.bulk_write([
+        UpdateOne({"our_number": our_number, "phone_number": phone_number},
+                  {"$addToSet": add_to_set, "$set": {"updated_at": now}}, upsert=True)
+        for phone_number in phone_numbers
+    ], ordered=False)
+
+
+async def lookup_route(route_collection, cache: RouteCache, our_number: str, phone_number: str) -> dict | None:
+    """Campaign IDs, user IDs and opt-out user IDs for replies from `phone_number` to `our_number`."""
+    key = (our_number, phone_number)
+    found, route = cache.get(key)
+    if not found:
+        route = await route_collection.find_one({"our_number": our_number, "phone_number": phone_number},
+                                                ROUTE_PROJECTION)
+        cache.set(key, route)
+    return route
+
+
+def rebuild_routes(database):
+    """Backfills the table from sent messages, for campaigns that went out before routes were recorded."""
+    database["messages"].aggregate([
+        {"$match": {"type": "sent"}},
+        {"$unwind": "$campaigns"},
+        {"$group": {"_id": {"our_number": "$sender_did", "phone_number": "$recipient_did"},
+                    "campaigns": {"$addToSet": "$campaigns"}}},
+        {"$lookup": {
+            "from": "sms campaign",
+            "let": {"campaign_ids": "$campaigns"},
+            "pipeline": [
+                {"$match": {"$expr": {"$in": [{"$toString": "$_id"}, "$$campaign_ids"]}}},
+                {"$project": {"created_by": 1, "include_opt_out": 1}}
+            ],
+            "as": "campaign_docs"
+        }},
+        {"$project": {
+            "_id": 0,
+            "our_number": "$_id.our_number",
+            "phone_number": "$_id.phone_number",
+            "campaigns": 1,
+            "users": {"$setUnion": [{"$map": {"input": "$campaign_docs", "in": {"$toString": "$$this.created_by"}}}]},
+            "opt_out_users": {"$setUnion": [{"$map": {
+                "input": {"$filter": {"input": "$campaign_docs", "cond": "$$this.include_opt_out"}},
+                "in": {"$toString": "$$this.created_by"}
+            }}]},
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {"into": "reply routes", "on": ["our_number", "phone_number"], "whenMatched": "merge",
+                    "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reply routing table maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from pymongo import MongoClient
+
+    from environment import MONGODB_URL
+    from utils.indexes import ensure_indexes
+
+    db = MongoClient(MONGODB_URL).get_database("fastapi")
+    ensure_indexes(db["reply routes"])  # $merge needs the unique (our_number, phone_number) index
+    rebuild_routes(db)
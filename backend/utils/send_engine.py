@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from environment import VONAGE_API_KEY, VONAGE_API_SECRET, VONAGE_REST_URL, SMS_SEND_CONCURRENCY
+from utils.metrics import VONAGE_SEND_SECONDS, SMS_SEND_OUTCOMES
+from utils.rate_limiter import RateLimiter
+
+# Target messages per second for each campaign throttle level (more throttling = slower)
+throttle_rate_map = {
+    "low": 30,
+    "medium": 20,
+    "high": 10
+}
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop, so the pooled client survives between batches and tasks.
+
+    Celery prefork children inherit module state from the parent, hence the pid check.
+    """
+    global _loop, _loop_pid, _http_client
+    if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+        _loop = asyncio.new_event_loop()
+        _loop_pid = os.getpid()
+        _http_client = None
+    return _loop
+
+
+def run_async(coro):
+    return get_event_loop().run_until_complete(coro)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=VONAGE_REST_URL,
+            limits=httpx.Limits(max_connections=SMS_SEND_CONCURRENCY,
+                                max_keepalive_connections=SMS_SEND_CONCURRENCY,
+                                keepalive_expiry=30),
+            timeout=httpx.Timeout(10.0)
+        )
+    return _http_client
+
+
+async def send_sms(params: dict) -> dict:
+    """Async equivalent of `vonage_client.sms.send_message`, returning the same response shape."""
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().post("/sms/json", data={
+            "api_key": VONAGE_API_KEY,
+            "api_secret": VONAGE_API_SECRET,
+            **params
+        })
+        result = response.json()
+    except (httpx.HTTPError, ValueError) as error:
+        result = {"message-count": "1", "messages": [{"status": "-1", "error-text": str(error)}]}
+
+    VONAGE_SEND_SECONDS.observe(time.perf_counter() - started)
+    SMS_SEND_OUTCOMES.labels(result["messages"][0].get("status", "-1")).inc()
+    return result
+
+
+class RatePacer:
+    """Spaces out request starts so that no more than `rate` messages go out per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SMSSendEngine:
+    """Keeps up to `concurrency` Vonage requests in flight while honouring a messages-per-second target.
+
+    When a shared `limiter` is given, every send also takes a token for its sender number and API account.
+    """
+
+    def __init__(self, rate: float, concurrency: int = SMS_SEND_CONCURRENCY, limiter: RateLimiter | None = None):
+        self.pacer = RatePacer(rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = limiter
+
+    async def send(self, params: dict, on_result: Callable[[dict, dict], Awaitable] | None = None) -> dict:
+        async with self.semaphore:
+            await self.pacer.wait()
+            if self.limiter:
+                await self.limiter.acquire(params["from"])
+            response = await send_sms(params)
+
+        # Checkpoint outside the semaphore so recording never holds a send slot
+        if on_result:
+            await on_result(params, response)
+        return response
+
+    async def send_batch(self, batch: list[dict],
+                         on_result: Callable[[dict, dict], Awaitable] | None = None) -> list[dict]:
+        """Sends every message of the batch concurrently; responses keep the order of `batch`.
+
+        `on_result(params, response)` is awaited as soon as each individual send completes.
+        """
+        return await asyncio.gather(*(self.send(params, on_result) for params in batch))
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from utils.indexes import ensure_indexes
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class LedgerStatus:
+    pending = "pending"  # Claimed, the send may or may not have reached Vonage
+    sent = "sent"
+    failed = "failed"
+
+
+def ensure_send_ledger_index(ledger_collection: Collection):
+    ensure_indexes(ledger_collection)
+
+
+def claim_recipients(ledger_collection: Collection, queue_id: str, contacts: List[dict]) -> List[dict]:
+    """Writes a pending ledger row per recipient before anything is sent and returns the contacts claimed.
+
+    Recipients that already have a row for this queue entry (sent, failed or claimed by a run that crashed
+    mid-batch) are skipped, so a resumed or redelivered batch never messages anyone twice.
+    """
+    if not contacts:
+        return []
+
+    now = datetime.now(timezone.utc)
+    rows = [{"queue_id": queue_id, "recipient": contact["phone_number"], "status": LedgerStatus.pending,
+             "claimed_at": now} for contact in contacts]
+
+    try:
+        ledger_collection.insert_many(rows, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in write_errors):
+            raise
+        already_claimed = {error["index"] for error in write_errors}
+        return [contact for index, contact in enumerate(contacts) if index not in already_claimed]
+
+    return contacts
+
+
+def record_send(ledger_collection: Collection, queue_id: str, recipient: str, message_id: str | None):
+    ledger_collection.update_one(
+        {"queue_id": queue_id, "recipient": recipient},
+        {"$set": {"status": LedgerStatus.sent if message_id else LedgerStatus.failed,
+                  "message_id": message_id, "sent_at": datetime.now(timezone.utc)}}
+    )
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from typing import List
+
+from pymongo import ReturnDocument
+
+from environment import STREAM_EVENT_LOG_SIZE
+
+TRIM_EVERY = 50  # Trim a user's log once every this many events instead of on every append
+
+
+class StreamEventLog:
+    """Per-user ring buffer of /stream/replies events, so a reconnecting client only fetches what it missed.
+
+    Event IDs come from a per-user counter and only ever increase. Each user keeps roughly the last
+    `max_events` events in the indexed `stream events` collection; older ones are trimmed.
+    """
+
+    def __init__(self, events_collection, counters_collection, max_events: int = STREAM_EVENT_LOG_SIZE):
+        self.events = events_collection
+        self.counters = counters_collection
+        self.max_events = max_events
+
+    async def append(self, user_id: str, payload: dict) -> dict:
+        """Stores the event for `user_id` and returns the payload with its `event_id`."""
+        counter = await self.counters.find_one_and_update(
+            {"_id": user_id}, {"$inc": {"last_event_id": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        event_id = counter["last_event_id"]
+        event = {**payload, "event_id": event_id}
+
+        await self.events.insert_one({"user_id": user_id, "event_id": event_id, "payload": event,
+                                      "created_at": datetime.now(timezone.utc)})
+        if event_id % TRIM_EVERY == 0:
+            await self.events.delete_many({"user_id": user_id, "event_id": {"$lte": event_id - self.max_events}})
+        return event
+
+    async def replay(self, user_id: str, last_event_id: int) -> tuple[List[dict], bool]:
+        """Events after `last_event_id`, oldest first, and whether some were already trimmed from the log."""
+        events = [doc["payload"] async for doc in self.events.find(
+            {"user_id": user_id, "event_id": {"$gt": last_event_id}}, {"_id": 0, "payload": 1}
+        ).sort("event_id", 1)]  # Bounded by the trimming in append
+
+        if events:
+            return events, events[0]["event_id"] > last_event_id + 1
+
+        counter = await self.counters.find_one({"_id": user_id})
+        return events, bool(counter) and counter["last_event_id"] > last_event_id
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from environment import REDIS_URL, STREAM_BROKER, STREAM_SEND_QUEUE_SIZE
+from utils.metrics import WEBSOCKET_BROADCAST_CONNECTIONS, WEBSOCKET_BROADCAST_SECONDS, WEBSOCKET_DROPPED_CLIENTS
+from utils.stream_events import StreamEventLog
+
+logger = logging.getLogger("utilities")
+
+EventHandler = Callable[[str, List[str], int | None], Awaitable[None]]
+
+
+class StreamBroker:
+    """Relays stream events (message, user IDs, event ID) to the connection manager of every API process."""
+
+    async def start(self, handler: EventHandler):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+    async def publish(self, message: str, user_ids: List[str], event_id: int | None = None):
+        raise NotImplementedError
+
+
+class InMemoryStreamBroker(StreamBroker):
+    """Single-process broker, events go straight to the local handler."""
+
+    def __init__(self):
+        self._handler: EventHandler | None = None
+
+    async def start(self, handler):
+        self._handler = handler
+
+    async def publish(self, message, user_ids, event_id=None):
+        if self._handler:
+            await self._handler(message, user_ids, event_id)
+
+
+class RedisStreamBroker(StreamBroker):
+    """Redis pub/sub broker, so a reply received by one uvicorn worker reaches sockets held by the others.
+
+    A lost Redis connection is retried with exponential backoff; events published meanwhile are not relayed,
+    reconnecting clients get them from the event log replay.
+    """
+
+    CHANNEL = "stream:replies"
+    RECONNECT_DELAY = 1  # Seconds before the first resubscribe attempt, doubled after each failure
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self, url: str = REDIS_URL):
+        self.redis = aioredis.from_url(url)
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, handler):
+        self._listener = asyncio.create_task(self._listen(handler))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self, handler: EventHandler):
+        delay = self.RECONNECT_DELAY
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                delay = self.RECONNECT_DELAY
+                async for item in pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    try:
+                        event = json.loads(item["data"])
+                        await handler(event["message"], event["user_ids"], event.get("event_id"))
+                    except Exception as error:
+                        logger.error(f"Stream event delivery failed: {error}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error(f"Stream broker lost its Redis subscription, retrying in {delay}s: {error}")
+            finally:
+                await pubsub.aclose()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    async def publish(self, message, user_ids, event_id=None):
+        await self.redis.publish(self.CHANNEL, json.dumps({"message": message, "user_ids": user_ids,
+                                                           "event_id": event_id}))
+
+
+class ClientConnection:
+    """One WebSocket with its own bounded send queue, drained by a dedicated task.
+
+    A client that can't keep up fills its queue and is disconnected instead of stalling broadcasts. While a
+    reconnecting client is replayed, live events are held back and sent after the replay, skipping any the
+    replay already covered, so the client sees every event once and in order.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int = STREAM_SEND_QUEUE_SIZE, replaying: bool = False):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.last_event_id = 0
+        self._held: List[tuple[str, int | None]] | None = [] if replaying else None
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def enqueue(self, message: str, event_id: int | None = None) -> bool:
+        if self._held is not None:
+            self._held.append((message, event_id))
+            return len(self._held) <= self.queue.maxsize
+        if event_id is not None:
+            if event_id <= self.last_event_id:
+                return True  # Already sent by the replay
+            self.last_event_id = event_id
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def finish_replay(self, messages: List[tuple[str, int | None]]) -> bool:
+        """Sends the replayed `messages`, then the live events held back meanwhile."""
+        held, self._held = self._held or [], None
+        return all([self.enqueue(message, event_id) for message, event_id in messages + held])
+
+    async def _send_loop(self):
+        try:
+            while True:
+                await self.websocket.send_text(await self.queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            logger.info(f"WebSocket send failed, dropping the connection: {error}")
+
+    def stop(self):
+        self._sender.cancel()
+
+    async def close(self):
+        self.stop()
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass  # Already closed by the client
+
+
+class ConnectionManager:
+    """Every open /stream/replies socket of this process, any number per user (e.g. several tabs)."""
+
+    def __init__(self, broker: StreamBroker, event_log: StreamEventLog | None = None):
+        self.broker = broker
+        self.event_log = event_log
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                await connection.close()
+        self.active_connections.clear()
+
+    async def connect(self, websocket: WebSocket, user_id: str, last_event_id: int | None = None) -> ClientConnection:
+        """Registers the socket; with `last_event_id`, first replays the events the client missed.
+
+        When the missed events were already trimmed from the log, or are more than the socket's queue holds, a
+        `reset` event tells the client to reload instead.
+        """
+        await websocket.accept()
+        replay = last_event_id is not None and self.event_log is not None
+        connection = ClientConnection(websocket, replaying=replay)
+        # Registered before reading the log, so nothing published during the replay is lost
+        self.active_connections.setdefault(str(user_id), set()).add(connection)
+
+        if replay:
+            events, missed_some = await self.event_log.replay(str(user_id), last_event_id)
+            if missed_some or len(events) >= connection.queue.maxsize:
+                # Too far behind for a delta, the client reloads and carries on from the newest event
+                newest_event_id = events[-1]["event_id"] if events else None
+                messages = [(json.dumps({"event": "reset", "event_id": newest_event_id}), newest_event_id)]
+            else:
+                messages = [(json.dumps(event), event["event_id"]) for event in events]
+            if not connection.finish_replay(messages):
+                WEBSOCKET_DROPPED_CLIENTS.inc()
+                self.disconnect(connection, user_id)
+                await connection.close()
+        return connection
+
+    def disconnect(self, connection: ClientConnection, user_id: str | None):
+        connections = self.active_connections.get(str(user_id), set())
+        connections.discard(connection)
+        if not connections:
+            self.active_connections.pop(str(user_id), None)
+        connection.stop()
+
+    async def broadcast(self, message: str, user_ids: List[str]):
+        """Publishes the event to every API process, including this one."""
+        await self.broker.publish(message, [str(user_id) for user_id in user_ids])
+
+    async def publish_event(self, payload: dict, user_ids: List[str]):
+        """Logs the event for each user, so it can be replayed, then broadcasts it with the user's event ID."""
+        if self.event_log is None:
+            return await self.broadcast(json.dumps(payload), user_ids)
+
+        for user_id in user_ids:
+            event = await self.event_log.append(str(user_id), payload)
+            await self.broker.publish(json.dumps(event), [str(user_id)], event["event_id"])
+
+    async def deliver(self, message: str, user_ids: List[str], event_id: int | None = None):
+        """Queues the event on this process's sockets of `user_ids`; never waits on a client."""
+        started = time.perf_counter()
+        delivered = 0
+        for user_id in user_ids:
+            for connection in list(self.active_connections.get(user_id, ())):
+                if connection.enqueue(message, event_id):
+                    delivered += 1
+                else:
+                    WEBSOCKET_DROPPED_CLIENTS.inc()
+                    self.disconnect(connection, user_id)
+                    asyncio.create_task(connection.close())
+
+        WEBSOCKET_BROADCAST_CONNECTIONS.observe(delivered)
+        WEBSOCKET_BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+
+def get_stream_broker() -> StreamBroker:
+    return RedisStreamBroker() if STREAM_BROKER == "redis" else InMemoryStreamBroker()
@@ -1,6 +1,7 @@
 import vonage
 
-from environment import VONAGE_APPLICATION_ID, VONAGE_APPLICATION_PRIVATE_KEY_PATH, VONAGE_API_KEY, VONAGE_API_SECRET
+from environment import VONAGE_APPLICATION_ID, VONAGE_APPLICATION_PRIVATE_KEY_PATH, VONAGE_API_KEY, VONAGE_API_SECRET, \
+    APP_ENVIRONMENT
 
 # key=VONAGE_API_KEY, secret=VONAGE_API_SECRET
 vonage_client = vonage.Client(key=VONAGE_API_KEY, secret=VONAGE_API_SECRET,
@@ -9,7 +10,9 @@ vonage_client = vonage.Client(key=VONAGE_API_KEY, secret=VONAGE_API_SECRET,
 
 msisdn = "12012751634"  # 12013816708
 
-print("BALANCE: ", vonage_client.account.get_balance())
+# Only in development, so benchmarks against the mock Vonage server never call the real API on import
+if APP_ENVIRONMENT == "development":
+    print("BALANCE: ", vonage_client.account.get_balance())
 # print(vonage_client.numbers.get_account_numbers())
 # print("============================================================================")
 # print("============================================================================")
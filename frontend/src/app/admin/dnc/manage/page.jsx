@@ -6,25 +6,17 @@ import DNCList from "@/components/partials/dnc/DNCList";
 import TableLoading from "@/components/skeleton/Table";
 import EditDNC from "@/components/partials/dnc/EditDNC";
 import axios from "@/configs/axios-config";
+import useCursorPages from "@/hooks/useCursorPages";
+import LoadMore from "@/components/partials/pagination/LoadMore";
 import { ADMIN_ENDPOINTS } from "@/constant/endpoints";
 
 const ManageUsersPage = () => {
-  const [isLoaded, setIsLoaded] = useState(false);
   const dispatch = useDispatch();
-  const [dncs, setDncs] = useState([])
+  const [dncs, setDncs, pages] = useCursorPages(ADMIN_ENDPOINTS.GET_DNCS)
+  const { isLoaded } = pages
   const [dncEdit, setDncEdit] = useState(false)
   const [deleting, setDeleting] = useState([])
 
-  useEffect(() => {
-    axios.get(ADMIN_ENDPOINTS.GET_DNCS).then(({ data }) => {
-        console.log(data)
-        if (Array.isArray(data)) {
-            setDncs(data)
-        }
-    }).catch(err => console.log(err))
-      .finally(() => setIsLoaded(true))
-  }, []);
-
   function updateLocalDnc(newData) {
     const newList = [...dncs]
     const dncIndex = newList.findIndex(dnc => dnc._id === newData._id)
@@ -57,6 +49,7 @@ const ManageUsersPage = () => {
       {isLoaded && (
         <div>
           <DNCList dncs={dncs} setDncEdit={setDncEdit} deleteDnc={deleteDnc} deleting={deleting} />
+          <LoadMore pages={pages} />
         </div>
       )}
       <EditDNC dncEdit={dncEdit} setDncEdit={setDncEdit} updateLocalDnc={updateLocalDnc} UPDATE_ENDPOINT={ADMIN_ENDPOINTS.UPDATE_DNC} />
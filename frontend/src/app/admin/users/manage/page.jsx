@@ -5,7 +5,7 @@ import { useSelector, useDispatch } from "react-redux";
 import UserList from "@/components/partials/users/UserList";
 import TableLoading from "@/components/skeleton/Table";
 import EditUser from "@/components/partials/users/EditUser";
-import axios from "@/configs/axios-config";
+import axios, { getAllPages } from "@/configs/axios-config";
 import { ADMIN_ENDPOINTS } from "@/constant/endpoints";
 import notify from "@/app/notify";
 
@@ -18,7 +18,7 @@ const ManageUsersPage = () => {
   const [deleting, setDeleting] = useState([])
 
   useEffect(() => {
-    axios.get(ADMIN_ENDPOINTS.GET_USERS).then(({ data }) => {
+    getAllPages(ADMIN_ENDPOINTS.GET_USERS).then(({ data }) => {
         if (Array.isArray(data)) {
             setUsers(data)
         }
@@ -6,26 +6,18 @@ import QueueList from "@/components/partials/queue/QueueList";
 import notify from "@/app/notify";
 import EditQueue from "@/components/partials/queue/EditQueue";
 import axios from "@/configs/axios-config";
+import useCursorPages from "@/hooks/useCursorPages";
+import LoadMore from "@/components/partials/pagination/LoadMore";
 import { USER_ENDPOINTS } from "@/constant/endpoints";
 import Loading from "@/components/Loading";
 
 const QueueQueuePage = () => {
-  const [isLoaded, setIsLoaded] = useState(false);
   const dispatch = useDispatch();
-  const [queues, setQueues] = useState([])
+  const [queues, setQueues, pages] = useCursorPages(USER_ENDPOINTS.GET_CAMPAIGN_QUEUES)
+  const { isLoaded } = pages
   const [queueEdit, setQueueEdit] = useState(false)
   const [editing, setEditing] = useState([])
 
-  useEffect(() => {
-    // Add optional body field in db to specify if campaign data should also be sent
-    axios.get(USER_ENDPOINTS.GET_CAMPAIGN_QUEUES).then(({ data }) => {
-        if (Array.isArray(data)) {
-            setQueues(data)
-        }
-    }).catch(err => console.log(err))
-      .finally(() => setIsLoaded(true))
-  }, []);
-
   useEffect(() => {
     console.log(queueEdit)
   }, [queueEdit])
@@ -72,6 +64,7 @@ const QueueQueuePage = () => {
         queues.length ? (
         <div>
           <QueueList queues={queues} editQueue={editQueue} editing={editing} />
+          <LoadMore pages={pages} />
         </div>
         ) : (
           <div className="h-full flex flex-col justify-center items-center container-center">
@@ -11,6 +11,7 @@ import Chat from "@/components/partials/replies/Chat";
 import Blank from "@/components/partials/replies/Blank";
 import Info from "@/components/partials/replies/Info";
 import axios from "@/configs/axios-config";
+import Button from "@/components/ui/Button";
 import { USER_ENDPOINTS } from "@/constant/endpoints";
 import {
 	setContacts,
@@ -27,6 +28,8 @@ import { selectAuthState, selectChatData } from "@/store/selectors";
 const ChatPage = ({ params }) => {
 	const { width, breakpoints } = useWidth();
 	const [isLoading, setIsLoading] = useState(true);
+	const [nextCursor, setNextCursor] = useState(null);
+	const [loadingMore, setLoadingMore] = useState(false);
 	const { auth } = useSelector(selectAuthState);
 	const dispatch = useDispatch();
 	const { activeChat, openInfo, mobileChatSidebar, contacts, searchContact } =
@@ -66,14 +69,29 @@ const ChatPage = ({ params }) => {
 
 		axios
 			.get(USER_ENDPOINTS.GET_CHAT_CONTACTS + `/${params.campaign}`)
-			.then(({ data }) => {
+			.then(({ data, headers }) => {
 				if (Array.isArray(data)) {
 					dispatch(setContacts(data));
+					setNextCursor(headers["x-next-cursor"] ?? null);
 				}
 			})
 			.finally(() => setIsLoading(false));
 	}, []);
 
+	// Contacts come latest reply first, a page at a time
+	function loadMoreContacts() {
+		setLoadingMore(true);
+		axios
+			.get(USER_ENDPOINTS.GET_CHAT_CONTACTS + `/${params.campaign}`, {
+				params: { cursor: nextCursor },
+			})
+			.then(({ data, headers }) => {
+				dispatch(setContacts([...contacts, ...data]));
+				setNextCursor(headers["x-next-cursor"] ?? null);
+			})
+			.finally(() => setLoadingMore(false));
+	}
+
 	return (
 		<div className="flex lg:space-x-5 chat-height overflow-hidden relative rtl:space-x-reverse">
 			<div
@@ -120,6 +138,16 @@ const ChatPage = ({ params }) => {
 						) : (
 							<Loading className="!h-full" />
 						)}
+						{nextCursor && (
+							<div className="flex justify-center py-4">
+								<Button
+									text="Load more"
+									className="btn-outline-dark btn-sm"
+									isLoading={loadingMore}
+									onClick={loadMoreContacts}
+								/>
+							</div>
+						)}
 					</SimpleBar>
 				</Card>
 			</div>
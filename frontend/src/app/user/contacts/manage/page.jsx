@@ -7,27 +7,19 @@ import Loading from "@/components/Loading";
 import notify from "@/app/notify";
 import EditContact from "@/components/partials/contact/EditContact";
 import axios from "@/configs/axios-config";
+import useCursorPages from "@/hooks/useCursorPages";
+import LoadMore from "@/components/partials/pagination/LoadMore";
 import { USER_ENDPOINTS } from "@/constant/endpoints";
 import Button from "@/components/ui/Button";
 
 const ManageUsersPage = () => {
-  const [isLoaded, setIsLoaded] = useState(false);
   const dispatch = useDispatch();
   const [groups, setGroups] = useState([])
-  const [contacts, setContacts] = useState([])
+  const [contacts, setContacts, pages] = useCursorPages(USER_ENDPOINTS.GET_CONTACTS)
+  const { isLoaded } = pages
   const [contactEdit, setContactEdit] = useState(false)
   const [deleting, setDeleting] = useState([])
 
-  useEffect(() => {
-    axios.get(USER_ENDPOINTS.GET_CONTACTS).then(({ data }) => {
-        console.log(data)
-        if (Array.isArray(data)) {
-            setContacts(data)
-        }
-    }).catch(err => console.log(err))
-      .finally(() => setIsLoaded(true))
-  }, []);
-
   function updateLocalContact(newData) {
     const newList = [...contacts]
     const contactIndex = newList.findIndex(contact => contact._id === newData._id)
@@ -92,6 +84,7 @@ const ManageUsersPage = () => {
                 <ContactList key={index} className={deleting.includes(name) ? "opacity-40 ease-in-out pointer-events-none pulse-custom" : ""} group={name} contacts={groups[name]} setContactEdit={setContactEdit} deleteContact={deleteContact} deleting={deleting} headerslot={<Button className="btn-outline-danger" text="Delete Group" icon="heroicons:trash" onClick={() => deleteGroup(name)} />} />
               ))
             }
+            <LoadMore pages={pages} text="Load more contacts" />
           </div>
         ) : (
           <div className="h-full flex flex-col justify-center items-center container-center">
@@ -6,26 +6,20 @@ import DNCList from "@/components/partials/dnc/DNCList";
 import TableLoading from "@/components/skeleton/Table";
 import EditDNC from "@/components/partials/dnc/EditDNC";
 import axios from "@/configs/axios-config";
+import useCursorPages from "@/hooks/useCursorPages";
+import LoadMore from "@/components/partials/pagination/LoadMore";
 import { USER_ENDPOINTS } from "@/constant/endpoints";
 
+// The endpoint also lists the admin's entries, only the user's own are managed here
+const userDncs = data => data.filter(dnc => dnc.scope === "user")
+
 const ManageUsersPage = () => {
-  const [isLoaded, setIsLoaded] = useState(false);
   const dispatch = useDispatch();
-  const [dncs, setDncs] = useState([])
+  const [dncs, setDncs, pages] = useCursorPages(USER_ENDPOINTS.GET_DNCS, { transform: userDncs })
+  const { isLoaded } = pages
   const [dncEdit, setDncEdit] = useState(false)
   const [deleting, setDeleting] = useState([])
 
-  useEffect(() => {
-    axios.get(USER_ENDPOINTS.GET_DNCS).then(({ data }) => {
-        console.log(data)
-        if (Array.isArray(data)) {
-          const myDncs = data.filter(dnc => dnc.scope === "user")
-          setDncs(myDncs)
-        }
-    }).catch(err => console.log(err))
-      .finally(() => setIsLoaded(true))
-  }, []);
-
   function updateLocalDnc(newData) {
     const newList = [...dncs]
     const dncIndex = newList.findIndex(dnc => dnc._id === newData._id)
@@ -58,6 +52,7 @@ const ManageUsersPage = () => {
       {isLoaded && (
         <div>
           <DNCList dncs={dncs} setDncEdit={setDncEdit} deleteDnc={deleteDnc} deleting={deleting} />
+          <LoadMore pages={pages} />
         </div>
       )}
       <EditDNC dncEdit={dncEdit} setDncEdit={setDncEdit} updateLocalDnc={updateLocalDnc} UPDATE_ENDPOINT={USER_ENDPOINTS.UPDATE_DNC} />
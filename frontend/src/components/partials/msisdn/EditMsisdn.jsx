@@ -8,7 +8,7 @@ import { yupResolver } from "@hookform/resolvers/yup";
 import * as yup from "yup";
 import notify from "@/app/notify";
 import FormGroup from "@/components/ui/FormGroup";
-import axios from "@/configs/axios-config";
+import axios, { getAllPages } from "@/configs/axios-config";
 import { normalGroups, prepContactForUpdate } from "@/utils";
 import { ADMIN_ENDPOINTS } from "@/constant/endpoints";
 
@@ -61,7 +61,7 @@ const EditMsisdn = ({ setNumberEdit, numberEdit, updateNumber }) => {
   };
 
   useEffect(() => {
-    axios.get(ADMIN_ENDPOINTS.GET_USERS).then(({ data }) => {
+    getAllPages(ADMIN_ENDPOINTS.GET_USERS).then(({ data }) => {
         if (Array.isArray(data)) {
             setUserData(data)
             setUsers(data.map(user => ({ label: user.email, value: user._id })))
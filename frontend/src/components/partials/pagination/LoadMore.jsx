@@ -0,0 +1,17 @@
+import React from "react";
+import Button from "@/components/ui/Button";
+
+// Fetches the next page of a useCursorPages list, hidden once the last page is loaded
+const LoadMore = ({ pages, text = "Load more" }) => {
+  if (!pages.hasMore) {
+    return null
+  }
+
+  return (
+    <div className="flex justify-center mt-6">
+      <Button text={text} className="btn-outline-dark" isLoading={pages.isLoadingMore} onClick={pages.loadMore} />
+    </div>
+  );
+};
+
+export default LoadMore;
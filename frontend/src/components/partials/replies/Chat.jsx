@@ -1,6 +1,6 @@
 import React, { useEffect, useRef, useState } from "react";
 import { useSelector, useDispatch } from "react-redux";
-import { toggleMobileChatSidebar, infoToggle, sendMessage } from "./store";
+import { toggleMobileChatSidebar, infoToggle, sendMessage, prependMessages } from "./store";
 import useWidth from "@/hooks/useWidth";
 import Icon from "@/components/ui/Icon";
 import Dropdown from "@/components/ui/Dropdown";
@@ -30,7 +30,7 @@ const time = () => {
 };
 
 const Chat = ({ campaignId }) => {
-  const { openInfo, mobileChatSidebar, messFeed, user } =
+  const { openInfo, mobileChatSidebar, messFeed, messCursor, user } =
     useSelector((state) => state.chat);
 
   const { firstName, lastName } = useSelector(state => state.auth ?? {})
@@ -41,6 +41,15 @@ const Chat = ({ campaignId }) => {
   const dispatch = useDispatch();
   const [message, setMessage] = useState("");
   const [sendingMsg, setSendingMsg] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
+  const loadOlderMessages = () => {
+    setLoadingOlder(true)
+    axios.get(USER_ENDPOINTS.GET_CHAT + `/${campaignId}/${user?.phone_number}`, { params: { cursor: messCursor } })
+      .then(({ data, headers }) => {
+        dispatch(prependMessages({ messages: data.reverse(), nextCursor: headers["x-next-cursor"] }))
+      }).finally(() => setLoadingOlder(false))
+  }
   
   const handleSendMessage = (e) => {
     e.preventDefault();
@@ -64,9 +73,11 @@ const Chat = ({ campaignId }) => {
     }
   };
   const chatheight = useRef(null);
+  // Scroll to new messages only, loading earlier ones keeps the position
+  const lastMessage = messFeed?.[messFeed.length - 1];
   useEffect(() => {
     chatheight.current.scrollTop = chatheight.current.scrollHeight;
-  }, [messFeed]);
+  }, [lastMessage]);
 
   return (
     <div className="h-full">
@@ -104,6 +115,14 @@ const Chat = ({ campaignId }) => {
           className="msgs overflow-y-auto msg-height pt-6 space-y-6"
           ref={chatheight}
         >
+          {messCursor && (
+            <div className="flex justify-center">
+              <button type="button" className="text-xs text-slate-500 dark:text-slate-400 hover:underline"
+                      disabled={loadingOlder} onClick={loadOlderMessages}>
+                {loadingOlder ? "Loading..." : "Load earlier messages"}
+              </button>
+            </div>
+          )}
           {
             messFeed?.length ? (
               messFeed.map((item, i) => (
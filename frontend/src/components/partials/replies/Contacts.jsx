@@ -19,12 +19,15 @@ const Contacts = ({ campaignId, contact }) => {
 
   function loadMessages() {
     dispatch(closeChat({ activeChat: contact.info.phone_number }))
-    axios.get(USER_ENDPOINTS.GET_CHAT + `/${campaignId}` + `/${contact.info.phone_number}`).then(({ data }) => {
+    // The latest messages only, older ones are loaded from the chat on demand
+    axios.get(USER_ENDPOINTS.GET_CHAT + `/${campaignId}` + `/${contact.info.phone_number}`).then(({ data, headers }) => {
       dispatch(
         openChat({
           contact,
           activeChat: contact.info.phone_number,
-          messages: data
+          // Pages come newest first, the feed shows the conversation oldest first
+          messages: data.reverse(),
+          nextCursor: headers["x-next-cursor"]
         })
       );
     })
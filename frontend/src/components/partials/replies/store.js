@@ -13,6 +13,7 @@ export const appChatSlice = createSlice({
     mobileChatSidebar: false,
     profileinfo: {},
     messFeed: [],
+    messCursor: null,  // Cursor of the page of older messages, null once the whole conversation is loaded
     user: {},
     contacts: [],
     chats: {},
@@ -23,6 +24,7 @@ export const appChatSlice = createSlice({
       state.mobileChatSidebar = !state.mobileChatSidebar;
       state.user = action.payload.contact.info;
       state.messFeed = action.payload.messages
+      state.messCursor = action.payload.nextCursor ?? null
       // state.chats.map((item) => {
       //   if (item.userId === action.payload.contact.id) {
       //     state.messFeed = item.messages;
@@ -33,6 +35,7 @@ export const appChatSlice = createSlice({
       state.activeChat = action.payload?.activeChat ?? "";
       state.user = {};
       state.messFeed = []
+      state.messCursor = null
       // state.chats.map((item) => {
       //   if (item.userId === action.payload.contact.id) {
       //     state.messFeed = item.messages;
@@ -53,6 +56,10 @@ export const appChatSlice = createSlice({
     // clearInfo: (state, action) => {
     //   state.user = {}
     // },
+    prependMessages: (state, action) => {
+      state.messFeed = [...action.payload.messages, ...state.messFeed]
+      state.messCursor = action.payload.nextCursor ?? null
+    },
     sendMessage: (state, action) => {
       state.messFeed.push(action.payload);
     },
@@ -80,6 +87,7 @@ export const {
   toggleMobileChatSidebar,
   infoToggle,
   sendMessage,
+  prependMessages,
   toggleProfile,
   setContactSearch,
   toggleActiveChat,
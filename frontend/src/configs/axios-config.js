@@ -6,6 +6,8 @@ let access_token = false
 if (typeof window !== "undefined") {
     access_token = window?.localStorage.getItem("auth")
 }
+const PAGE_SIZE = 1000
+
 const axios = defaultAxios.create({
     // baseURL: "https://fastapi-9ji4.onrender.com",
     baseURL: "http://localhost:8000",
@@ -32,4 +34,19 @@ axios.interceptors.response.use(
     }
 )
 
+// List endpoints return one page at a time, the X-Next-Cursor header points to the next one (absent on the last page).
+// Reads every page and resolves like axios.get, with the items of all the pages as data. Only for small bounded lists
+// (an admin's users); the others load pages on demand with useCursorPages.
+export async function getAllPages(url, config = {}) {
+    const items = []
+    let cursor = null
+    do {
+        const params = { ...config.params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+        const response = await axios.get(url, { ...config, params })
+        items.push(...response.data)
+        cursor = response.headers["x-next-cursor"]
+    } while (cursor)
+    return { data: items }
+}
+
 export default axios
\ No newline at end of file
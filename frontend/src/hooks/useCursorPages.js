@@ -0,0 +1,37 @@
+import { useCallback, useEffect, useState } from "react";
+import axios from "@/configs/axios-config";
+
+// Keyset-paginated list endpoints send one page at a time, with the cursor of the next page in the X-Next-Cursor
+// header (absent on the last page). The first page is loaded on mount, the following ones by `loadMore`.
+const useCursorPages = (url, { transform = data => data } = {}) => {
+  const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoaded, setIsLoaded] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+  const fetchPage = useCallback((cursor) => {
+    return axios.get(url, { params: cursor ? { cursor } : {} }).then(response => {
+      const data = Array.isArray(response.data) ? transform(response.data) : []
+      setItems(former => cursor ? [...former, ...data] : data)
+      setNextCursor(response.headers["x-next-cursor"] ?? null)
+    })
+  }, [url]);
+
+  useEffect(() => {
+    fetchPage(null).catch(err => console.log(err))
+      .finally(() => setIsLoaded(true))
+  }, [fetchPage]);
+
+  const loadMore = () => {
+    if (!nextCursor || isLoadingMore) {
+      return
+    }
+    setIsLoadingMore(true)
+    fetchPage(nextCursor).catch(err => console.log(err))
+      .finally(() => setIsLoadingMore(false))
+  }
+
+  return [items, setItems, { isLoaded, hasMore: Boolean(nextCursor), isLoadingMore, loadMore }];
+};
+
+export default useCursorPages;